@@ -0,0 +1,100 @@
+"""
+This script defines the thread pool that runs blocking MongoDB queries and file IO off the event loop.
+Websocket handlers registered with `blocking=True` and anything else awaiting `run_blocking` go through it,
+so a slow query or a large zip only occupies a worker thread instead of stalling every room's ticks.
+
+The pool is bounded, so a burst of requests queues up instead of spawning threads.
+A call that times out raises `IOTimeoutError` for the caller, but its thread keeps running until the call returns.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+MAX_WORKERS = int(os.environ.get('DB_IO_MAX_WORKERS', default=8))
+# Default seconds a call may take before the caller stops waiting for it.
+DEFAULT_TIMEOUT = float(os.environ.get('DB_IO_TIMEOUT', default=30.0))
+
+class IOTimeoutError(TimeoutError):
+    pass
+
+class IOExecutorStats:
+    """
+    Counters updated from the event loop and the worker threads, always under `lock`.
+    """
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.running = 0
+        self.max_wait_time = 0.0
+        self.lock = threading.Lock()
+
+    def record_submitted(self):
+        with self.lock:
+            self.submitted += 1
+
+    def record_started(self, wait_time: float):
+        with self.lock:
+            self.running += 1
+            if wait_time > self.max_wait_time:
+                self.max_wait_time = wait_time
+
+    def record_finished(self, success: bool):
+        with self.lock:
+            self.running -= 1
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "max_workers": MAX_WORKERS,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "running": self.running,
+                "queued": self.submitted - self.completed - self.failed - self.running,
+                "max_wait_ms": round(self.max_wait_time * 1000, 3),
+            }
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="db-io")
+stats = IOExecutorStats()
+
+async def run_blocking(func: Callable, *args, timeout: float | None = DEFAULT_TIMEOUT, **kwargs):
+    """
+    Runs a blocking function on the IO thread pool and waits for its result.
+    Pass `timeout=None` for calls that must not be abandoned, e.g. saving a room.
+    """
+    submit_time = time.perf_counter()
+
+    def run():
+        stats.record_started(time.perf_counter() - submit_time)
+        success = False
+        try:
+            result = func(*args, **kwargs)
+            success = True
+            return result
+        finally:
+            stats.record_finished(success)
+
+    stats.record_submitted()
+    future = asyncio.get_running_loop().run_in_executor(executor, run)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        stats.record_timeout()
+        raise IOTimeoutError(f"{getattr(func, '__name__', func)} did not finish within {timeout}s")
+
+def shutdown():
+    executor.shutdown(wait=True, cancel_futures=True)
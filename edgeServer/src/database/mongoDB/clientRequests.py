@@ -1,41 +1,62 @@
 import os
+import threading
 from .types import collections_dict, CollectionType
+from .documentUtilities import get_latest_versions
+from .documentIndexes import query_pattern
 from typing import List, KeysView, Dict
-from utililites import modelIOTools
+from utililites import downloadTokens, modelIOTools, thumbnailCache
 
 
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_ref_id", "filetype", "version_num")
 def _get_latest_versions(uids: list[str] | KeysView) -> dict[str, any]:
     '''
-    Loops through a list of reconstructions using their unique database id 'data_ref_id' from mongoDB, and gets the latest version of the model for each of them.
+    Gets the latest .glb version of the model for each reconstruction, using their unique database id 'data_ref_id' from mongoDB.
+    Reconstructions without a .glb version are left out.
     '''
-    latest_versions = {}
-    for uid in uids:
-        filter = {"data_ref_id": uid}
-        obj_docs = collections_dict[CollectionType.RECONSTRUCTIONS].find(filter)
-        
-        newest_doc = None
-        largest_version = -1
-        for doc in obj_docs:
-            version_num = int(doc["version"]) if doc["version"].isnumeric() and doc["filetype"] == ".glb" else -1
-            if newest_doc == None or largest_version < version_num:
-                newest_doc = doc
-                largest_version = version_num
-            
-        latest_versions[uid] = newest_doc
-    return latest_versions
-
-def _get_file_base64(uid: str, version: str, thumbnail_name: str) -> str | None:
+    return get_latest_versions(CollectionType.RECONSTRUCTIONS, list(uids))
+
+def _get_thumbnail_url(uid: str, version: str, thumbnail_name: str) -> str | None:
     if thumbnail_name == None:
         return None
 
     captures_dir = os.environ.get('CAPTURE_DIRECTORY', default='captures')
-    thumbnail_path = captures_dir + "/" + uid + "/models/" + version + "/" + thumbnail_name
-    if os.path.exists(thumbnail_path):
-        return modelIOTools.GetBase64Data(thumbnail_path)
-    else:
+    thumbnail_path = thumbnailCache.get_thumbnail_path(captures_dir, uid, version, thumbnail_name)
+    cache_key = thumbnailCache.get_cache_key(uid, version, thumbnail_name, thumbnail_path)
+    if cache_key == None:
         return None
+    return thumbnailCache.get_thumbnail_url(cache_key)
+
+# Model previews are rebuilt only after a new iteration is registered or model info changes.
+_model_previews_cache: dict[str, any] | None = None
+_model_previews_generation = 0
+_model_previews_lock = threading.Lock()
+
+def invalidate_model_previews():
+    global _model_previews_cache, _model_previews_generation
+    with _model_previews_lock:
+        _model_previews_cache = None
+        _model_previews_generation += 1
 
 def fetch_model_previews():
+    '''
+    Returns the cached model previews, building them if a model changed since they were last built.
+    '''
+    global _model_previews_cache
+    with _model_previews_lock:
+        if _model_previews_cache != None:
+            return _model_previews_cache
+        generation = _model_previews_generation
+
+    previews = _build_model_previews()
+
+    with _model_previews_lock:
+        # Do not cache previews that were invalidated while being built.
+        if generation == _model_previews_generation:
+            _model_previews_cache = previews
+    return previews
+
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_uid")
+def _build_model_previews():
     '''
     Loops through models and gets the latest iteration to create a data and thumbnail list.
     '''
@@ -50,12 +71,15 @@ def fetch_model_previews():
 
     result = []
 
-    for version in versions.values():
-        uid_doc = uids[version["data_ref_id"]]
+    for uid, uid_doc in uids.items():
+        # Skip captures that have no .glb version yet.
+        version = versions.get(uid)
+        if version == None:
+            continue
         model_info = {
             "id": uid_doc["data_uid"],
             "name": uid_doc["name"],
-            "thumbnail_data": _get_file_base64(
+            "thumbnail_url": _get_thumbnail_url(
                 uid_doc["data_uid"],
                 version["version"],
                 version["thumbnail_filename"])
@@ -64,22 +88,21 @@ def fetch_model_previews():
     
     return  {"model_previews": result}
 
-def _write_to_file(values: Dict[str, str], file_dir: str, file_name: str, exclude_keys = []):
-    file_path = file_dir + "/" + file_name
-
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-    file = open(file_path, "w")
+def _format_info_text(values: Dict[str, str], exclude_keys = []) -> str:
+    lines = []
     for key in values:
         if key in exclude_keys:
             continue
-        line = key + ": " + values[key] + "\n"
-        file.write(line)
-    file.close
+        lines.append(key + ": " + str(values[key]) + "\n")
+    return "".join(lines)
 
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_uid")
 def package_model_zip(uid: str, version: str, name: str):
-    result = {"zipData": "null"}
+    """
+    Prepares a zip download of a model version. The zip is streamed by the `/downloadModelZip` endpoint,
+    this only returns the URL to download it from.
+    """
+    result = {"downloadUrl": None}
     filter = {"data_uid": uid}
     model_data_doc = collections_dict[CollectionType.RECONSTRUCTIONS].find_one(filter)
 
@@ -92,13 +115,17 @@ def package_model_zip(uid: str, version: str, name: str):
         print("File_Path does not exist: ", file_dir)
         return result
 
-    _write_to_file(model_data_doc, file_dir, "info.txt", ["_id"])
-    modelIOTools.CreateZipFileFromPath(name, file_dir)
-    result["zipData"] = modelIOTools.GetBase64Data(name + ".zip")
-    os.remove(name + ".zip")
+    token = downloadTokens.issue({
+        "model_dir": file_dir,
+        "info_text": _format_info_text(model_data_doc, ["_id"]),
+        "file_name": name + ".zip",
+    })
+    result["downloadUrl"] = modelIOTools.downloadModelZipEndpoint + "/" + token
+    result["fileName"] = name + ".zip"
 
     return result
 
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_uid")
 def fetch_model_data(uid: str):
     filter = {
         "data_uid": uid
@@ -117,6 +144,8 @@ def fetch_model_data(uid: str):
         "creation_date": doc["creation_date"]
     }
 
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_uid")
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_ref_id", "version", "filetype")
 def fetch_model_data_dl_url(uid: str, version: str = None):
     result = {}
     data_filter = {
@@ -129,7 +158,7 @@ def fetch_model_data_dl_url(uid: str, version: str = None):
         if uid in versions:
             version = versions[uid]["version"]
         else:
-            raise Exception(-f"UID {uid} does not have a model version")
+            raise Exception(f"UID {uid} does not have a model version")
         
     # filter for mesh
     mesh_filter = {
@@ -200,6 +229,7 @@ def fetch_model_data_dl_url(uid: str, version: str = None):
 
     return result
 
+@query_pattern(CollectionType.RECONSTRUCTIONS, "data_uid")
 def update_model_data(uid: str, data: any) -> bool:
     update = {
         "name": data["name"],
@@ -211,6 +241,8 @@ def update_model_data(uid: str, data: any) -> bool:
     }
 
     update_result = collections_dict[CollectionType.RECONSTRUCTIONS].update_one(filter=filter, update={"$set": update})
+    # Previews show the model name.
+    invalidate_model_previews()
     
     if update_result.acknowledged:
         if update_result.matched_count > 0:
@@ -218,6 +250,7 @@ def update_model_data(uid: str, data: any) -> bool:
         return False
     
 def fetch_edit_room_previews():
+    # Lists every room, so there is no query pattern to index.
     filter = {}
 
     projection = {
@@ -0,0 +1,187 @@
+"""
+This file declares the indexes each collection needs, next to the document schemas in documentSchemas.
+
+`ensure_indexes` creates missing indexes at startup and recreates indexes that differ from their declaration.
+Functions querying MongoDB declare the fields they filter on with `query_pattern`, and
+`verify_query_patterns` fails startup if one of those patterns has no index in the database to support it.
+
+Unique indexes let documentWriter upsert in a single round trip instead of counting matches first,
+so they are only relied on once `ensure_indexes` has verified they exist.
+"""
+from typing import Callable
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from .types import CollectionType, collections_dict
+
+class MissingIndexError(RuntimeError):
+    pass
+
+class IndexDeclaration:
+    def __init__(self, collection_type: CollectionType, keys: list[tuple[str, int]], name: str, unique: bool = False, sparse: bool = False,
+                 partial_filter: dict[str, any] = None):
+        self.collection_type = collection_type
+        self.keys = keys
+        self.name = name
+        self.unique = unique
+        self.sparse = sparse
+        # Only documents matching this filter are indexed, see partialFilterExpression.
+        self.partial_filter = partial_filter
+
+    def get_options(self) -> dict[str, any]:
+        """
+        Returns the options to pass to `Collection.create_index`.
+        """
+        options = {"name": self.name, "unique": self.unique, "sparse": self.sparse}
+        if self.partial_filter != None:
+            options["partialFilterExpression"] = self.partial_filter
+        return options
+
+    def get_fields(self) -> list[str]:
+        return [field for field, _ in self.keys]
+
+    def matches(self, index_info: dict[str, any]) -> bool:
+        """
+        Returns True if an index from `Collection.index_information` has the declared keys and options.
+        """
+        return (list(index_info["key"]) == [(field, direction) for field, direction in self.keys]
+                and index_info.get("unique", False) == self.unique
+                and index_info.get("sparse", False) == self.sparse
+                and _to_dict(index_info.get("partialFilterExpression")) == self.partial_filter)
+
+def _to_dict(value):
+    """
+    Converts the SON documents returned by `Collection.index_information` to dicts, so they compare with declarations.
+    """
+    if isinstance(value, dict):
+        return {key: _to_dict(item) for key, item in value.items()}
+    return value
+
+INDEX_DECLARATIONS: list[IndexDeclaration] = [
+    # ModelData_Document, one per capture.
+    IndexDeclaration(CollectionType.RECONSTRUCTIONS, [("data_uid", ASCENDING)], "data_uid", unique=True, sparse=True),
+    # ModelObject_Document, one per capture version and filetype.
+    # ModelData_Document records share the collection without these fields, so only ModelObject_Document records are indexed,
+    # otherwise their missing fields would all count as the same null key.
+    IndexDeclaration(CollectionType.RECONSTRUCTIONS,
+                     [("data_ref_id", ASCENDING), ("version", ASCENDING), ("filetype", ASCENDING)],
+                     "data_ref_id_version_filetype", unique=True, partial_filter={"data_ref_id": {"$exists": True}}),
+    # Latest version lookups sort and group on the numeric version.
+    IndexDeclaration(CollectionType.RECONSTRUCTIONS,
+                     [("data_ref_id", ASCENDING), ("filetype", ASCENDING), ("version_num", DESCENDING)],
+                     "latest_version"),
+    IndexDeclaration(CollectionType.ROOMS, [("room_id", ASCENDING)], "room_id", unique=True),
+]
+
+# Declarations that exist in the database as declared, set by `ensure_indexes`.
+verified_indexes: list[IndexDeclaration] = []
+
+# ==================== Query patterns ====================
+
+# (collection, filtered fields, name of the querying function)
+query_patterns: list[tuple[CollectionType, tuple[str, ...], str]] = []
+
+def query_pattern(collection_type: CollectionType, *fields: str):
+    """
+    Decorator declaring that a function filters a collection on the given fields.
+    Checked against the indexes in the database by `verify_query_patterns`.
+    """
+    def decorator(func: Callable):
+        query_patterns.append((collection_type, fields, func.__qualname__))
+        return func
+    return decorator
+
+def _find_supporting_index(index_information: dict[str, dict[str, any]], fields: tuple[str, ...]) -> str | None:
+    """
+    Returns the name of an index from `Collection.index_information` supporting a query on the fields.
+    An index supports a query if the queried fields are a prefix of its keys, in any order.
+    """
+    for name, index_info in index_information.items():
+        index_fields = [field for field, _ in index_info["key"]]
+        if set(index_fields[:len(fields)]) == set(fields):
+            return name
+    return None
+
+def verify_query_patterns():
+    """
+    Raises MissingIndexError if a declared query pattern has no index in the database supporting it.
+    Run after `ensure_indexes`, so it also catches declared indexes that could not be created.
+    """
+    index_information = {}
+    unsupported = []
+    for collection_type, fields, function_name in query_patterns:
+        if collection_type not in index_information:
+            index_information[collection_type] = collections_dict[collection_type].index_information()
+        if _find_supporting_index(index_information[collection_type], fields) == None:
+            unsupported.append(f"{function_name} on {collection_type.name}{list(fields)}")
+    if len(unsupported) > 0:
+        raise MissingIndexError("No index supports these queries: " + ", ".join(unsupported))
+
+# ==================== Startup ====================
+
+def ensure_indexes():
+    """
+    Creates declared indexes that do not exist yet.
+    Existing indexes with the same name but different keys or options, such as indexes made non-unique by an
+    older declaration, are dropped and created again as declared.
+    A unique index cannot be created while the collection holds duplicates, those are reported and left unverified.
+    """
+    verified_indexes.clear()
+    for declaration in INDEX_DECLARATIONS:
+        collection = collections_dict[declaration.collection_type]
+        existing = collection.index_information().get(declaration.name)
+        if existing != None and declaration.matches(existing):
+            verified_indexes.append(declaration)
+            continue
+
+        try:
+            if existing != None:
+                print(f"# Index {declaration.name} on {collection.name} does not match its declaration, recreating it: {existing}")
+                collection.drop_index(declaration.name)
+            else:
+                print(f"# Creating index {declaration.name} on {collection.name}")
+            collection.create_index(declaration.keys, **declaration.get_options())
+        except OperationFailure as error:
+            print(f"# Could not create index {declaration.name} on {collection.name}: {error}")
+            continue
+        verified_indexes.append(declaration)
+
+def get_unique_index(collection_type: CollectionType, filters: dict[str, any]) -> IndexDeclaration | None:
+    """
+    Returns the verified unique index guaranteeing that at most one document matches the filter, if there is one.
+    The filter must only test its fields for equality, and test exactly the fields of the index.
+    """
+    for value in filters.values():
+        if isinstance(value, dict):
+            return None
+    for declaration in verified_indexes:
+        if (declaration.collection_type == collection_type and declaration.unique
+                and set(declaration.get_fields()) == set(filters.keys())):
+            return declaration
+    return None
+
+def get_index_report():
+    """
+    Compares the indexes of each collection with their declarations.
+    Unused indexes have not been used since the MongoDB server started, according to $indexStats.
+    """
+    report = {}
+    for collection_type, collection in collections_dict.items():
+        declarations = {declaration.name: declaration for declaration in INDEX_DECLARATIONS if declaration.collection_type == collection_type}
+        index_information = collection.index_information()
+
+        try:
+            usage = {stats["name"]: stats["accesses"]["ops"] for stats in collection.aggregate([{"$indexStats": {}}])}
+        except OperationFailure:
+            usage = {}
+
+        report[collection.name] = {
+            "missing": [name for name in declarations if name not in index_information],
+            "mismatched": [name for name, declaration in declarations.items()
+                           if name in index_information and declaration.matches(index_information[name]) == False],
+            "undeclared": [name for name in index_information if name not in declarations and name != "_id_"],
+            "unused": [name for name, ops in usage.items() if ops == 0 and name != "_id_"],
+            "usage": usage,
+        }
+    return report
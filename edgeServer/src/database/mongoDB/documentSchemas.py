@@ -5,7 +5,7 @@ documents that don't have a exact class representation (from another script or w
 """
 from typing import Optional
 from bson import ObjectId
-from pydantic import BaseModel, StringConstraints, constr
+from pydantic import BaseModel, StringConstraints, constr, model_validator
 
 from editingClientSessioning.roomObjects.meshInstance import MeshInstance
 from editingClientSessioning.roomObjects.markerInstance import MarkerInstance
@@ -23,11 +23,19 @@ class ModelData_Document(BaseModel):
 class ModelObject_Document(BaseModel):
     data_ref_id: constr(to_lower=True)
     version: constr(max_length=8)
+    # Numeric copy of version, so the latest version can be sorted and indexed in MongoDB. None if version is not a number.
+    version_num: Optional[int] = None
     filetype: constr(max_length=8)
     has_thumbnail: bool = False
     model_filename: str = None
     thumbnail_filename: str = None
 
+    @model_validator(mode="after")
+    def set_version_num(self):
+        if self.version_num == None and self.version.isdecimal():
+            self.version_num = int(self.version)
+        return self
+
     class Config:
         json_encoders = {ObjectId: str}
 
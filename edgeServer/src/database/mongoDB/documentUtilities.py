@@ -1,5 +1,6 @@
 from typing import Any, Optional
-from  database.mongoDB.types import CollectionType, collections_dict
+from pymongo import ReturnDocument
+from  database.mongoDB.types import CollectionType, DocumentType, collections_dict
 
 def check_unique_filter(collectionType: CollectionType, filters) -> int:
     """
@@ -11,7 +12,8 @@ def check_unique_filter(collectionType: CollectionType, filters) -> int:
         -1 - if no documents match the specified filter.
     """
     global collections_dict
-    count = collections_dict[collectionType].count_documents(filters)
+    # Two matches are enough to know the filter is not unique.
+    count = collections_dict[collectionType].count_documents(filters, limit=2)
     match count:
         case 0:
             return -1   #Document does not exist
@@ -29,40 +31,79 @@ def get_unique_document(collectionType: CollectionType, db_filter: Any, db_proje
         Found document if the filter is unique OR
         None if multiple or zero documents match the filter.
     """
-    unique_state = check_unique_filter(collectionType, db_filter)
-    if unique_state == 1:
-        return collections_dict[collectionType].find_one(db_filter, db_projection)
-    elif unique_state == 0:
-        pass
-    elif unique_state == -1:
-        pass
-    return None        
+    # Fetching up to two documents tells if the filter is unique in the same round trip.
+    documents = list(collections_dict[collectionType].find(db_filter, db_projection).limit(2))
+    if len(documents) == 1:
+        return documents[0]
+    return None
 
 def check_latest_filter(collectionType: CollectionType, filters) -> int:
+    """
+    Returns the highest numeric version of the documents matching the filter, or 0 if there are none.
+    """
     global collections_dict
-    count = collections_dict[collectionType].count_documents(filters)
-    match count:
-        case 0:
-            return 0   #No docs of reconstruction exist
-        case val if val >= 1:
-            latestIteration = None
-            latestIterationDoc = None
+    latestIterationDoc = collections_dict[collectionType].find_one(
+        filters | {"version_num": {"$type": "int"}},
+        sort=[("version_num", -1)],
+    )
+
+    if latestIterationDoc == None:
+        print("No valid versions found.")
+        return 0    # No docs of reconstruction exist, or none have a numeric version
 
-            docs = collections_dict[collectionType].find(filters)
+    print("Document with highest 'version':", latestIterationDoc)
+    return latestIterationDoc["version_num"]
 
-            for doc in docs:
-                if "version" in doc:
-                    try:
-                        checkedIteration = int(doc["version"])
-                        if latestIteration is None or checkedIteration > latestIteration:
-                            latestIteration = checkedIteration
-                            latestIterationDoc = doc
-                    except ValueError:
-                        print(f"Invalid number in 'version': {doc['version']}")
+def get_latest_versions(collectionType: CollectionType, uids: list[str], filetype: str = ".glb") -> dict[str, DocumentType]:
+    """
+    Returns the document with the highest numeric version of the given filetype for each 'data_ref_id', in one query.
+    Uids without any such document are left out.
+
+    Sorting follows the (data_ref_id, filetype, version_num) index, so each group's first document is its latest version.
+    """
+    pipeline = [
+        {"$match": {"data_ref_id": {"$in": uids}, "filetype": filetype, "version_num": {"$type": "int"}}},
+        {"$sort": {"data_ref_id": 1, "filetype": 1, "version_num": -1}},
+        {"$group": {"_id": "$data_ref_id", "doc": {"$first": "$$ROOT"}}},
+    ]
+    return {group["_id"]: group["doc"] for group in collections_dict[collectionType].aggregate(pipeline)}
 
-            if latestIterationDoc:
-                print("Document with highest 'version':", latestIterationDoc)
-                return latestIteration
-            else:
-                print("No valid versions found.")
-                return 0    # No version found for some reason
+def backfill_version_nums(collectionType: CollectionType) -> int:
+    """
+    Sets 'version_num' on documents registered before the field existed. Returns the number of documents updated.
+    """
+    update_result = collections_dict[collectionType].update_many(
+        {"version_num": {"$exists": False}, "version": {"$regex": "^[0-9]+$"}},
+        [{"$set": {"version_num": {"$toInt": "$version"}}}],
+    )
+    return update_result.modified_count
+
+def next_counter_value(counter: str) -> int:
+    """
+    Atomically increments a counter document and returns its new value, starting from 1.
+    Used to hand out unique ids without checking which ids are taken.
+    """
+    counter_doc = collections_dict[CollectionType.COUNTERS].find_one_and_update(
+        {"_id": counter},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter_doc["value"]
+
+def seed_counter(counter: str, minimum: int):
+    """
+    Raises a counter to at least `minimum`, so ids handed out after it never collide with ids up to `minimum`.
+    """
+    collections_dict[CollectionType.COUNTERS].update_one({"_id": counter}, {"$max": {"value": minimum}}, upsert=True)
+
+def get_max_value(collectionType: CollectionType, field: str) -> int:
+    """
+    Returns the highest numeric value of a field in the collection, or 0 if no document has one.
+    """
+    max_doc = collections_dict[collectionType].find_one(
+        {field: {"$type": "number"}},
+        {field: 1},
+        sort=[(field, -1)],
+    )
+    return int(max_doc[field]) if max_doc != None else 0
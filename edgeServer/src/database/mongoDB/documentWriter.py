@@ -1,7 +1,9 @@
 from database.mongoDB.types import DocumentType, CollectionType, collections_dict
 from database.mongoDB.documentUtilities import check_unique_filter
+from database.mongoDB.documentIndexes import get_unique_index
 from fastapi.encoders import jsonable_encoder
 from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
 from typing import Any
 
 
@@ -10,9 +12,13 @@ def upload_unique_object(collectionType: CollectionType, object: Any, filters: A
     This is a helper function to convert objects into a document.
     Uses filters to ensure object is unique in collection.
     Filter ideally uses a variables from the object as unique id to ensure object is unique.
+
+    Writes are single upserts. When no unique index covers the filter, matches are counted first
+    so an overwrite still fails if the filter is not unique.
     """
     json_document: DocumentType = None
     collection: Collection = None
+    update_result = None
 
     #Create json formatted type from to_dict() function if it has one, else use fastapi jsonable_encoder
     if hasattr(object, "to_dict") and callable(getattr(object, "to_dict")):
@@ -24,24 +30,34 @@ def upload_unique_object(collectionType: CollectionType, object: Any, filters: A
     if collectionType in collections_dict:
         collection = collections_dict[collectionType]
 
-    #Check unique query
-    unique_state = check_unique_filter(collectionType, filters)
-    
-    update_result = None
-
-    #Update/upload document to database
-    if unique_state == 1:
-        if overwrite:
-            update_result = collection.update_one(filters, {"$set": json_document})
-        else:
+    #Without overwrite, only insert if nothing matches the filter. Matching documents are left untouched.
+    if overwrite == False:
+        try:
+            update_result = collection.update_one(filters, {"$setOnInsert": json_document}, upsert=True)
+        except DuplicateKeyError as error:
+            # Either inserted by a concurrent upload after this filter matched nothing,
+            # or the document clashes on a unique index the filter does not cover.
+            print("Document conflicts with an existing document on a unique index: ", error)
+            return False
+        if update_result.upserted_id == None:
             print("Filter used will override existing document with upload. Specify parameter override = True if this is desired behaviour")
             return False
-    elif unique_state == 0:
-        print("Specified filter returns ${doc_count} documents. Filter must set criteria to return only a unique document!")
-        return False
-    elif unique_state == -1:
-        update_result = collection.insert_one(json_document)
+        return update_result.acknowledged
+
+    #A unique index guarantees the filter matches at most one document, so it does not need to be counted first.
+    if get_unique_index(collectionType, filters) == None:
+        unique_state = check_unique_filter(collectionType, filters)
+        if unique_state == 0:
+            print("Specified filter returns multiple documents. Filter must set criteria to return only a unique document!")
+            return False
+
+    #Update/upload document to database
+    try:
+        update_result = collection.update_one(filters, {"$set": json_document}, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent upload inserted the document first, update it instead.
+        update_result = collection.update_one(filters, {"$set": json_document})
 
     if update_result.acknowledged:
         return True
-    return False
\ No newline at end of file
+    return False
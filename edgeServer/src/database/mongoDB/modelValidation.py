@@ -248,4 +248,4 @@ def flush_and_regenerate_reconstructions():
                 thumbnail_filename= thumbnail
             )
 
-            documentWriter.upload_unique_object(CollectionType.RECONSTRUCTIONS, obj_doc, {"data_ref_id": key, "version": version})
\ No newline at end of file
+            documentWriter.upload_unique_object(CollectionType.RECONSTRUCTIONS, obj_doc, {"data_ref_id": key, "version": version, "filetype": ext})
\ No newline at end of file
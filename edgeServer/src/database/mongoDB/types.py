@@ -10,10 +10,14 @@ class CollectionType(IntEnum):
     ROOMS = 1
     RECONSTRUCTIONS = 2
     USERS = 3
+    COUNTERS = 4
 
 MONGO_DB_URI = "mongodb://localhost:27017/"
 MONGO_DB_NAME="democonstructdb"
 
+# Counter documents in the COUNTERS collection, keyed by _id.
+ROOM_ID_COUNTER = "room_id"
+
 
 mongo_client: MongoClient = None
 mongo_database: Database = None
@@ -1,7 +1,7 @@
 from pymongo import MongoClient
 from typing import Dict
 from fastapi import APIRouter
-from database.mongoDB import types, modelValidation
+from database.mongoDB import types, modelValidation, documentUtilities, documentIndexes
 
 router = APIRouter(tags=["mongodbConfigRouter"], prefix="/configdb")
 
@@ -30,6 +30,19 @@ def startup_router():
     types.collections_dict[types.CollectionType.RECONSTRUCTIONS] = db["reconstructions"]
     types.collections_dict[types.CollectionType.ROOMS] = db["rooms"]
     types.collections_dict[types.CollectionType.USERS] = db["users"]
+    types.collections_dict[types.CollectionType.COUNTERS] = db["counters"]
+
+    # Latest version lookups sort and group on the numeric version.
+    backfilled = documentUtilities.backfill_version_nums(types.CollectionType.RECONSTRUCTIONS)
+    if backfilled > 0:
+        print(f"# Backfilled version_num on {backfilled} reconstruction documents")
+
+    documentIndexes.ensure_indexes()
+    # Fail before serving if a query has no index, rather than scanning collections under load.
+    documentIndexes.verify_query_patterns()
+
+    # Rooms created before the counter existed used random ids, new ids start above them.
+    documentUtilities.seed_counter(types.ROOM_ID_COUNTER, documentUtilities.get_max_value(types.CollectionType.ROOMS, "room_id"))
 
     print("# MongoDB setup successful")
 
@@ -51,6 +64,10 @@ def ping_client():
     print("failed ping")
     return {"mongodb ping": "fail"}
 
+@router.get("/indexes")
+def get_indexes():
+    return documentIndexes.get_index_report()
+
 # TODO: Check if still in use
 @router.get("/validate_reconstructions")
 def validate_reconstructions(code: int = 0):
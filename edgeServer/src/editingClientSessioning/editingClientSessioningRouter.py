@@ -1,14 +1,27 @@
+import os
+from urllib.parse import quote
+
 from colorama import Fore, Back, Style
 
-from fastapi import APIRouter, File
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, File, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 
-from utililites import modelIOTools
+from utililites import downloadTokens, modelIOTools, thumbnailCache, zipStreaming
 
-# from editingClientSessioning import  editingClientServer
+from editingClientSessioning import editingServer
 
 router = APIRouter(tags=["editingClientSessioningRouter"])
 
+@router.get("/editingServer/metrics")
+def get_editing_server_metrics():
+    if editingServer.EditingServer.instance == None:
+        return JSONResponse(status_code=503, content={"error": "Editing server is not running"})
+
+    return {
+        "rooms": editingServer.EditingServer.instance.get_room_metrics(),
+        "persistence": editingServer.EditingServer.instance.room_persister.get_stats(),
+    }
+
 @router.get("/editing/{type}/{fileName}")
 async def downloadEditingAsset(type: str, fileName: str):
     try:
@@ -105,3 +118,64 @@ async def download_model_by_version(modelName: str, modelVersion: str, fileName:
         # Catch any other unexpected errors
         return JSONResponse(status_code=500, content={"error": f"An error occurred: {e}"})
 
+@router.get(modelIOTools.downloadModelZipEndpoint + "/{token}")
+def download_model_zip(token: str, request: Request):
+    """
+    Streams a model zip prepared by `CodeToServer.Download_ModelZipFile`. Supports single byte range requests.
+    """
+    download = downloadTokens.resolve(token)
+    if download == None:
+        return JSONResponse(status_code=404, content={"error": "Download link is invalid or has expired"})
+
+    try:
+        model_zip = modelIOTools.create_model_zip(download["model_dir"], download["info_text"])
+    except (OSError, ValueError) as e:
+        return JSONResponse(status_code=500, content={"error": f"An error occurred: {e}"})
+
+    etag = model_zip.get_etag()
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": "attachment; filename*=UTF-8''" + quote(download["file_name"]),
+    }
+
+    # A range only applies if the archive has not changed since the client got the ETag.
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = model_zip.parse_range(request.headers.get("range"))
+        except zipStreaming.ZipRangeError:
+            return Response(status_code=416, headers=headers | {"Content-Range": f"bytes */{model_zip.size}"})
+
+    if byte_range == None:
+        headers["Content-Length"] = str(model_zip.size)
+        return StreamingResponse(model_zip.iter_range(), media_type="application/zip", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{model_zip.size}"
+    return StreamingResponse(model_zip.iter_range(start, end), status_code=206, media_type="application/zip", headers=headers)
+
+@router.get(thumbnailCache.thumbnailEndpoint + "/{modelID}/{modelVersion}/{fileName}")
+def download_model_thumbnail(modelID: str, modelVersion: str, fileName: str, request: Request):
+    """
+    Serves model preview thumbnails from `thumbnailCache`. URLs are versioned, so clients may cache them indefinitely.
+    """
+    captures_dir = os.environ.get('CAPTURE_DIRECTORY', default='captures')
+    path = thumbnailCache.resolve_thumbnail_path(captures_dir, modelID, modelVersion, fileName)
+    if path == None:
+        return JSONResponse(status_code=400, content={"error": "Invalid thumbnail path"})
+    cache_key = thumbnailCache.get_cache_key(modelID, modelVersion, fileName, path)
+    if cache_key == None:
+        return JSONResponse(status_code=404, content={"error": "Thumbnail not found"})
+
+    etag = thumbnailCache.make_etag(cache_key)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        thumbnail = thumbnailCache.cache.get(cache_key, path)
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"error": "Thumbnail not found"})
+    return Response(content=thumbnail.data, media_type="image/png", headers=headers)
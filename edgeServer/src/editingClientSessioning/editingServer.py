@@ -6,12 +6,14 @@ This script defines a the editing server class that acts as the main logic class
 multi-user editing of scene.
 """
 import asyncio
-import time
-import threading
-import random
+import functools
+import os
+import struct
+from collections import OrderedDict
 
+from database import ioExecutor
 from database.mongoDB import documentUtilities
-from database.mongoDB.types import CollectionType
+from database.mongoDB.types import CollectionType, ROOM_ID_COUNTER
 
 from editingClientSessioning.roomActions import roomAnnotationActions, roomMeasurementActions
 from editingClientSessioning.roomManagement.roomInstanceManager import RoomInstanceManager
@@ -19,8 +21,12 @@ from editingClientSessioning.roomObjects.meshInstance import MeshInstance
 from editingClientSessioning.roomObjects.userInstance import UserInstance
 from editingClientSessioning.roomActions import roomActions
 from editingClientSessioning.roomManagement.roomInstance import RoomInstance
+from editingClientSessioning.roomManagement.roomTickScheduler import RoomTickScheduler
+from editingClientSessioning.roomManagement.roomPersister import RoomPersister
+from editingClientSessioning.roomManagement.roomInterest import RoomInterest
+from editingClientSessioning.roomManagement import roomDeltaTracker, roomSnapshot
 
-from websocketCommunications import websocketEnums, websocketHandler
+from websocketCommunications import binaryTransforms, websocketEnums, websocketHandler
 
 from enum import StrEnum
 
@@ -36,12 +42,30 @@ class EditingServer:
     loop = None
 
     def __init__(self):
-        self.tick_interval: float = 0.05  # Server update tick every 0.0166 seconds
+        # Bounds of each room's tick rate in ticks per second. Busy rooms tick at max, idle rooms decay to min.
+        self.min_tick_rate: float = float(os.environ.get('ROOM_MIN_TICK_RATE', default=2.0))
+        self.max_tick_rate: float = float(os.environ.get('ROOM_MAX_TICK_RATE', default=30.0))
+        # Seconds a session update may wait to be sent before its user is sent the latest state only.
+        self.slow_consumer_lag: float = float(os.environ.get('ROOM_SLOW_CONSUMER_LAG', default=0.25))
+        # Objects per chunk of a chunked room snapshot, and bytes a connection may have queued before the next chunk is sent.
+        self.snapshot_chunk_size: int = int(os.environ.get('ROOM_SNAPSHOT_CHUNK_SIZE', default=256))
+        self.snapshot_max_queued_bytes: int = int(os.environ.get('ROOM_SNAPSHOT_MAX_QUEUED_BYTES', default=1024 * 1024))
+        # Interest management is off unless a radius is set. Far changes are sent with every Nth session update of a user.
+        self.interest_radius: float = float(os.environ.get('ROOM_INTEREST_RADIUS', default=0.0))
+        self.interest_cell_size: float = float(os.environ.get('ROOM_INTEREST_CELL_SIZE', default=self.interest_radius))
+        self.interest_far_update_interval: int = int(os.environ.get('ROOM_INTEREST_FAR_INTERVAL', default=10))
         self.room_instances: dict[int, RoomInstance] = {} # Holds room_instances that represent 3D scene containing models and users.
+        # Loads in progress, awaited by every join to a room that is being loaded.
+        self.room_loads: dict[int, asyncio.Task] = {}
+        # Recently closed rooms, already saved to MongoDB, reused when the room is joined again.
+        self.closed_rooms: OrderedDict[int, RoomInstance] = OrderedDict()
+        self.closed_room_cache_size: int = int(os.environ.get('ROOM_CLOSED_CACHE_SIZE', default=16))
         self.editing_users: dict[any, UserInstance] = {}  # Key value pairs of WebSocket <-> Users
         self.room_file_manager = RoomInstanceManager("rooms/")
 
-        self.update_loop_thread = None
+        self.tick_scheduler = RoomTickScheduler(self._tick_room, self.min_tick_rate, self.max_tick_rate)
+        # Changes to loaded rooms are written to MongoDB every few seconds, so a crash loses at most that much editing.
+        self.room_persister = RoomPersister(float(os.environ.get('ROOM_PERSIST_INTERVAL', default=5.0)))
         
         self.is_running = False
 
@@ -57,27 +81,39 @@ class EditingServer:
             self.check_disconnected_websocket
         )
 
-        # Start update loop
-        self.update_loop_thread = threading.Thread(target=self._threaded_broadcast_room_update_to_clients_loop)
-        self.update_loop_thread.start()
+        # Rooms are ticked on the event loop as they get loaded.
+        self.is_running = True
+        self.tick_scheduler.start()
+        self.room_persister.start()
 
-    def shutdown(self):
+    async def shutdown(self):
         self.is_running = False
-        pass
+        self.tick_scheduler.stop()
+
+        # Apply edits that were waiting for a tick, so they are saved as well.
+        for room in self.room_instances.values():
+            room.process_pending_actions()
+            room.collect_tick_changes()
+            room.post_update()
+        try:
+            await self.room_persister.stop()
+        except Exception as e:
+            # Keep the operation logs, so the rooms are recovered from them when next loaded.
+            print("# Failed to save rooms on shutdown: ", e)
+            for room in self.room_instances.values():
+                if room.operation_log != None:
+                    await room.operation_log.write_pending()
+            return
+
+        for room in self.room_instances.values():
+            if room.operation_log != None:
+                await room.operation_log.remove()
 
     def create_RoomInstance_data(self, room_name, baseReconstruction, authors):
         """
         Creates a new `RoomInstance` class data.
         """
-        rand_id = random.randint(0, 1000)
-        filter = {
-            "room_id": rand_id
-        }
-        exists = documentUtilities.check_unique_filter(CollectionType.ROOMS, filter)
-        while exists != -1:
-            rand_id = random.randint(0, 1000)
-            filter["room_id"] = rand_id
-            exists = documentUtilities.check_unique_filter(CollectionType.ROOMS, filter)
+        room_id = documentUtilities.next_counter_value(ROOM_ID_COUNTER)
 
         baseReconstructionRef = MeshInstance((baseReconstruction,"__LIVE_VERSION"), 
                                              1,
@@ -86,7 +122,7 @@ class EditingServer:
                                              [0,0,0], [0,0,0], [1,1,1], False)
         baseReconstructionDict = {1: baseReconstructionRef}
         
-        newRoom: RoomInstance = RoomInstance(room_id=rand_id, name=room_name, baseReconstruction=baseReconstruction, authors=authors, 
+        newRoom: RoomInstance = RoomInstance(room_id=room_id, name=room_name, baseReconstruction=baseReconstruction, authors=authors, 
                                                 mesh_dict=baseReconstructionDict, mesh_creation_count=1,
                                                 marker_dict= {}, marker_creation_count=0,
                                                 annotation_dict= {}, annotation_count=0)#, type=room_type)
@@ -105,7 +141,8 @@ class EditingServer:
         authors = jsonData["authors"]
 
         collect_type = CollectionType.RECONSTRUCTIONS
-        collectCheck = documentUtilities.check_unique_filter(
+        collectCheck = await ioExecutor.run_blocking(
+            documentUtilities.check_unique_filter,
             collect_type,
             {'data_ref_id': baseReconstruction,
              'version': "1",
@@ -113,11 +150,14 @@ class EditingServer:
             )
         # exist, dont care if its unique or not.
         if collectCheck >= 1 : 
-            room = self.create_RoomInstance_data(room_name, baseReconstruction, authors)
-            self.room_file_manager.save_to_mongodb(room)
+            room = await ioExecutor.run_blocking(self.create_RoomInstance_data, room_name, baseReconstruction, authors)
+            await ioExecutor.run_blocking(self.room_file_manager.save_to_mongodb, room, timeout=None)
 
-            for editing_user in self.editing_users.values():
-                await websocketHandler.send_json_to_socket(editing_user.websocket, websocketHandler.CodeToClient.Room_Previews_Update, {})
+            await websocketHandler.broadcast_to_sockets(
+                [editing_user.websocket for editing_user in self.editing_users.values()],
+                websocketHandler.CodeToClient.Room_Previews_Update,
+                {},
+            )
 
             reply = {}
             reply["success"] = "true"
@@ -142,63 +182,270 @@ class EditingServer:
         server = EditingServer.instance
         send_data = {"new_id": capture_id}
 
-        for room in server.room_instances.values():
-            room.thread_lock.acquire()
-            for editing_user in room.editing_users.values():
-                await websocketHandler.send_json_to_socket(
+        await websocketHandler.broadcast_to_sockets(
+            [editing_user.websocket for room in server.room_instances.values() for editing_user in room.editing_users.values()],
+            websocketEnums.CodeToClient.New_Reconstruction,
+            send_data,
+        )
+
+    async def _tick_room(self, room: RoomInstance) -> bool:
+        """
+        Called by `RoomTickScheduler` on the event loop.
+        Processes the pending actions of a room and broadcasts the updates to all clients in the room.
+
+        Returns False once the room is empty, which stops the room from being ticked.
+        """
+        room.process_pending_actions()
+        room.collect_tick_changes()
+        if room.operation_log != None and room.operation_log.has_pending_lines():
+            EditingServer.loop.create_task(self._write_operation_log(room))
+
+        # Build a delta update for each client, from the last sequence number it received or acknowledged.
+        # Clients on the same base sequence share the same update, which is serialized once for all of them.
+        users_by_base: dict[tuple[int, bool, bool], list[UserInstance]] = {}
+        for editing_user in room.editing_users.values():
+            if editing_user.is_loading_snapshot or self._is_waiting_on_slow_consumer(editing_user):
+                continue
+            update_key = (editing_user.get_delta_base(), editing_user.uses_field_deltas, editing_user.uses_binary_transforms)
+            # With interest management every user gets their own update.
+            if room.interest != None:
+                self._queue_interest_update(room, editing_user, update_key)
+                continue
+            users_by_base.setdefault(update_key, []).append(editing_user)
+
+        for update_key, editing_users in users_by_base.items():
+            update_data = room.build_session_update(*update_key)
+            # Up to date clients are skipped.
+            if update_data == None:
+                continue
+
+            frames = self._encode_session_update(update_data)
+            for editing_user in editing_users:
+                editing_user.sent_sequence = room.delta_tracker.sequence
+                websocketHandler.queue_session_update_to_socket(
                     editing_user.websocket,
-                    websocketEnums.CodeToClient.New_Reconstruction,
-                    send_data,
+                    frames,
+                    update_key[0],
+                    functools.partial(self._on_session_update_dropped, room, editing_user),
                 )
-            room.thread_lock.release()
 
-    def _threaded_broadcast_room_update_to_clients_loop(self):
+        room.post_update()
+        if len(room.editing_users) == 0:
+            print("Found Empty Room!")
+            EditingServer.loop.create_task(self._close_empty_room(room))
+            return False
+
+        return True
+
+    async def _send_room_snapshot(self, room: RoomInstance, editing_user: UserInstance, sequence: int, chunks: list[list[tuple[str, any]]]):
         """
-        Main func that broadcasts all udpates in each room to all clients in the room.
+        Sends a chunked room snapshot, one chunk at a time so other connections and rooms are served in between.
+        Objects are serialized as their chunk is sent, and may be newer than `sequence`. Session updates resume
+        from `sequence` once every chunk is queued, and they carry the latest state of everything changed since.
         """
-        self.is_running = True
-        while True:
-            empty_rooms: list[int] = []
-            for room in self.room_instances.values():
-                room.thread_lock.acquire()
-                room.process_pending_actions()
-
-                # Create a json array to send to clients.
-                # Populate each array and element with things to be updated
-                update_data = {}
-                update_data["room_id"] = room.room_id
-                update_data["mesh_updates"] = room.get_dirty_mesh_instances()
-                update_data["user_updates"] = room.get_user_instances()
-                update_data["marker_updates"] = room.get_dirty_marker_update()
-                update_data["annotation_updates"] = room.get_dirty_annotations_updates()
-                update_data["measurement_updates"] = room.get_dirty_measurement_updates()
-
-                # Send update_data to each websocket in the room
-                for editing_user in room.editing_users.values():
-                    EditingServer.loop.create_task( 
-                        websocketHandler.send_json_to_socket(
-                            editing_user.websocket,
-                            websocketEnums.CodeToClient.EditRoom_ServerSend_SessionUpdate,
-                            update_data,
-                        )
-                    )
-
-                room.post_update()
-                if len(room.editing_users) == 0:
-                    print("Found Empty Room!")
-                    empty_rooms.append(room.room_id)
-
-                room.thread_lock.release()
-
-            for room_id in empty_rooms:
-                self.room_file_manager.save_to_mongodb(self.room_instances[room_id])
-                del self.room_instances[room_id]
-
-            time.sleep(self.tick_interval)
-
-            if self.is_running == False:
+        try:
+            for index, objects in enumerate(chunks):
+                connection = websocketHandler.get_connection(editing_user.websocket)
+                # Stop if the user left the room or disconnected.
+                if connection == None or connection.is_closed or editing_user.room_id != room.room_id:
+                    return
+
+                # Wait for earlier chunks to be sent rather than queueing the whole room at once.
+                while connection.queued_bytes > self.snapshot_max_queued_bytes and connection.is_closed == False:
+                    await asyncio.sleep(0.01)
+
+                chunk = roomSnapshot.build_chunk(objects)
+                chunk["room_id"] = room.room_id
+                chunk["sequence"] = sequence
+                chunk["chunk_index"] = index
+                chunk["chunk_count"] = len(chunks)
+                websocketHandler.queue_frames_to_socket(
+                    editing_user.websocket,
+                    [websocketHandler.encode_message(websocketEnums.CodeToClient.EditRoom_ServerSend_SnapshotChunk, chunk)],
+                )
+                await asyncio.sleep(0)
+        finally:
+            editing_user.is_loading_snapshot = False
+            room.request_tick()
+
+    @staticmethod
+    async def _write_operation_log(room: RoomInstance):
+        """
+        Appends the actions applied by a tick to the room's operation log, or snapshots the room if the log is long.
+        Runs after the tick, so deleted objects are already gone from the snapshot.
+        """
+        try:
+            if room.operation_log.needs_snapshot():
+                await room.operation_log.compact(room)
+            else:
+                await room.operation_log.write_pending()
+        except Exception as e:
+            print(f"# Failed to write operation log of room {room.room_id}: ", e)
+
+    def _queue_interest_update(self, room: RoomInstance, editing_user: UserInstance, update_key: tuple[int, bool, bool]):
+        """
+        Queues a session update that leaves out changes far from the user.
+        Every `far_update_interval` updates, the update is a delta from when far changes were last sent instead, so it includes them.
+        """
+        base_sequence, field_deltas, binary_transforms = update_key
+        far_sequence = min(editing_user.far_sequence, base_sequence)
+
+        if room.interest.is_far_update(editing_user):
+            update_data = room.build_session_update(far_sequence, field_deltas, binary_transforms)
+            editing_user.far_sequence = room.delta_tracker.sequence
+        else:
+            is_far = room.interest.get_far_filter(editing_user)
+            held_back = [False]
+
+            def far_filter(key, obj, fields) -> bool:
+                if is_far(key, obj, fields):
+                    held_back[0] = True
+                    return True
+                return False
+
+            update_data = room.build_session_update(base_sequence, field_deltas, binary_transforms, far_filter)
+            # Nothing is waiting for a far update, so the room does not need to keep ticking for one.
+            if held_back[0] == False and editing_user.far_sequence >= base_sequence:
+                editing_user.far_sequence = room.delta_tracker.sequence
+
+        # Held back changes are sent from `far_sequence`, so the user is up to date as far as the next tick is concerned.
+        editing_user.sent_sequence = room.delta_tracker.sequence
+        if update_data == None or self._is_empty_session_update(update_data):
+            return
+
+        websocketHandler.queue_session_update_to_socket(
+            editing_user.websocket,
+            self._encode_session_update(update_data),
+            update_data["base_sequence"],
+            functools.partial(self._on_interest_update_dropped, room, editing_user, far_sequence),
+        )
+
+    @staticmethod
+    def _is_empty_session_update(update_data: dict[str, any]) -> bool:
+        if update_data.get("full_state", False):
+            return False
+        lists = roomDeltaTracker.UPDATE_KINDS + tuple(roomDeltaTracker.BINARY_TRANSFORM_KINDS.values())
+        return all(len(update_data.get(kind, [])) == 0 for kind in lists)
+
+    @staticmethod
+    def _on_interest_update_dropped(room: RoomInstance, editing_user: UserInstance, far_sequence: int, base_sequence: int):
+        """
+        Like `_on_session_update_dropped`, also resending far changes the dropped update may have carried.
+        """
+        editing_user.far_sequence = min(editing_user.far_sequence, far_sequence)
+        EditingServer._on_session_update_dropped(room, editing_user, base_sequence)
+
+    def _is_waiting_on_slow_consumer(self, editing_user: UserInstance) -> bool:
+        """
+        Tracks whether a user's connection keeps up with session updates. Returns True if the user should be skipped this tick.
+
+        A user whose oldest unsent frame is older than `slow_consumer_lag` is sent the latest state only:
+        no session update is queued while the previous one is unsent, and the next one covers everything since.
+        Users lagging past the connection's disconnect threshold are disconnected.
+        """
+        connection = websocketHandler.get_connection(editing_user.websocket)
+        if connection == None or connection.check_lag():
+            return True
+
+        lag = connection.get_lag()
+        if editing_user.is_lagging == False and lag > self.slow_consumer_lag:
+            editing_user.is_lagging = True
+            editing_user.lag_episodes += 1
+            print(f"# User {editing_user.id} is lagging by {lag * 1000:.0f}ms, sending latest state only")
+        elif editing_user.is_lagging and lag == 0.0:
+            editing_user.is_lagging = False
+            print(f"# User {editing_user.id} caught up")
+
+        return editing_user.is_lagging and connection.has_queued_update()
+
+    @staticmethod
+    def _on_session_update_dropped(room: RoomInstance, editing_user: UserInstance, base_sequence: int):
+        """
+        Called when a slow connection drops queued session updates.
+        The user is sent one delta covering the dropped updates with the next tick.
+        """
+        editing_user.sent_sequence = min(editing_user.sent_sequence, base_sequence)
+        room.request_tick()
+
+    @staticmethod
+    def _encode_session_update(update_data: dict[str, any]) -> list[str | bytes]:
+        """
+        Encodes a session update into the frames sent to clients.
+        Transforms split out for binary clients are packed into a binary frame, and the rest is sent as JSON if not empty.
+        """
+        frames = []
+        mesh_transforms = update_data.pop("mesh_transforms", None)
+        user_transforms = update_data.pop("user_transforms", None)
+
+        has_json_updates = any(len(update_data[kind]) > 0 for kind in roomDeltaTracker.UPDATE_KINDS)
+        if mesh_transforms == None or has_json_updates or update_data.get("full_state", False):
+            frames.append(websocketHandler.encode_message(websocketEnums.CodeToClient.EditRoom_ServerSend_SessionUpdate, update_data))
+
+        if mesh_transforms != None and (len(mesh_transforms) > 0 or len(user_transforms) > 0):
+            try:
+                frames.append(binaryTransforms.encode_session_update(
+                    update_data["sequence"], update_data["base_sequence"], mesh_transforms, user_transforms
+                ))
+            except (binaryTransforms.BinaryFrameError, struct.error) as e:
+                # Send the transforms as JSON instead, which every client can read.
+                print("# Sending transforms as JSON, they could not be packed: ", e)
+                update_data["mesh_updates"].extend(mesh.to_client_update_dict() for mesh in mesh_transforms)
+                update_data["user_updates"].extend(user.to_client_update_dict() for user in user_transforms)
+                frames = [websocketHandler.encode_message(websocketEnums.CodeToClient.EditRoom_ServerSend_SessionUpdate, update_data)]
+        return frames
+
+    async def _close_empty_room(self, room: RoomInstance):
+        """
+        Writes the remaining changes of an empty room to MongoDB off the event loop, then unloads it.
+        If a user joined while saving, the room is kept loaded and ticked again.
+        If the room could not be saved, it stays loaded and closing it is retried after the next periodic write.
+        """
+        try:
+            await self.room_persister.flush_room(room)
+        except Exception as e:
+            print(f"# Failed to save empty room {room.room_id}: ", e)
+
+        if len(room.editing_users) > 0:
+            self.tick_scheduler.schedule_room(room)
+            return
+
+        if self.room_instances.get(room.room_id) is room and room.has_unsaved_changes():
+            # Ticking the room again closes it once it is empty and saved.
+            EditingServer.loop.call_later(self.room_persister.interval, self._retry_close_room, room)
+            return
+
+        if self.room_instances.get(room.room_id) is room:
+            # The room is saved, so there is nothing to recover from its log.
+            # It stays loaded until its log is removed, so a join meanwhile reuses it instead of loading
+            # the room again and writing a new log that this removal would delete.
+            if room.operation_log != None:
+                await room.operation_log.remove()
+
+            # Unloaded by another close of the room meanwhile.
+            if self.room_instances.get(room.room_id) is not room:
+                return
+            if len(room.editing_users) > 0 or room.has_unsaved_changes():
+                # Joined while the log was being removed, start a new one.
+                if room.operation_log != None:
+                    await room.operation_log.compact(room)
+                self.tick_scheduler.schedule_room(room)
                 return
 
+            del self.room_instances[room.room_id]
+            self.room_persister.untrack_room(room)
+            self.closed_rooms[room.room_id] = room
+            self.closed_rooms.move_to_end(room.room_id)
+            while len(self.closed_rooms) > self.closed_room_cache_size:
+                self.closed_rooms.popitem(last=False)
+        self.tick_scheduler.forget_room(room.room_id)
+
+    def _retry_close_room(self, room: RoomInstance):
+        """
+        Ticks a room that could not be saved when it was closed, unless it was unloaded since.
+        """
+        if self.room_instances.get(room.room_id) is room:
+            self.tick_scheduler.schedule_room(room)
+
     def process_batch_update_from_client(self, websocket, jsonData: dict[str, any]):
         """
         Processes data sent from a client user containing updates done by the user on their end.
@@ -213,9 +460,17 @@ class EditingServer:
             reply["success"] = "false"
             return reply
 
+        # Clients using delta acks send back the last session update sequence they applied.
+        if "ack_sequence" in jsonData:
+            self.editing_users[websocket].acknowledge_sequence(jsonData["ack_sequence"])
+
         # Create pending_action for array of states to be updated.
-        if len(jsonData["model_states"]) > 0:
-            room.add_pending_action(roomActions.BatchUpdateMeshInstance(jsonData["model_states"]))
+        # Malformed transforms are dropped here, as they could not be sent to binary clients.
+        model_states = [model_state for model_state in jsonData["model_states"] if binaryTransforms.is_valid_model_state(model_state)]
+        if len(model_states) < len(jsonData["model_states"]):
+            print(f"# Dropped {len(jsonData['model_states']) - len(model_states)} malformed mesh transforms from a batch update")
+        if len(model_states) > 0:
+            room.add_pending_action(roomActions.BatchUpdateMeshInstance(model_states))
 
         # Create pending action for each marker
         if len(jsonData["marker_states"]) > 0:
@@ -226,11 +481,17 @@ class EditingServer:
                 room.add_pending_action(roomActions.ModifyMarker(marker_info, action))
 
         # Create pending_action for user position.
-        room.add_pending_action(roomActions.UpdateUserPosition(
-                self.editing_users[websocket],
-                jsonData["user_position"],
-                jsonData["user_rotation"],
-            ))
+        # Clients streaming binary transforms send their pose in the binary frame and may leave it out of JSON batch updates.
+        if "user_position" in jsonData:
+            if (binaryTransforms.is_valid_vector(jsonData["user_position"]) == False
+                    or binaryTransforms.is_valid_vector(jsonData.get("user_rotation")) == False):
+                print("# Dropped a malformed user pose from a batch update")
+                return reply
+            room.add_pending_action(roomActions.UpdateUserPosition(
+                    self.editing_users[websocket],
+                    jsonData["user_position"],
+                    jsonData["user_rotation"],
+                ))
         
         return reply
 
@@ -238,6 +499,9 @@ class EditingServer:
         """
         Returns a dictionary with a list of room objects containing 
         users, meshes, markers in the `RoomInstance` for a websocket.
+
+        Clients that send `chunked` only get the users in the reply, and the other objects follow
+        in `EditRoom_ServerSend_SnapshotChunk` messages, see `_send_room_snapshot`.
         """
         result = {}
 
@@ -248,8 +512,26 @@ class EditingServer:
             result["success"] = "false"
             return result
 
+        # Session updates sent after this reply are deltas from the room state returned here.
+        editing_user = self.editing_users[websocket]
+        editing_user.reset_delta_base(room.delta_tracker.sequence)
+        result["sequence"] = room.delta_tracker.sequence
+
         # Build dictionary obj containing meshes in room
         result["user_instances"] = room.get_user_instances()
+
+        if jsonData.get("chunked", False):
+            chunk_size = max(1, int(jsonData.get("chunk_size", self.snapshot_chunk_size)))
+            ordered = roomSnapshot.get_snapshot_order(room, jsonData.get("position", editing_user.position))
+            chunks = roomSnapshot.split_into_chunks(ordered, chunk_size)
+            result["chunked"] = True
+            result["chunk_count"] = len(chunks)
+
+            # Chunks are queued after this reply, which is queued as soon as this returns.
+            editing_user.is_loading_snapshot = True
+            EditingServer.loop.create_task(self._send_room_snapshot(room, editing_user, result["sequence"], chunks))
+            return result
+
         result["mesh_instances"] = room.get_room_objects()
         result["marker_instances"] = room.get_marker_states()
         result["measurement_instances"] = room.get_measurement_updates()
@@ -328,38 +610,78 @@ class EditingServer:
 
 # ==================== Users response actions ====================
 
+    async def _get_room_instance(self, room_id: int) -> RoomInstance:
+        """
+        Returns a loaded room, reusing a recently closed one or loading it from MongoDB off the event loop.
+        Joins to a room that is already being loaded wait for that load instead of loading it again.
+        """
+        room = self.room_instances.get(room_id)
+        if room != None:
+            return room
+
+        room = self.closed_rooms.pop(room_id, None)
+        if room != None:
+            self._register_room_instance(room)
+            # Its log was removed when the room was closed, start a new one.
+            if room.operation_log != None:
+                await room.operation_log.compact(room)
+            return room
+
+        load = self.room_loads.get(room_id)
+        if load == None:
+            load = EditingServer.loop.create_task(self._load_room_instance(room_id))
+            self.room_loads[room_id] = load
+        # A join that is cancelled must not cancel the load other joins are waiting for.
+        return await asyncio.shield(load)
+
+    async def _load_room_instance(self, room_id: int) -> RoomInstance:
+        try:
+            room = await ioExecutor.run_blocking(self.room_file_manager.load_room_instance, room_id)
+            self._register_room_instance(room)
+            return room
+        finally:
+            del self.room_loads[room_id]
+
+    def _register_room_instance(self, room: RoomInstance):
+        self.room_instances[room.room_id] = room
+        self.room_persister.track_room(room)
+        if self.interest_radius > 0 and room.interest == None:
+            room.interest = RoomInterest(self.interest_radius, self.interest_cell_size, self.interest_far_update_interval)
+            room.interest.rebuild(room)
+
     def ws_start_room(self, jsonData: dict[str, any]):
         reply = {}
         reply["success"] = "true"
         return reply
 
-    def ws_join_room(self, websocket, jsonData: dict[str, any]):
+    async def ws_join_room(self, websocket, jsonData: dict[str, any]):
         reply = {}
         room_id: int = jsonData["room_id"]
 
-        # If room is not loaded, load room.
-        target_room_instance = None
-        if room_id not in self.room_instances:
-            target_room_instance = self.room_file_manager.load_room_instance(room_id)
-            self.room_instances[room_id] = target_room_instance
-        else:
-            target_room_instance = self.room_instances[room_id]
+        target_room_instance = await self._get_room_instance(room_id)
+
+        # The socket may have disconnected while the room was loading.
+        editing_user = self.editing_users.get(websocket)
+        if editing_user == None:
+            reply["success"] = "false"
+            return reply
 
         # Assign websocket to room instance.
-        editing_user = self.editing_users[websocket]
         editing_user.websocket = websocket
 
         # If websocket already has room assigned, disconnect from room.
         # Consider alternative method that returns error to client
         if editing_user.room_id != None:
-            room: RoomInstance = self.room_instances[editing_user.room_id]
-            room.remove_editing_user(editing_user)
+            room: RoomInstance = self.room_instances.get(editing_user.room_id)
+            if room != None:
+                room.remove_editing_user(editing_user)
+                room.request_tick()
             editing_user.room_id = None
 
         editing_user.room_id = target_room_instance.room_id
-        target_room_instance.thread_lock.acquire()
         target_room_instance.add_editing_user(editing_user)
-        target_room_instance.thread_lock.release()
+        target_room_instance.request_tick()
+        self.tick_scheduler.schedule_room(target_room_instance)
 
         reply["success"] = "true"
         return reply
@@ -395,9 +717,17 @@ class EditingServer:
         # If websocket does not exist in dictionary, create editing user and add to dictionary.
         jsonData = jsonData | {"user_id": self.user_connection_count}
         reply = reply | {"user_id": self.user_connection_count}
-        self.editing_users[websocket] = UserInstance(websocket, jsonData)
+        editing_user = UserInstance(websocket, jsonData)
+        self.editing_users[websocket] = editing_user
         self.user_connection_count += 1
 
+        # Reply with the delta protocol options the server accepted.
+        reply["delta_protocol"] = {
+            "delta_acks": editing_user.uses_delta_acks,
+            "field_deltas": editing_user.uses_field_deltas,
+            "binary_transforms": editing_user.uses_binary_transforms,
+        }
+
         reply["success"] = "true"
         return reply
 
@@ -423,9 +753,21 @@ class EditingServer:
             return self.editing_users[websocket].room_id
         return None
 
+    def get_room_metrics(self):
+        """
+        Returns tick statistics and the current tick rate for every room that has been ticked since it was loaded.
+        """
+        room_stats = self.tick_scheduler.get_room_stats()
+        for room_id, stats in room_stats.items():
+            room = self.room_instances.get(room_id)
+            stats["user_count"] = len(room.editing_users) if room != None else 0
+            stats["tick_rate_hz"] = round(room.tick_rate, 2) if room != None else 0.0
+            stats["lagging_users"] = [user.id for user in room.editing_users.values() if user.is_lagging] if room != None else []
+        return room_stats
+
 def create_instance() -> EditingServer:
     return EditingServer()
 
-def shutdown_instance():
+async def shutdown_instance():
     if EditingServer.instance != None:
-        EditingServer.instance.shutdown()
\ No newline at end of file
+        await EditingServer.instance.shutdown()
\ No newline at end of file
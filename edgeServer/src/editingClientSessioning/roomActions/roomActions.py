@@ -4,6 +4,8 @@ from editingClientSessioning.roomObjects.meshInstance import MeshInstance
 from editingClientSessioning.roomManagement.roomInstance import RoomInstance
 from editingClientSessioning.roomObjects.userInstance import UserInstance
 
+# Actions that change what is saved with a room implement `get_log_args`, returning the arguments to recreate them with.
+# They are appended to the room's operation log and replayed from it, see roomOperationLog.
 class GenericAction:
     def __init__(self, callback):
         self.callback = callback
@@ -16,8 +18,12 @@ class CreateMeshInstance:
     Creates mesh object and adds it to a `RoomInstance` object
     '''
     def __init__(self, dict_):
+        self.mesh_data = dict_
         self.mesh_instance = MeshInstance.create_new_instance_from_dict(dict_)
 
+    def get_log_args(self):
+        return [self.mesh_data]
+
     def invoke(self, room_instance: RoomInstance):
         self._add_mesh_instance_to_room(room_instance)
         pass
@@ -38,9 +44,15 @@ class BatchUpdateMeshInstance:
     """
     Handles the updating of meshes transforms in a `RoomInstance`.
     """
+    # Mesh transform updates mean a user is dragging something, so the room should tick faster.
+    is_interactive = True
+
     def __init__(self, model_states):
         self.model_states = model_states
 
+    def get_log_args(self):
+        return [self.model_states]
+
     def invoke(self, room_instance: RoomInstance):
         for model_state in self.model_states:
             mesh_instance = room_instance.get_mesh_instance_by_id(
@@ -54,12 +66,11 @@ class BatchUpdateMeshInstance:
             mesh_instance.rotation = model_state["rotation"]
             mesh_instance.scale = model_state["scale"]
 
+            # Changed transforms are picked up by the mesh's change tracking.
             if model_state["mark_delete"]:
                 mesh_instance.mark_delete = True
                 room_instance.deleted_meshes.append(mesh_instance.mesh_instance_id)
 
-            mesh_instance.is_dirty = True
-
 class ModifyMarker:
     """
     Handles the updating, adding, or removing of markers in a `RoomInstance`
@@ -68,6 +79,9 @@ class ModifyMarker:
         self.marker_data = marker_data
         self.action = action
 
+    def get_log_args(self):
+        return [self.marker_data, int(self.action)]
+
     def invoke(self, room_instance: RoomInstance):
         ref_marker: MarkerInstance | None
 
@@ -84,6 +98,7 @@ class ModifyMarker:
                                             self.marker_data["type"], 
                                             self.marker_data["visibility"])
                 ref_marker.marker_instance_id = room_instance.marker_creation_count
+                ref_marker.is_dirty = True
                 room_instance.marker_creation_count += 1
 
                 room_instance.global_instance_count += 1
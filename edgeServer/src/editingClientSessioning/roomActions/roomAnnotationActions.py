@@ -8,8 +8,12 @@ class CreateAnnotationInstance:
     Creates annotation object and adds it to a `RoomInstance` object
     '''
     def __init__(self, dict_):
+        self.annotation_data = dict_
         self.annotation_instance = AnnotationInstance.create_new_instance_from_dict(dict_)
 
+    def get_log_args(self):
+        return [self.annotation_data]
+
     def invoke(self, room_instance: RoomInstance):
         self._add_annotation_instance_to_room(room_instance)
         pass
@@ -29,15 +33,17 @@ class UpdateAnnotation:
     def __init__(self, annotation_data: dict[str, any]):
         self.annotation_data = annotation_data
 
+    def get_log_args(self):
+        return [self.annotation_data]
+
     def invoke(self, room_instance: RoomInstance):
         ref_anno: AnnotationInstance | None
 
         if self.annotation_data["annotation_instance_id"] not in room_instance.annotation_instance_dict:
             return
         ref_anno = room_instance.annotation_instance_dict[self.annotation_data["annotation_instance_id"]]
+        # changed fields are picked up by the annotation's change tracking
         ref_anno.update_from_json(self.annotation_data)
-        # set diry, marking for updates
-        ref_anno.is_dirty = True
 
         room_instance.annotation_instance_dict[ref_anno.annotation_instance_id] = ref_anno
 
@@ -45,6 +51,9 @@ class DeleteAnnotation:
     def __init__(self, annotation_data: dict[str, any]):
         self.annotation_data = annotation_data
 
+    def get_log_args(self):
+        return [self.annotation_data]
+
     def invoke(self, room_instance: RoomInstance):
         ref_anno: AnnotationInstance | None
 
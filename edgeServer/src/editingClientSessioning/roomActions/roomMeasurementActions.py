@@ -10,8 +10,12 @@ class CreateMeasurementInstance:
     Creates measurement object and adds it to a `RoomInstance` object
     '''
     def __init__(self, dict_):
+        self.measurement_data = dict_
         self.measurement_instance = MeasurementInstance.create_new_instance_from_dict(dict_)
 
+    def get_log_args(self):
+        return [self.measurement_data]
+
     # Just used to call '_add_measurement_instance_to_room' func
     def invoke(self, room_instance: RoomInstance):
         self._add_measurement_instance_to_room(room_instance)
@@ -33,15 +37,17 @@ class UpdateMeasurement:
     def __init__(self, measurement_data: dict[str, any]):
         self.measurement_data = measurement_data
 
+    def get_log_args(self):
+        return [self.measurement_data]
+
     def invoke(self, room_instance: RoomInstance):
         ref_measurements: MeasurementInstance | None
 
         if self.measurement_data["measurement_instance_id"] not in room_instance.measurement_instance_dict:
             return
         ref_measurements = room_instance.measurement_instance_dict[self.measurement_data["measurement_instance_id"]]
+        # changed fields are picked up by the measurement's change tracking
         ref_measurements.update_from_json(self.measurement_data)
-        # set diry, marking for updates
-        ref_measurements.is_dirty = True
 
         room_instance.measurement_instance_dict[ref_measurements.measurement_instance_id] = ref_measurements
 
@@ -50,6 +56,9 @@ class DeleteMeasurement:
     def __init__(self, measurement_data: dict[str, any]):
         self.measurement_data = measurement_data
 
+    def get_log_args(self):
+        return [self.measurement_data]
+
     def invoke(self, room_instance: RoomInstance):
         ref_measure: MeasurementInstance | None
 
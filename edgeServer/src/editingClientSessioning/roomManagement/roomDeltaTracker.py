@@ -0,0 +1,111 @@
+"""
+This script defines the RoomDeltaTracker class that keeps a short history of changes made to a `RoomInstance`.
+Every tick that changes the room gets a new sequence number. A session update for a client is built from
+the changes made after the sequence number that client last received or acknowledged.
+"""
+from collections import deque
+from itertools import islice
+from typing import Callable
+
+from websocketCommunications import binaryTransforms
+
+# Kinds of room objects, named after their list in the session update sent to clients.
+UPDATE_KINDS = ("mesh_updates", "user_updates", "marker_updates", "annotation_updates", "measurement_updates")
+# Lists that hold objects to be sent as binary transform records, by the list they would otherwise be sent in.
+BINARY_TRANSFORM_KINDS = {"mesh_updates": "mesh_transforms", "user_updates": "user_transforms"}
+
+# Changed fields of an object, or None if the full object is to be sent.
+# The object is either a `ChangeTrackedObject` or an already serialized dict for objects that left the room.
+ObjectChange = tuple[any, set[str] | None]
+
+class RoomDeltaTracker:
+    # Number of ticks kept for clients that are behind. Clients further behind are sent the full room state.
+    HISTORY_LENGTH = 64
+
+    def __init__(self):
+        self.sequence: int = 0
+        self.history: deque[tuple[int, dict[tuple[str, int], ObjectChange]]] = deque(maxlen=RoomDeltaTracker.HISTORY_LENGTH)
+        self.queued_removals: dict[tuple[str, int], ObjectChange] = {}
+
+    def queue_removal(self, kind: str, object_id: int, record: dict):
+        """
+        Records an object that left the room without going through `mark_delete`, e.g. a user that moved to another room.
+        It is sent as the given record with the next tick.
+        """
+        self.queued_removals[(kind, object_id)] = (record, None)
+
+    def has_queued_removals(self) -> bool:
+        return len(self.queued_removals) > 0
+
+    def record_tick(self, changes: dict[tuple[str, int], ObjectChange]) -> bool:
+        """
+        Stores the changes of a tick under a new sequence number.
+        Returns False without advancing the sequence if nothing changed.
+        """
+        if len(self.queued_removals) > 0:
+            changes = changes | self.queued_removals
+            self.queued_removals = {}
+
+        if len(changes) == 0:
+            return False
+
+        self.sequence += 1
+        self.history.append((self.sequence, changes))
+        return True
+
+    def can_build_delta(self, base_sequence: int) -> bool:
+        if len(self.history) == 0:
+            return base_sequence >= self.sequence
+        return base_sequence >= self.history[0][0] - 1
+
+    def collect_changes(self, base_sequence: int) -> dict[tuple[str, int], ObjectChange]:
+        """
+        Merges the changes of every tick after `base_sequence`. The latest object reference wins and changed fields are unioned.
+        """
+        merged: dict[tuple[str, int], ObjectChange] = {}
+        skip = max(0, base_sequence - self.history[0][0] + 1) if len(self.history) > 0 else 0
+
+        for _, changes in islice(self.history, skip, None):
+            for key, (obj, fields) in changes.items():
+                previous = merged.get(key)
+                if previous == None:
+                    merged_fields = fields
+                elif previous[1] == None or fields == None:
+                    merged_fields = None
+                else:
+                    merged_fields = previous[1] | fields
+                merged[key] = (obj, merged_fields)
+        return merged
+
+    def build_update(self, base_sequence: int, field_deltas: bool, binary_transforms: bool = False,
+                     exclude: Callable[[tuple[str, int], any, set[str] | None], bool] = None) -> dict[str, list] | None:
+        """
+        Returns the lists of object updates since `base_sequence`, or None if the client is up to date.
+        Objects are sent with only their changed fields if `field_deltas` is True, otherwise in full.
+
+        If `binary_transforms` is True, meshes and users that only changed their transform are returned as objects
+        under `mesh_transforms` and `user_transforms` instead, to be packed by `binaryTransforms`.
+
+        Changes for which `exclude` returns True are left out, e.g. changes too far from a user, see `RoomInterest`.
+        """
+        if base_sequence >= self.sequence:
+            return None
+
+        update = {kind: [] for kind in UPDATE_KINDS}
+        if binary_transforms:
+            update["mesh_transforms"] = []
+            update["user_transforms"] = []
+
+        for key, (obj, fields) in self.collect_changes(base_sequence).items():
+            kind = key[0]
+            if exclude != None and exclude(key, obj, fields):
+                continue
+            if isinstance(obj, dict):
+                update[kind].append(obj)
+            elif binary_transforms and binaryTransforms.is_transform_change(kind, obj, fields):
+                update[BINARY_TRANSFORM_KINDS[kind]].append(obj)
+            elif fields == None or field_deltas == False or obj.mark_delete:
+                update[kind].append(obj.to_client_update_dict())
+            else:
+                update[kind].append(obj.to_client_delta_dict(fields))
+        return update
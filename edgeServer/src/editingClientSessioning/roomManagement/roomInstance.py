@@ -1,5 +1,5 @@
+import asyncio
 import json
-import threading
 from typing import Any
 from datetime import datetime
 
@@ -9,6 +9,15 @@ from editingClientSessioning.roomObjects.MeasurementInstance import MeasurementI
 from editingClientSessioning.roomObjects.userInstance import UserInstance
 from editingClientSessioning.roomObjects.markerInstance import MarkerInstance
 from editingClientSessioning.roomObjects.meshInstance import MeshInstance
+from editingClientSessioning.roomManagement.roomDeltaTracker import RoomDeltaTracker
+
+# Kinds of room objects stored in the room's MongoDB document, by their list in the document and the key identifying them there.
+PERSISTED_KINDS = {
+    "mesh_updates": ("mesh_instances", "mesh_instance_id"),
+    "marker_updates": ("marker_instances", "marker_instance_id"),
+    "annotation_updates": ("annotation_instances", "annotation_instance_id"),
+    "measurement_updates": ("measurement_instances", "measurement_instance_id"),
+}
 
 class RoomInstanceEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -77,6 +86,8 @@ class RoomPreview:
 # Class for server representation of a scene, with all models "loaded" and users connected to this room session.
 # TODO: maybe move this into some editable struct for scalability?
 class RoomInstance:
+    DEFAULT_TICK_RATE = 20.0
+
     def __init__(
         self,
         room_id: int,
@@ -122,7 +133,28 @@ class RoomInstance:
         self.deleted_annotations: list[int] = []
         self.deleted_measurements: list[int] = []
 
-        self.thread_lock = threading.Lock()
+        # Set whenever there is something for the tick scheduler to process.
+        # Rooms are only touched from the event loop, so no lock is needed.
+        self.tick_event = asyncio.Event()
+
+        # Ticks per second, adjusted by the tick scheduler based on user activity.
+        self.tick_rate: float = RoomInstance.DEFAULT_TICK_RATE
+        self.has_activity: bool = False
+        self.activity_event = asyncio.Event()
+
+        # Sequenced history of changes used to send delta session updates.
+        self.delta_tracker = RoomDeltaTracker()
+
+        # Changed objects not yet written to MongoDB by the `RoomPersister`, keyed like the delta tracker's changes.
+        self.unsaved_changes: dict[tuple[str, int], any] = {}
+        # Objects stored in the room's MongoDB document. Set once the room is saved or loaded.
+        self.persisted_keys: set[tuple[str, int]] = set()
+        # Set if the room's document cannot be updated field by field, e.g. after a failed write.
+        self.needs_full_save: bool = True
+        # `RoomOperationLog` that applied actions are appended to, set once the room is loaded.
+        self.operation_log = None
+        # Optional `RoomInterest` that holds back far changes from each user's session updates.
+        self.interest = None
 
 # ==================== Initialize ====================
 
@@ -137,9 +169,47 @@ class RoomInstance:
 # ==================== Sessioning and room instance updating ====================
 
     def add_pending_action(self, action: any):
-        self.thread_lock.acquire()
         self.pending_actions.append(action)
-        self.thread_lock.release()
+        if getattr(action, "is_interactive", False):
+            self.record_activity()
+        self.tick_event.set()
+
+    def record_activity(self):
+        """
+        Flags that a user is actively editing the room, e.g. dragging meshes.
+        The tick scheduler raises the room's tick rate in response.
+        """
+        self.has_activity = True
+        self.activity_event.set()
+
+    def request_tick(self):
+        """
+        Wakes the room up for the next tick even if no action is pending, e.g. after a user was removed directly.
+        """
+        self.tick_event.set()
+
+    def has_pending_updates(self) -> bool:
+        """
+        Returns True if the next tick has anything to process or broadcast.
+        An empty room also counts, so the tick can unload it.
+        """
+        if len(self.pending_actions) > 0 or len(self.editing_users) == 0:
+            return True
+
+        if (len(self.deleted_meshes) > 0 or len(self.deleted_users) > 0 or len(self.deleted_markers) > 0
+            or len(self.deleted_annotations) > 0 or len(self.deleted_measurements) > 0
+            or self.delta_tracker.has_queued_removals()):
+            return True
+
+        # Users whose session updates were dropped by a slow connection are sent a new delta.
+        if any(user.sent_sequence < self.delta_tracker.sequence for user in self.editing_users.values()):
+            return True
+
+        # Far changes held back from users are sent by a later update, which must come even if the room goes quiet.
+        if self.interest != None and any(user.far_sequence < self.delta_tracker.sequence for user in self.editing_users.values()):
+            return True
+
+        return any(obj.has_changes() for _, objects in self._get_tracked_objects() for obj in objects)
 
     def post_update(self):
         if len(self.deleted_meshes) > 0:
@@ -172,12 +242,85 @@ class RoomInstance:
                 del self.measurement_instance_dict[del_id]
             self.deleted_measurements.clear()
 
+    def collect_tick_changes(self) -> bool:
+        """
+        Stamps the changes made to room objects since the last tick with a new sequence number.
+        Must be called before `post_update` so deleted objects are still recorded.
+        Returns False if nothing changed, in which case there is nothing to broadcast.
+        """
+        changes = {}
+        for kind, objects in self._get_tracked_objects():
+            for obj in objects:
+                if obj.has_changes():
+                    changes[(kind, obj.get_client_key())] = (obj, obj.consume_changes())
+                    if kind in PERSISTED_KINDS:
+                        self.unsaved_changes[(kind, obj.get_client_key())] = obj
+        if self.interest != None:
+            self.interest.update_index(changes)
+        return self.delta_tracker.record_tick(changes)
+
+    def has_unsaved_changes(self) -> bool:
+        return self.needs_full_save or len(self.unsaved_changes) > 0
+
+    def take_unsaved_changes(self) -> dict[tuple[str, int], any]:
+        changes = self.unsaved_changes
+        self.unsaved_changes = {}
+        return changes
+
+    def get_persisted_objects(self):
+        """
+        Returns the kind, key and object of every object stored in the room's document.
+        """
+        for kind, objects in self._get_tracked_objects():
+            if kind in PERSISTED_KINDS:
+                for obj in objects:
+                    yield kind, obj.get_client_key(), obj
+
+    def build_session_update(self, base_sequence: int, field_deltas: bool, binary_transforms: bool = False, exclude = None):
+        """
+        Builds the session update for a client that has seen the room up to `base_sequence`.
+        Returns None if that client is up to date. Clients too far behind get the full room state.
+        """
+        update = None
+        if self.delta_tracker.can_build_delta(base_sequence):
+            update = self.delta_tracker.build_update(base_sequence, field_deltas, binary_transforms, exclude)
+            if update == None:
+                return None
+        else:
+            update = self.get_full_state_update()
+
+        update["room_id"] = self.room_id
+        update["sequence"] = self.delta_tracker.sequence
+        update["base_sequence"] = base_sequence
+        return update
+
+    def get_full_state_update(self):
+        return {
+            "full_state": True,
+            "mesh_updates": self.get_room_objects(),
+            "user_updates": self.get_user_instances(),
+            "marker_updates": self.get_marker_states(),
+            "annotation_updates": self.get_annotations_updates(),
+            "measurement_updates": self.get_measurement_updates(),
+        }
+
+    def _get_tracked_objects(self):
+        return (
+            ("mesh_updates", self.mesh_instance_dict.values()),
+            ("user_updates", self.editing_users.values()),
+            ("marker_updates", self.markers_instance_dict.values()),
+            ("annotation_updates", self.annotation_instance_dict.values()),
+            ("measurement_updates", self.measurement_instance_dict.values()),
+        )
+
     # Will process any pending actions. 
     # e.g. add measurement or annotation. delete measurement or markers. etc. etc.
     def process_pending_actions(self):
         # Invoke pending actions to modify room state.
         for action in self.pending_actions:
             action.invoke(self)
+            if self.operation_log != None:
+                self.operation_log.append(action)
         self.pending_actions.clear()
         pass
 
@@ -191,10 +334,14 @@ class RoomInstance:
 
     def add_editing_user(self, editing_user: UserInstance):
         self.editing_users[editing_user.id] = editing_user
+        # Send the full user to everyone in the room, and only send changes after this point to the new user.
+        editing_user.is_dirty = True
+        editing_user.reset_delta_base(self.delta_tracker.sequence)
 
     def remove_editing_user(self, editing_user: UserInstance):
         if editing_user.id in self.editing_users:
             del(self.editing_users[editing_user.id])
+            self.delta_tracker.queue_removal("user_updates", editing_user.id, editing_user.to_dict() | {"deleted": True})
 
 # ==================== Meshes ====================
 
@@ -208,25 +355,8 @@ class RoomInstance:
             mesh.to_client_update_dict() for mesh in self.mesh_instance_dict.values()
         ]
 
-    def get_dirty_mesh_instances(self):
-        dirty_meshes = []
-        for mesh in self.mesh_instance_dict.values():
-            if mesh.is_dirty:
-                mesh.is_dirty = False
-                dirty_meshes.append(mesh)
-
-        return [mesh.to_client_update_dict() for mesh in dirty_meshes]
-
 # ==================== Markers ====================
     
-    def get_dirty_marker_update(self):
-        marker_states: list[dict] = []
-
-        for marker in self.markers_instance_dict.values():
-            if marker.is_dirty == False:
-                marker_states.append(marker.to_dict())
-        return marker_states
-    
     def get_marker_states(self):
         marker_states: list[dict] = []
         for marker in self.markers_instance_dict.values():
@@ -242,16 +372,6 @@ class RoomInstance:
             annotations_to_send.append(annotation.to_dict())
 
         return annotations_to_send
-    
-    def get_dirty_annotations_updates(self):
-        annotations_to_send: list[dict] = []
-
-        for annotation in self.annotation_instance_dict.values():
-            if annotation.is_dirty:
-                annotation.is_dirty = False
-                annotations_to_send.append(annotation.to_dict())
-
-        return annotations_to_send
 
 # ==================== Measurements ====================
 
@@ -262,19 +382,25 @@ class RoomInstance:
             measurement_to_send.append(measurement.to_dict())
 
         return measurement_to_send
-
-    def get_dirty_measurement_updates(self):
-        measurement_to_send: list[dict] = []
-
-        for measurement in self.measurement_instance_dict.values():
-            if(measurement.is_dirty):
-                measurement.is_dirty = False
-                measurement_to_send.append(measurement.to_dict())
-
-        return measurement_to_send
     
 # ==================== Convertion and others ====================
 
+    # Room variables stored alongside the object lists.
+    def get_room_fields(self):
+        return {
+            "room_id": self.room_id,
+            "name": self.name,
+            # "type": self.type,
+            "baseReconstruction": self.baseReconstruction,
+            "authors": self.authors,
+            "created_date": self.created_date,
+            "modified_date": self.modified_date,
+            "mesh_creation_count": self.mesh_creation_count,
+            "marker_creation_count": self.marker_creation_count,
+            "annotation_creation_count": self.annotation_creation_count,
+            "measurement_instance_count": self.measurement_instance_count
+        }
+
     # Compiles all variables in this room instance into a key:value dictionary array
     def to_dict(self):
         mesh_list = [
@@ -289,22 +415,11 @@ class RoomInstance:
         measurement_list = [
             measurement_list.to_dict() for measurement_list in self.measurement_instance_dict.values()
         ]
-        return {
-            "room_id": self.room_id,
-            "name": self.name,
-            # "type": self.type,
-            "baseReconstruction": self.baseReconstruction,
-            "authors": self.authors,
-            "created_date": self.created_date,
-            "modified_date": self.modified_date,
+        return self.get_room_fields() | {
             "mesh_instances": mesh_list,
-            "mesh_creation_count": self.mesh_creation_count,
             "marker_instances": marker_list,
-            "marker_creation_count": self.marker_creation_count,
             "annotation_instances": annotation_list,
-            "annotation_creation_count": self.annotation_creation_count,
             "measurement_instances": measurement_list,
-            "measurement_instance_count": self.measurement_instance_count
         }
 
     @classmethod
@@ -346,6 +461,10 @@ class RoomInstance:
         measurement_list = [MeasurementInstance.from_dict(measurement) for measurement in dict_.get("measurement_instances", [])]
         for measurement in measurement_list:
             instance.measurement_instance_dict[measurement.measurement_instance_id] = measurement
+
+        # Everything loaded is already in the room's document.
+        instance.persisted_keys = {(kind, key) for kind, key, _ in instance.get_persisted_objects()}
+        instance.needs_full_save = False
         
         return instance
 
@@ -7,13 +7,16 @@ Editing_Server stores instance of this and relies on this class for serializatio
 import os.path
 
 from editingClientSessioning.roomManagement.roomInstance import RoomInstance, RoomPreview
+from editingClientSessioning.roomManagement.roomOperationLog import RoomOperationLog
 from database.mongoDB import documentWriter, types
+from database.mongoDB.documentIndexes import query_pattern
 
 class RoomInstanceManager:
     DEFAULT_FILE_NAME = "New Room"
 
     def __init__(self, room_directory: str):
         self.room_directory = room_directory
+        self.operation_log_directory = room_directory + "oplog/"
         self.filename_to_id_dict = {}
 
     def __Handle_filename_conflict(self, fileName: str):
@@ -46,6 +49,7 @@ class RoomInstanceManager:
         
     #     return fileName
 
+    @query_pattern(types.CollectionType.ROOMS, "room_id")
     def save_to_mongodb(self, room_instance: RoomInstance):
 
         result = documentWriter.upload_unique_object(
@@ -79,15 +83,28 @@ class RoomInstanceManager:
 
         return model_previews
 
+    @query_pattern(types.CollectionType.ROOMS, "room_id")
     def load_room_instance(self, room_id: int):
+        """
+        Loads a room from MongoDB, or from its operation log if the server stopped before the room was saved.
+        """
         new_instance = None
-
-        filter = {
-            "room_id":  room_id
-        }
-
-        doc = types.collections_dict[types.CollectionType.ROOMS].find_one(filter)
-
-        new_instance = RoomInstance.load_from_dict(doc)
+        operation_log = RoomOperationLog(self.operation_log_directory, room_id)
+
+        new_instance = operation_log.recover()
+        if new_instance == None:
+            filter = {
+                "room_id":  room_id
+            }
+
+            doc = types.collections_dict[types.CollectionType.ROOMS].find_one(filter)
+
+            new_instance = RoomInstance.load_from_dict(doc)
+            # Operations are only recovered on top of a snapshot.
+            operation_log.write_base_snapshot(new_instance)
+        elif operation_log.operation_number != operation_log.snapshot_operation_number:
+            # Snapshot the replayed operations, so they are not replayed again.
+            operation_log.write_base_snapshot(new_instance)
+        new_instance.operation_log = operation_log
 
         return new_instance
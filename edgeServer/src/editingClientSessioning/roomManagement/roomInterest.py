@@ -0,0 +1,124 @@
+"""
+This script defines the RoomInterest class, the optional interest management of a `RoomInstance`.
+It is enabled by setting ROOM_INTEREST_RADIUS, see Editing_Server.
+
+Meshes and markers are kept in a spatial hash. Changes to meshes and markers further than `radius` from a user,
+and to the poses of users further than `radius`, are left out of that user's session updates, and are only sent
+to them every `far_update_interval` ticks with a delta from the last time they were sent.
+Objects that are created or deleted are always sent, as are annotations and measurements.
+"""
+import math
+from typing import Callable
+
+from editingClientSessioning.roomManagement.roomSnapshot import to_point
+
+# Kinds of room objects placed in the spatial hash, and how to get their position.
+INDEXED_KINDS = {
+    "mesh_updates": lambda mesh: mesh.position,
+    "marker_updates": lambda marker: marker.position,
+}
+
+class SpatialHash:
+    """
+    Uniform grid of cells, mapping each cell to the objects positioned in it.
+    """
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int, int], set] = {}
+        self.positions: dict[any, tuple[float, float, float]] = {}
+
+    def _get_cell(self, point: tuple[float, float, float]) -> tuple[int, int, int]:
+        return (math.floor(point[0] / self.cell_size), math.floor(point[1] / self.cell_size), math.floor(point[2] / self.cell_size))
+
+    def update(self, key, point: tuple[float, float, float] | None):
+        self.remove(key)
+        if point == None:
+            return
+        self.positions[key] = point
+        self.cells.setdefault(self._get_cell(point), set()).add(key)
+
+    def remove(self, key):
+        point = self.positions.pop(key, None)
+        if point == None:
+            return
+        cell = self._get_cell(point)
+        keys = self.cells[cell]
+        keys.discard(key)
+        if len(keys) == 0:
+            del self.cells[cell]
+
+    def query(self, point: tuple[float, float, float], radius: float) -> set:
+        """
+        Returns the keys of objects within `radius` of a point.
+        """
+        result = set()
+        min_cell = self._get_cell((point[0] - radius, point[1] - radius, point[2] - radius))
+        max_cell = self._get_cell((point[0] + radius, point[1] + radius, point[2] + radius))
+        for x in range(min_cell[0], max_cell[0] + 1):
+            for y in range(min_cell[1], max_cell[1] + 1):
+                for z in range(min_cell[2], max_cell[2] + 1):
+                    for key in self.cells.get((x, y, z), ()):
+                        if math.dist(self.positions[key], point) <= radius:
+                            result.add(key)
+        return result
+
+class RoomInterest:
+    def __init__(self, radius: float, cell_size: float, far_update_interval: int):
+        self.radius = radius
+        # Far changes are sent with every `far_update_interval`-th session update of a user.
+        self.far_update_interval = far_update_interval
+        self.index = SpatialHash(cell_size)
+
+    def rebuild(self, room):
+        """
+        Indexes every object of a room, e.g. when it is loaded.
+        """
+        self.index = SpatialHash(self.index.cell_size)
+        for kind, objects in room._get_tracked_objects():
+            get_position = INDEXED_KINDS.get(kind)
+            if get_position == None:
+                continue
+            for obj in objects:
+                self.index.update((kind, obj.get_client_key()), to_point(get_position(obj)))
+
+    def update_index(self, changes: dict[tuple[str, int], tuple[any, set[str] | None]]):
+        """
+        Moves changed objects in the spatial hash. Called with the changes of every tick.
+        """
+        for key, (obj, fields) in changes.items():
+            get_position = INDEXED_KINDS.get(key[0])
+            if get_position == None:
+                continue
+            if isinstance(obj, dict) or obj.mark_delete:
+                self.index.remove(key)
+            elif fields == None or "position" in fields:
+                self.index.update(key, to_point(get_position(obj)))
+
+    def is_far_update(self, editing_user) -> bool:
+        """
+        Counts the session updates of a user, and returns True if this one should include far changes.
+        """
+        editing_user.interest_update_count += 1
+        return editing_user.interest_update_count % self.far_update_interval == 0
+
+    def get_far_filter(self, editing_user) -> Callable[[tuple[str, int], any, set[str] | None], bool]:
+        """
+        Returns a function that tells whether a change is too far from the user to be sent this tick.
+        """
+        user_point = to_point(editing_user.position)
+        if user_point == None:
+            return lambda key, obj, fields: False
+        near_keys = self.index.query(user_point, self.radius)
+
+        def is_far(key: tuple[str, int], obj, fields: set[str] | None) -> bool:
+            # Removals, new objects and objects sent in full are never held back.
+            if isinstance(obj, dict) or fields == None or obj.mark_delete:
+                return False
+            if key[0] in INDEXED_KINDS:
+                return key not in near_keys
+            if key[0] == "user_updates" and obj is not editing_user:
+                other_point = to_point(obj.position)
+                return other_point != None and math.dist(other_point, user_point) > self.radius
+            return False
+
+        return is_far
@@ -0,0 +1,170 @@
+"""
+This script defines the RoomOperationLog class, an append-only log of the actions applied to a loaded room.
+RoomInstanceManager creates one for every room it loads, and Editing_Server writes it out every tick.
+
+Each room has two files in the log directory:
+    <room_id>.log            one JSON line per action: {"n": operation number, "a": action class, "d": arguments}
+    <room_id>.snapshot.json  the room's document as of operation number "n"
+
+Every `SNAPSHOT_INTERVAL` operations the room is snapshotted and the log is truncated.
+If the server stops without saving a room, the room is recovered on its next load by replaying
+the operations after its snapshot. A room closed normally is saved to MongoDB and its log is removed.
+
+Actions are logged as the client sent them, and replay relies on actions being deterministic,
+e.g. new objects take their ids from the room's creation counts.
+"""
+import asyncio
+import os
+
+import orjson
+
+from database import ioExecutor
+from editingClientSessioning.roomActions import roomActions, roomAnnotationActions, roomMeasurementActions
+from editingClientSessioning.roomManagement.roomInstance import RoomInstance
+
+# Actions written to the log, by class name.
+LOGGED_ACTIONS = {action.__name__: action for action in (
+    roomActions.CreateMeshInstance,
+    roomActions.BatchUpdateMeshInstance,
+    roomActions.ModifyMarker,
+    roomAnnotationActions.CreateAnnotationInstance,
+    roomAnnotationActions.UpdateAnnotation,
+    roomAnnotationActions.DeleteAnnotation,
+    roomMeasurementActions.CreateMeasurementInstance,
+    roomMeasurementActions.UpdateMeasurement,
+    roomMeasurementActions.DeleteMeasurement,
+)}
+
+class RoomOperationLog:
+    # Operations logged before the room is snapshotted and the log is truncated.
+    SNAPSHOT_INTERVAL = int(os.environ.get('ROOM_OPLOG_SNAPSHOT_INTERVAL', default=1000))
+
+    def __init__(self, directory: str, room_id: int):
+        self.log_path = os.path.join(directory, f"{room_id}.log")
+        self.snapshot_path = os.path.join(directory, f"{room_id}.snapshot.json")
+        os.makedirs(directory, exist_ok=True)
+
+        # Number of the last logged operation, and of the last one included in the snapshot.
+        self.operation_number = 0
+        self.snapshot_operation_number = 0
+
+        self.pending_lines: list[bytes] = []
+        # Writes happen one at a time so lines are appended in order and never after the log was truncated.
+        self.write_lock = asyncio.Lock()
+
+# ==================== Logging ====================
+
+    def append(self, action) -> bool:
+        """
+        Queues an applied action to be written. Returns False if the action does not change what is saved with the room.
+        """
+        if type(action).__name__ not in LOGGED_ACTIONS:
+            return False
+
+        self.operation_number += 1
+        self.pending_lines.append(orjson.dumps({
+            "n": self.operation_number,
+            "a": type(action).__name__,
+            "d": action.get_log_args(),
+        }) + b"\n")
+        return True
+
+    def has_pending_lines(self) -> bool:
+        return len(self.pending_lines) > 0
+
+    def needs_snapshot(self) -> bool:
+        return self.operation_number - self.snapshot_operation_number >= RoomOperationLog.SNAPSHOT_INTERVAL
+
+    async def write_pending(self):
+        """
+        Appends queued operations to the log file off the event loop.
+        """
+        async with self.write_lock:
+            if len(self.pending_lines) == 0:
+                return
+            data = b"".join(self.pending_lines)
+            self.pending_lines = []
+            await ioExecutor.run_blocking(self._append, data)
+
+    async def compact(self, room: RoomInstance):
+        """
+        Snapshots the room and truncates the log. Queued operations are already part of the room's state.
+        """
+        async with self.write_lock:
+            self.pending_lines = []
+            snapshot = orjson.dumps({"n": self.operation_number, "room": room.to_dict()})
+            self.snapshot_operation_number = self.operation_number
+            await ioExecutor.run_blocking(self._write_snapshot, snapshot)
+
+    async def remove(self):
+        """
+        Deletes the log and snapshot, once the room is saved to MongoDB.
+        """
+        async with self.write_lock:
+            self.pending_lines = []
+            await ioExecutor.run_blocking(self._remove_files)
+
+    def _append(self, data: bytes):
+        with open(self.log_path, "ab") as file:
+            file.write(data)
+
+    def _write_snapshot(self, snapshot: bytes):
+        # Replaced atomically, so a crash leaves either the old or the new snapshot.
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(snapshot)
+        os.replace(temp_path, self.snapshot_path)
+        # Operations up to the snapshot are skipped on replay, so a crash before this only leaves a longer log.
+        open(self.log_path, "wb").close()
+
+    def _remove_files(self):
+        for path in (self.log_path, self.snapshot_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+# ==================== Recovery ====================
+
+    def write_base_snapshot(self, room: RoomInstance):
+        """
+        Snapshots a room that was just loaded or recovered and truncates its log. Blocking.
+        """
+        self.snapshot_operation_number = self.operation_number
+        self._write_snapshot(orjson.dumps({"n": self.operation_number, "room": room.to_dict()}))
+
+    def recover(self) -> RoomInstance | None:
+        """
+        Rebuilds a room from its snapshot and the operations logged after it. Blocking.
+        Returns None if the room has no snapshot, i.e. it was saved normally.
+        """
+        if os.path.exists(self.snapshot_path) == False:
+            return None
+
+        with open(self.snapshot_path, "rb") as file:
+            snapshot = orjson.loads(file.read())
+        room = RoomInstance.load_from_dict(snapshot["room"])
+        self.operation_number = snapshot["n"]
+        self.snapshot_operation_number = snapshot["n"]
+
+        replayed = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as file:
+                for line in file:
+                    try:
+                        operation = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # The last line is cut short if the server stopped while writing it.
+                        break
+                    if operation["n"] <= self.operation_number:
+                        continue
+                    LOGGED_ACTIONS[operation["a"]](*operation["d"]).invoke(room)
+                    self.operation_number = operation["n"]
+                    replayed += 1
+
+        # Consume the changes made by replaying and drop deleted objects, as a tick would.
+        room.collect_tick_changes()
+        room.post_update()
+        # The document in MongoDB may be missing any of the recovered changes.
+        room.needs_full_save = True
+
+        print(f"# Recovered room {room.room_id} from its operation log, replayed {replayed} operations")
+        return room
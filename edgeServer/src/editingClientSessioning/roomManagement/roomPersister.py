@@ -0,0 +1,154 @@
+"""
+This script defines the RoomPersister class that writes changes made to loaded rooms back to MongoDB.
+Editing_Server owns an instance of this and tracks each loaded `RoomInstance` with it.
+
+Changed objects are collected by `RoomInstance.collect_tick_changes` every tick, and written behind every
+`interval` seconds as a few updates per room: changed objects are `$set` in place using array filters,
+new objects are `$push`ed and deleted objects are `$pull`ed. The whole document is only rewritten
+for rooms that were never saved, or after a write failed.
+
+Updates are built on the event loop, where rooms are modified, and written on the IO thread pool.
+"""
+import asyncio
+
+from pymongo import UpdateOne
+
+from database import ioExecutor
+from database.mongoDB.documentIndexes import query_pattern
+from database.mongoDB.types import CollectionType, collections_dict
+from editingClientSessioning.roomManagement.roomInstance import RoomInstance, PERSISTED_KINDS
+
+# List field in the room document -> key identifying its objects.
+PERSISTED_KINDS_BY_LIST = {list_field: id_field for list_field, id_field in PERSISTED_KINDS.values()}
+
+class RoomPersister:
+    def __init__(self, interval: float):
+        # Seconds between writes.
+        self.interval = interval
+        self.rooms: dict[int, RoomInstance] = {}
+
+        self.flush_task: asyncio.Task = None
+        # Writes happen one at a time, so updates to a document are applied in the order they were built.
+        self.write_lock = asyncio.Lock()
+
+        self.write_count = 0
+        self.failed_write_count = 0
+
+# ==================== Start and stop ====================
+
+    def start(self):
+        self.flush_task = asyncio.get_event_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """
+        Stops writing periodically and writes all remaining changes.
+        A periodic write in progress finishes first, so writes to a document never overlap.
+        """
+        if self.flush_task != None:
+            flush_task = self.flush_task
+            self.flush_task = None
+            # Cancelled while holding the lock, the task is either sleeping or waiting for the lock, never writing.
+            async with self.write_lock:
+                flush_task.cancel()
+            await asyncio.gather(flush_task, return_exceptions=True)
+        await self.flush_rooms(list(self.rooms.values()))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_rooms(list(self.rooms.values()))
+            except Exception as e:
+                print("# Room persister failed to write rooms: ", e)
+
+# ==================== Rooms ====================
+
+    def track_room(self, room: RoomInstance):
+        self.rooms[room.room_id] = room
+
+    def untrack_room(self, room: RoomInstance):
+        if self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+
+    async def flush_room(self, room: RoomInstance):
+        await self.flush_rooms([room])
+
+    async def flush_rooms(self, rooms: list[RoomInstance]):
+        """
+        Writes the unsaved changes of the given rooms in a single bulk write.
+        If the write fails, the rooms are fully saved by the next flush.
+        """
+        async with self.write_lock:
+            rooms = [room for room in rooms if room.has_unsaved_changes()]
+            operations = []
+            for room in rooms:
+                operations.extend(self._build_room_operations(room))
+            if len(operations) == 0:
+                return
+
+            try:
+                await ioExecutor.run_blocking(self._write, operations, timeout=None)
+                self.write_count += 1
+            except Exception as e:
+                print("# Room write failed, rooms will be fully saved next time: ", e)
+                self.failed_write_count += 1
+                for room in rooms:
+                    room.needs_full_save = True
+                raise
+
+    @staticmethod
+    def _write(operations: list[UpdateOne]):
+        collections_dict[CollectionType.ROOMS].bulk_write(operations, ordered=True)
+
+    @staticmethod
+    @query_pattern(CollectionType.ROOMS, "room_id")
+    def _build_room_operations(room: RoomInstance) -> list[UpdateOne]:
+        """
+        Builds the updates that bring the room's document up to date, and marks the room as saved.
+        """
+        room_filter = {"room_id": room.room_id}
+        changes = room.take_unsaved_changes()
+
+        if room.needs_full_save:
+            room.needs_full_save = False
+            room.persisted_keys = {(kind, key) for kind, key, _ in room.get_persisted_objects()}
+            return [UpdateOne(room_filter, {"$set": room.to_dict()}, upsert=True)]
+
+        set_fields = room.get_room_fields()
+        array_filters = []
+        pull_ids: dict[str, list] = {}
+        push_documents: dict[str, list] = {}
+
+        for (kind, key), obj in changes.items():
+            list_field, id_field = PERSISTED_KINDS[kind]
+            if obj.mark_delete:
+                if (kind, key) in room.persisted_keys:
+                    room.persisted_keys.discard((kind, key))
+                    pull_ids.setdefault(list_field, []).append(key)
+            elif (kind, key) in room.persisted_keys:
+                identifier = f"o{len(array_filters)}"
+                set_fields[f"{list_field}.$[{identifier}]"] = obj.to_dict()
+                array_filters.append({f"{identifier}.{id_field}": key})
+            else:
+                room.persisted_keys.add((kind, key))
+                push_documents.setdefault(list_field, []).append(obj.to_dict())
+
+        # A list cannot be set, pulled from and pushed to in the same update.
+        operations = [UpdateOne(room_filter, {"$set": set_fields}, array_filters=array_filters if len(array_filters) > 0 else None)]
+        if len(pull_ids) > 0:
+            operations.append(UpdateOne(room_filter, {"$pull": {
+                list_field: {PERSISTED_KINDS_BY_LIST[list_field]: {"$in": ids}} for list_field, ids in pull_ids.items()
+            }}))
+        if len(push_documents) > 0:
+            operations.append(UpdateOne(room_filter, {"$push": {
+                list_field: {"$each": documents} for list_field, documents in push_documents.items()
+            }}))
+        return operations
+
+    def get_stats(self):
+        return {
+            "tracked_rooms": len(self.rooms),
+            "unsaved_rooms": sum(1 for room in self.rooms.values() if room.has_unsaved_changes()),
+            "writes": self.write_count,
+            "failed_writes": self.failed_write_count,
+        }
@@ -0,0 +1,74 @@
+"""
+This script splits the objects of a `RoomInstance` into the chunks of a room snapshot, for clients that
+ask `get_room_objects` for a chunked snapshot instead of the whole room in one reply.
+
+Chunks are ordered so a joining user sees the most relevant objects first: meshes of the room's base
+reconstruction, then meshes, markers and measurements by distance to the user, then annotations,
+which refer to the objects they annotate.
+"""
+import math
+
+from editingClientSessioning.roomManagement.roomInstance import RoomInstance
+
+# Object kind -> (list in the snapshot, function serializing an object for clients)
+SNAPSHOT_KINDS = {
+    "mesh": ("mesh_instances", lambda mesh: mesh.to_client_update_dict()),
+    "marker": ("marker_instances", lambda marker: marker.to_dict()),
+    "measurement": ("measurement_instances", lambda measurement: measurement.to_dict()),
+    "annotation": ("annotation_instances", lambda annotation: annotation.to_dict()),
+}
+
+def to_point(value) -> tuple[float, float, float] | None:
+    """
+    Reads a position sent by clients, either a list or a serialized Vector3.
+    """
+    try:
+        if isinstance(value, dict):
+            return (float(value.get("x", value.get("_x"))), float(value.get("y", value.get("_y"))), float(value.get("z", value.get("_z"))))
+        return (float(value[0]), float(value[1]), float(value[2]))
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+
+def _get_distance(value, origin: tuple[float, float, float] | None) -> float:
+    point = to_point(value)
+    if point == None or origin == None:
+        return math.inf
+    return math.dist(point, origin)
+
+def get_snapshot_order(room: RoomInstance, position) -> list[tuple[str, any]]:
+    """
+    Returns the kind and object of everything in the room, in the order they should be sent to a user at `position`.
+    """
+    origin = to_point(position)
+    ordered: list[tuple[int, float, str, any]] = []
+
+    for mesh in room.mesh_instance_dict.values():
+        is_base = isinstance(mesh.asset_id, (list, tuple)) and len(mesh.asset_id) > 0 and mesh.asset_id[0] == room.baseReconstruction
+        ordered.append((0 if is_base else 1, _get_distance(mesh.position, origin), "mesh", mesh))
+    for marker in room.markers_instance_dict.values():
+        ordered.append((1, _get_distance(marker.position, origin), "marker", marker))
+    for measurement in room.measurement_instance_dict.values():
+        ordered.append((1, _get_distance(measurement.startPoint, origin), "measurement", measurement))
+    for annotation in room.annotation_instance_dict.values():
+        ordered.append((2, 0.0, "annotation", annotation))
+
+    ordered.sort(key=lambda item: (item[0], item[1]))
+    return [(kind, obj) for _, _, kind, obj in ordered]
+
+def split_into_chunks(ordered: list[tuple[str, any]], chunk_size: int) -> list[list[tuple[str, any]]]:
+    chunks = [ordered[start:start + chunk_size] for start in range(0, len(ordered), chunk_size)]
+    # An empty room is still sent as one chunk, so clients always receive the last chunk.
+    return chunks if len(chunks) > 0 else [[]]
+
+def build_chunk(objects: list[tuple[str, any]]) -> dict[str, list]:
+    """
+    Serializes the objects of a chunk when it is sent. Objects deleted since the snapshot started are left out,
+    clients receive their deletion with the session updates that follow the snapshot.
+    """
+    chunk = {list_name: [] for list_name, _ in SNAPSHOT_KINDS.values()}
+    for kind, obj in objects:
+        if obj.mark_delete:
+            continue
+        list_name, serialize = SNAPSHOT_KINDS[kind]
+        chunk[list_name].append(serialize(obj))
+    return chunk
@@ -0,0 +1,180 @@
+"""
+This script defines the RoomTickScheduler class that drives room updates on the asyncio event loop.
+Editing_Server owns an instance of this and registers each loaded `RoomInstance` with it.
+
+Every room is ticked by its own task. A room with no pending actions and no dirty objects
+sleeps on its `tick_event` until something is queued, so idle rooms cost no CPU.
+
+Each room also carries its own tick rate. Interactive actions push it up to `max_tick_rate`,
+and it decays towards `min_tick_rate` once users stop editing.
+"""
+import asyncio
+import traceback
+from typing import Awaitable, Callable
+
+from editingClientSessioning.roomManagement.roomInstance import RoomInstance
+
+class RoomTickStats:
+    """
+    Tick counters and scheduling drift for a single room.
+    Drift is how late a tick started compared to when it was scheduled.
+    """
+    def __init__(self):
+        self.tick_count = 0
+        self.idle_wakeups = 0
+        # Ticks whose callback raised.
+        self.failed_ticks = 0
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+        self.total_drift = 0.0
+
+    def record_tick(self, drift: float):
+        self.tick_count += 1
+        self.last_drift = drift
+        self.total_drift += drift
+        if drift > self.max_drift:
+            self.max_drift = drift
+
+    def to_dict(self):
+        average_drift = self.total_drift / self.tick_count if self.tick_count > 0 else 0.0
+        return {
+            "tick_count": self.tick_count,
+            "idle_wakeups": self.idle_wakeups,
+            "failed_ticks": self.failed_ticks,
+            "last_drift_ms": round(self.last_drift * 1000, 3),
+            "max_drift_ms": round(self.max_drift * 1000, 3),
+            "avg_drift_ms": round(average_drift * 1000, 3),
+        }
+
+class RoomTickScheduler:
+    # Seconds without activity for a room's tick rate to drop by half.
+    TICK_RATE_HALF_LIFE = 0.5
+
+    def __init__(self, tick_callback: Callable[[RoomInstance], Awaitable[bool]], min_tick_rate: float, max_tick_rate: float):
+        # Callback that processes and broadcasts one tick of a room.
+        # Returns False when the room should stop being ticked, e.g. when it is empty.
+        self.tick_callback = tick_callback
+        self.min_tick_rate = min_tick_rate
+        self.max_tick_rate = max_tick_rate
+
+        self.room_tasks: dict[int, asyncio.Task] = {}
+        self.room_stats: dict[int, RoomTickStats] = {}
+
+        self.is_running = False
+
+# ==================== Start and stop ====================
+
+    def start(self):
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+        for task in self.room_tasks.values():
+            task.cancel()
+        self.room_tasks.clear()
+
+# ==================== Room scheduling ====================
+
+    def schedule_room(self, room: RoomInstance):
+        """
+        Starts ticking a room on the running event loop. Does nothing if the room is already scheduled.
+        """
+        if self.is_running == False or self.is_scheduled(room.room_id):
+            return
+
+        self.room_stats.setdefault(room.room_id, RoomTickStats())
+        room.tick_rate = min(max(room.tick_rate, self.min_tick_rate), self.max_tick_rate)
+        self.room_tasks[room.room_id] = asyncio.get_running_loop().create_task(
+            self._room_tick_loop(room)
+        )
+
+    def forget_room(self, room_id: int):
+        """
+        Drops tick stats of a room that has been unloaded.
+        """
+        if self.is_scheduled(room_id) == False:
+            self.room_stats.pop(room_id, None)
+
+    def is_scheduled(self, room_id: int) -> bool:
+        task = self.room_tasks.get(room_id)
+        return task != None and task.done() == False
+
+    async def _room_tick_loop(self, room: RoomInstance):
+        loop = asyncio.get_running_loop()
+        stats = self.room_stats[room.room_id]
+        next_tick_time = loop.time()
+        last_tick_time = next_tick_time
+
+        try:
+            while self.is_running:
+                # Sleep until an action is queued for this room.
+                if room.has_pending_updates() == False:
+                    room.tick_event.clear()
+                    await room.tick_event.wait()
+                    stats.idle_wakeups += 1
+                    next_tick_time = max(next_tick_time, loop.time())
+
+                delay = next_tick_time - loop.time()
+                if delay > 0 and await self._wait_for_next_tick(room, delay):
+                    # Activity in a slow room starts the next tick right away.
+                    next_tick_time = loop.time()
+
+                tick_time = loop.time()
+                drift = tick_time - next_tick_time
+                stats.record_tick(drift)
+                if drift > 1.0 / room.tick_rate:
+                    print(f"# Room {room.room_id} tick is running late by {drift * 1000:.1f}ms")
+
+                try:
+                    if await self.tick_callback(room) == False:
+                        return
+                except Exception:
+                    # Keep ticking, so users are not left in a frozen room and it is still closed and saved once empty.
+                    stats.failed_ticks += 1
+                    print(f"# Room {room.room_id} tick failed:")
+                    traceback.print_exc()
+
+                self._update_tick_rate(room, tick_time - last_tick_time)
+                last_tick_time = tick_time
+
+                # Do not try to catch up on missed ticks after an overrun, just resume the cadence.
+                next_tick_time = max(next_tick_time + 1.0 / room.tick_rate, loop.time())
+        finally:
+            if self.room_tasks.get(room.room_id) is asyncio.current_task():
+                del self.room_tasks[room.room_id]
+
+    async def _wait_for_next_tick(self, room: RoomInstance, delay: float) -> bool:
+        """
+        Waits for the next tick. Returns True if user activity cut the wait short.
+        Rooms already at the maximum tick rate just sleep.
+        """
+        if room.tick_rate >= self.max_tick_rate:
+            await asyncio.sleep(delay)
+            return False
+
+        if room.has_activity:
+            return True
+
+        room.activity_event.clear()
+        try:
+            await asyncio.wait_for(room.activity_event.wait(), delay)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _update_tick_rate(self, room: RoomInstance, elapsed: float):
+        if room.has_activity:
+            room.has_activity = False
+            room.tick_rate = self.max_tick_rate
+            return
+
+        decay = 0.5 ** (elapsed / RoomTickScheduler.TICK_RATE_HALF_LIFE)
+        room.tick_rate = max(self.min_tick_rate, room.tick_rate * decay)
+
+# ==================== Getter ====================
+
+    def get_room_stats(self):
+        return {
+            room_id: stats.to_dict() | {"scheduled": self.is_scheduled(room_id)}
+            for room_id, stats in self.room_stats.items()
+        }
@@ -1,7 +1,11 @@
+from editingClientSessioning.roomObjects.changeTracking import ChangeTrackedObject
+
 INVALID_ID_NUM = -1
 
 # Represents a measure object IN THE SERVER.
-class MeasurementInstance:
+class MeasurementInstance(ChangeTrackedObject):
+    tracked_fields = ("startPoint", "endPoint", "distanceMeasured", "mark_delete")
+    client_key_field = "measurement_instance_id"
 
     def __init__(self,                
         measurement_instance_id,
@@ -21,6 +25,8 @@ class MeasurementInstance:
         self.is_dirty = False
         self.mark_delete = False
 
+        self._start_change_tracking()
+
     def to_dict(self):
         dict_ = {
             "measurement_instance_id": self.measurement_instance_id,
@@ -36,6 +42,7 @@ class MeasurementInstance:
             "startPoint": self.startPoint,
             "endPoint": self.endPoint,
             "distanceMeasured": self.distanceMeasured,
+            "mark_delete": self.mark_delete,
         }
         return dict_
     
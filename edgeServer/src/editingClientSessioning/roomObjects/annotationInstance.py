@@ -1,6 +1,15 @@
+from editingClientSessioning.roomObjects.changeTracking import ChangeTrackedObject
+
 INVALID_ID_NUM = -1
 
-class AnnotationInstance:
+class AnnotationInstance(ChangeTrackedObject):
+    tracked_fields = ("annotated_object_type", "annotated_object_instance_id", "title", "description",
+                      "auditor", "safetyCheckStatus", "global_instance_id", "mark_delete")
+    client_key_field = "annotation_instance_id"
+    client_field_names = {
+        "annotated_object_type": "annotated_objectState_type",
+        "annotated_object_instance_id": "annotated_objectState_id",
+    }
 
     def __init__(self,
                 annotation_instance_id,
@@ -29,6 +38,8 @@ class AnnotationInstance:
 
         self.mark_delete = False
 
+        self._start_change_tracking()
+
     def to_dict(self):
         dict_ = {
             "annotation_instance_id": self.annotation_instance_id,
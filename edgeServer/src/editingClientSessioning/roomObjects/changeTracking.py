@@ -0,0 +1,54 @@
+"""
+This script defines the ChangeTrackedObject base class used by room objects that are synced to clients.
+It records which client visible fields were assigned a new value, so a tick only has to send those fields.
+"""
+_UNSET = object()
+
+class ChangeTrackedObject:
+    # Attribute names that are sent to clients. Assigning a different value to one marks it as changed.
+    tracked_fields: tuple[str, ...] = ()
+    # Attribute that identifies the object, sent under the same key in client update dicts.
+    client_key_field: str = ""
+    # Attribute name -> client update dict key, for attributes sent under a different name.
+    client_field_names: dict[str, str] = {}
+
+    def __setattr__(self, name, value):
+        if name in self.tracked_fields and self.__dict__.get("_is_tracking_changes", False):
+            if self.__dict__.get(name, _UNSET) != value:
+                self.__dict__["changed_fields"].add(name)
+        object.__setattr__(self, name, value)
+
+    def _start_change_tracking(self):
+        """
+        Called at the end of __init__ so values set while creating or loading the object are not reported as changes.
+        `is_dirty` still forces the full object to be sent, e.g. for newly created objects.
+        """
+        self.changed_fields: set[str] = set()
+        self._is_tracking_changes = True
+
+    def has_changes(self) -> bool:
+        return self.is_dirty or len(self.changed_fields) > 0
+
+    def consume_changes(self) -> set[str] | None:
+        """
+        Returns the changed fields and resets change tracking.
+        Returns None if the full object should be sent instead.
+        """
+        fields = None if self.is_dirty else self.changed_fields
+        self.is_dirty = False
+        self.changed_fields = set()
+        return fields
+
+    def get_client_key(self):
+        return getattr(self, self.client_key_field)
+
+    def to_client_delta_dict(self, fields: set[str]):
+        """
+        Returns only the given fields of `to_client_update_dict`, along with the key of the object.
+        """
+        full_dict = self.to_client_update_dict()
+        delta_dict = {self.client_key_field: full_dict[self.client_key_field]}
+        for field in fields:
+            client_field = self.client_field_names.get(field, field)
+            delta_dict[client_field] = full_dict[client_field]
+        return delta_dict
@@ -1,8 +1,13 @@
 from enum import IntEnum
 
+from editingClientSessioning.roomObjects.changeTracking import ChangeTrackedObject
+
 INVALID_ID_NUM = -1
 
-class MarkerInstance:
+class MarkerInstance(ChangeTrackedObject):
+    tracked_fields = ("position", "normal", "type", "visibility", "mark_delete")
+    client_key_field = "marker_instance_id"
+
     def __init__(self, 
                  position: list[float], 
                  normal: list[float], 
@@ -20,6 +25,8 @@ class MarkerInstance:
         self.is_dirty = False
         self.mark_delete = False
 
+        self._start_change_tracking()
+
     def to_dict(self):
         return{
             "marker_instance_id": self.marker_instance_id,
@@ -29,6 +36,9 @@ class MarkerInstance:
             "visibility": self.visibility,
             "mark_delete": self.mark_delete
         }
+
+    def to_client_update_dict(self):
+        return self.to_dict()
     
     def update_from_json(self, jsonData: dict[str, any]):
         self.position = jsonData["position"]
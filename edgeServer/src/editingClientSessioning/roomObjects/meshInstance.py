@@ -1,8 +1,13 @@
 import random
 
+from editingClientSessioning.roomObjects.changeTracking import ChangeTrackedObject
+
 INVALID_ID_NUM = -1
 
-class MeshInstance:
+class MeshInstance(ChangeTrackedObject):
+    tracked_fields = ("asset_id", "gs_instance_id", "parent_id", "position", "rotation", "scale", "editable", "mark_delete")
+    client_key_field = "mesh_instance_id"
+
     model_database = None
     LIVE_VERSION = "__LIVE_VERSION"
 
@@ -39,6 +44,7 @@ class MeshInstance:
         self.is_dirty = False
         self.mark_delete = False
 
+        self._start_change_tracking()
 
     def to_dict(self):
         dict_ = {
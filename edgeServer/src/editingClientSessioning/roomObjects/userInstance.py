@@ -1,4 +1,10 @@
-class UserInstance:
+from editingClientSessioning.roomObjects.changeTracking import ChangeTrackedObject
+
+class UserInstance(ChangeTrackedObject):
+    tracked_fields = ("username", "color", "position", "rotation", "mark_delete")
+    client_key_field = "id"
+    client_field_names = {"mark_delete": "deleted"}
+
     def __init__(self, websocket, user_info: dict= None):
         self.id = -1
         self.websocket = websocket
@@ -7,19 +13,65 @@ class UserInstance:
         self.color = [0.2, 0.2, 0.2]
         self.position = [0.0, 0.0, 0.0]
         self.rotation = [0.0, 0.0, 0.0]
-        
+
+        self.is_dirty = False
         self.mark_delete = False
         self.deleted = False
 
-        if(user_info == None):
-            return
-        
-        if "user_id" in user_info:
-            self.id = user_info["user_id"]
-        if "username" in user_info:
-            self.username = user_info["username"]
-        if "color" in user_info:
-            self.color = user_info["color"]
+        # Delta protocol state, negotiated when registering as an editing user.
+        # Session updates sent to this user only contain changes made after its delta base sequence.
+        self.uses_delta_acks = False
+        self.uses_field_deltas = False
+        self.uses_binary_transforms = False
+        self.sent_sequence = 0
+        self.acked_sequence = 0
+
+        # Set while the user's connection falls behind, see `EditingServer._is_waiting_on_slow_consumer`.
+        self.is_lagging = False
+        self.lag_episodes = 0
+
+        # Set while the user is sent a chunked room snapshot. Session updates are held back until it is sent.
+        self.is_loading_snapshot = False
+
+        # Interest management state, see `RoomInterest`. Far changes were last sent up to `far_sequence`.
+        self.far_sequence = 0
+        self.interest_update_count = 0
+
+        if user_info != None:
+            if "user_id" in user_info:
+                self.id = user_info["user_id"]
+            if "username" in user_info:
+                self.username = user_info["username"]
+            if "color" in user_info:
+                self.color = user_info["color"]
+            if "delta_acks" in user_info:
+                self.uses_delta_acks = bool(user_info["delta_acks"])
+            if "field_deltas" in user_info:
+                self.uses_field_deltas = bool(user_info["field_deltas"])
+            if "binary_transforms" in user_info:
+                self.uses_binary_transforms = bool(user_info["binary_transforms"])
+
+        self._start_change_tracking()
+
+    def get_delta_base(self) -> int:
+        """
+        Returns the room sequence number the next session update should be a delta from.
+        Clients that do not acknowledge updates are assumed to have received everything sent to them.
+        """
+        if self.uses_delta_acks:
+            return self.acked_sequence
+        return self.sent_sequence
+
+    def reset_delta_base(self, sequence: int):
+        """
+        Used when the client receives the full room state, e.g. on joining a room.
+        """
+        self.sent_sequence = sequence
+        self.acked_sequence = sequence
+        self.far_sequence = sequence
+
+    def acknowledge_sequence(self, sequence: int):
+        self.acked_sequence = min(max(self.acked_sequence, sequence), self.sent_sequence)
 
     def to_dict(self):
         return {
@@ -29,4 +81,7 @@ class UserInstance:
             "position": self.position,
             "rotation": self.rotation,
             "deleted": self.mark_delete
-        }
\ No newline at end of file
+        }
+
+    def to_client_update_dict(self):
+        return self.to_dict()
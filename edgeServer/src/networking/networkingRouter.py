@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
 from editingClientSessioning import editingServer
+from database import ioExecutor
 
 router = APIRouter(tags=["networkingRouter"])
 
@@ -34,8 +35,10 @@ async def startup_event():
 
 @router.on_event("shutdown")
 async def shutdown_event():
-    editingServer.shutdown_instance()
+    # Saves loaded rooms on the IO thread pool, so it must run before the pool shuts down.
+    await editingServer.shutdown_instance()
     # capture_server.shutdown_instance()
+    ioExecutor.shutdown()
 
 # # Testing only function
 # @networkingRouter.get("/getbabylon")
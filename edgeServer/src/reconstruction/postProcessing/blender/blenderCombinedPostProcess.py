@@ -0,0 +1,100 @@
+import os
+import time
+from typing import Callable
+from sys import argv
+
+import bpy
+
+# Imports a model once, then exports it as GLB and OBJ and renders its thumbnail.
+# Run by a Blender process started for one job, or by a warm worker of blenderWorkerPool that imports `post_process`.
+# When run by Blender, progress is printed on stdout for blenderPostProcess.run_post_processing:
+#   ##STAGE <stage> start|ok|failed
+#   ##TIMING <stage> <seconds>
+
+def post_process(input_path: str, output_folder: str, model_name: str, thumbnail_path: str,
+                 report_stage: Callable[[str, str], None], report_timing: Callable[[str, float], None]) -> bool:
+    """
+    Runs every stage on the current scene, which must be Blender's default scene. Returns False if the model could not be imported.
+    """
+    context = bpy.context
+    ops = bpy.ops
+
+    # remove the default cube, keeping the camera and the light for the thumbnail
+    if 'Cube' in context.scene.objects:
+        override = context.copy()
+        override['selected_objects'] = [context.scene.objects['Cube']]
+        with context.temp_override(**override):
+            ops.object.delete()
+
+    # import model
+    report_stage("import", "start")
+    start_time = time.perf_counter()
+    print('import model from file: ', input_path)
+
+    inputExension = os.path.splitext(input_path)[1][1:].lower()
+    objects_before = set(context.scene.objects)
+    if inputExension == "obj":
+        ops.wm.obj_import(filepath=input_path)
+    elif inputExension == "ply":
+        ops.wm.ply_import(filepath=input_path)
+    elif inputExension in ("glb", "gltf"):
+        ops.import_scene.gltf(filepath=input_path)
+
+    imported_objects = [obj for obj in context.scene.objects if obj not in objects_before]
+    report_timing("import", time.perf_counter() - start_time)
+    if len(imported_objects) == 0:
+        print('No model imported from: ', input_path)
+        report_stage("import", "failed")
+        return False
+    report_stage("import", "ok")
+
+    importedModel = imported_objects[-1]
+    print('Model in the scene: ', importedModel)
+
+    # transform the model, fix pose
+    override = context.copy()
+    override['selected_objects'] = [importedModel]
+    with context.temp_override(**override):
+        ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS')
+        ops.object.location_clear()
+        importedModel.rotation_euler = (0, 0, 0)
+
+    # exports reuse the imported model, a failed export does not stop the others
+    def run_stage(stage, output_path, export):
+        report_stage(stage, "start")
+        start_time = time.perf_counter()
+        try:
+            export()
+            success = os.path.isfile(output_path)
+        except Exception as e:
+            print(f'{stage} failed: ', e)
+            success = False
+        report_timing(stage, time.perf_counter() - start_time)
+        report_stage(stage, "ok" if success else "failed")
+
+    glb_path = os.path.join(output_folder, model_name + ".glb")
+    run_stage("glb", glb_path, lambda: ops.export_scene.gltf(filepath=glb_path, export_format='GLB', check_existing=False))
+
+    obj_path = os.path.join(output_folder, model_name + ".obj")
+    run_stage("obj", obj_path, lambda: ops.wm.obj_export(filepath=obj_path, path_mode='COPY'))
+
+    # generate thumbnail, written with the extension of the render's file format
+    def render_thumbnail():
+        context.scene.render.filepath = thumbnail_path
+        context.scene.render.film_transparent = True
+        ops.render.render(write_still=True)
+
+    run_stage("thumbnail", thumbnail_path + context.scene.render.file_extension, render_thumbnail)
+    return True
+
+if __name__ == "__main__":
+    # get arguments for the script
+    script_argv = argv[argv.index('--') + 1:]
+
+    imported = post_process(
+        script_argv[0], script_argv[1], script_argv[2], script_argv[3],
+        lambda stage, status: print(f"##STAGE {stage} {status}", flush=True),
+        lambda stage, seconds: print(f"##TIMING {stage} {seconds:.3f}", flush=True),
+    )
+    if imported == False:
+        raise SystemExit(1)
@@ -1,13 +1,53 @@
+import importlib.util
 import subprocess
 import shutil
+import os
 import os.path
+import time
+from typing import Callable
 
+from reconstruction.postProcessing.blender.blenderWorkerPool import BlenderWorkerPool
+
+# Stages of blenderCombinedPostProcess.py, in the order they run.
+COMBINED_STAGES = ("import", "glb", "obj", "thumbnail")
+
+# Warm Blender workers, set by `start_worker_pool`. Without them, each job starts a Blender process.
+worker_pool: BlenderWorkerPool = None
+# Blender executable found by `find_blender_binary`.
+blender_binary: str = None
+
+def start_worker_pool():
+    """
+    Starts BLENDER_WORKERS warm Blender workers, if the bpy module is installed.
+    """
+    global worker_pool
+    size = int(os.environ.get('BLENDER_WORKERS', default=1))
+    if size <= 0 or worker_pool != None:
+        return
+    if importlib.util.find_spec("bpy") == None:
+        print("# bpy is not installed, Blender post-processing starts a Blender process per job")
+        return
+
+    worker_pool = BlenderWorkerPool(
+        size,
+        int(os.environ.get('BLENDER_WORKER_MAX_JOBS', default=20)),
+        float(os.environ.get('BLENDER_WORKER_MAX_MEMORY_MB', default=4096)),
+        float(os.environ.get('BLENDER_WORKER_START_TIMEOUT', default=60.0)),
+    )
+    worker_pool.start()
+    print(f"# Started {size} Blender workers")
+
+def stop_worker_pool():
+    global worker_pool
+    if worker_pool != None:
+        worker_pool.stop()
+        worker_pool = None
+
+def find_blender_binary():
+    global blender_binary
+    if blender_binary != None:
+        return blender_binary
 
-# input_path: input .obj filepath
-# output_path: output .glb filepath ending with "/" character
-# model_name: name of model file
-# render_name: name of rendered image
-def run_model_conversion(input_model_path, output_model_path, model_output_name):
     blender_bin = shutil.which("blender")
     if not blender_bin:
         # Fallback to Scoop installation on Windows
@@ -21,8 +61,75 @@ def run_model_conversion(input_model_path, output_model_path, model_output_name)
 
     if blender_bin:
         print("Found:", blender_bin)
+        blender_binary = blender_bin
     else:
         print("Unable to find blender!")
+    return blender_bin
+
+def run_post_processing(input_model_path, output_folder, model_output_name, thumbnail_render_name, on_stage: Callable[[str], None] = None):
+    """
+    Imports the model once, then exports it to `<model_output_name>.glb` and `<model_output_name>.obj`
+    and renders the thumbnail, on a warm Blender worker or else in a new Blender process.
+    `on_stage` is called with each stage of `COMBINED_STAGES` as it starts. If it raises, Blender is stopped.
+
+    Returns None if Blender was not found, otherwise the success and seconds taken of each stage, e.g.
+    {"success": {"import": True, "glb": True, ...}, "timings": {"import": 4.2, "glb": 1.3, ...}, "total": 9.1}
+    """
+    render_output = os.path.abspath(output_folder) + "/" + thumbnail_render_name
+
+    if worker_pool != None:
+        results = worker_pool.run_job(input_model_path, output_folder, model_output_name, render_output, on_stage)
+        if results != None:
+            results["success"] = {stage: results["success"].get(stage, False) for stage in COMBINED_STAGES}
+            return results
+        print("Blender workers are unavailable, starting a Blender process instead")
+
+    blender_bin = find_blender_binary()
+    if not blender_bin:
+        return None
+
+    command = [
+        blender_bin, "--background",
+        "--python", "src/reconstruction/postProcessing/blender/blenderCombinedPostProcess.py",
+        "--", input_model_path, output_folder, model_output_name, render_output,
+    ]
+    print(" ".join(command))
+
+    results = {"success": {stage: False for stage in COMBINED_STAGES}, "timings": {}, "total": 0.0}
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith("##STAGE "):
+                _, stage, status = line.split()
+                if status == "start":
+                    if on_stage != None:
+                        on_stage(stage)
+                else:
+                    results["success"][stage] = status == "ok"
+            elif line.startswith("##TIMING "):
+                _, stage, seconds = line.split()
+                results["timings"][stage] = float(seconds)
+            else:
+                print(line, end="")
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+    results["total"] = round(time.perf_counter() - start_time, 3)
+    print("Blender post-processing timings (s): ", results["timings"], " total: ", results["total"])
+    return results
+
+
+# input_path: input .obj filepath
+# output_path: output .glb filepath ending with "/" character
+# model_name: name of model file
+# render_name: name of rendered image
+def run_model_conversion(input_model_path, output_model_path, model_output_name):
+    blender_bin = find_blender_binary()
+    if not blender_bin:
         return False
 
     command_string = f'"{blender_bin}" --background --python src/reconstruction/postProcessing/blender/blenderModelConversion.py -- {input_model_path} {output_model_path + "/" + model_output_name}'
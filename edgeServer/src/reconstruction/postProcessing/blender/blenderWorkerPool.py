@@ -0,0 +1,218 @@
+"""
+This script defines the BlenderWorkerPool class, a pool of long-lived headless Blender workers for post-processing.
+blenderPostProcess sends jobs to it instead of starting a Blender process per job, when the `bpy` module is installed.
+
+Each worker is a process that imports `bpy` once and then runs jobs received over a pipe with
+`blenderCombinedPostProcess.post_process`, resetting Blender to its default scene before each job.
+Workers are replaced after `max_jobs` jobs, or once their peak memory reaches `max_memory_mb`, so leaks in Blender
+do not build up. A replacement starts as soon as a worker is retired, so it is warm by the next job.
+"""
+import multiprocessing
+import queue
+import sys
+import time
+from typing import Callable
+
+def _get_peak_memory_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows, workers are then only replaced by job count.
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _worker_main(connection):
+    """
+    Entry point of a worker process.
+    """
+    import bpy
+    from reconstruction.postProcessing.blender import blenderCombinedPostProcess
+
+    connection.send(("ready",))
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        if job == None:
+            return
+
+        # Start every job from the default scene, with the data of the previous job freed.
+        bpy.ops.wm.read_factory_settings(use_empty=False)
+        try:
+            blenderCombinedPostProcess.post_process(
+                *job,
+                lambda stage, status: connection.send(("stage", stage, status)),
+                lambda stage, seconds: connection.send(("timing", stage, seconds)),
+            )
+        except Exception as e:
+            print("Blender worker job failed: ", e)
+        connection.send(("done", _get_peak_memory_mb()))
+
+class BlenderWorker:
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection,), name="blender-worker", daemon=True)
+        self.process.start()
+        child_connection.close()
+
+        self.is_ready = False
+        self.job_count = 0
+        self.peak_memory_mb: float | None = None
+
+    def wait_ready(self, timeout: float) -> bool:
+        """
+        Waits for the worker to import bpy. Returns False if it did not start.
+        """
+        if self.is_ready == False:
+            try:
+                self.is_ready = self.connection.poll(timeout) and self.connection.recv()[0] == "ready"
+            except (EOFError, OSError):
+                self.is_ready = False
+        return self.is_ready
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+class BlenderWorkerPool:
+    def __init__(self, size: int, max_jobs: int, max_memory_mb: float, start_timeout: float):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        # Seconds a new worker may take to import bpy.
+        self.start_timeout = start_timeout
+
+        # Spawned, so workers do not inherit the server's threads and sockets.
+        self.context = multiprocessing.get_context("spawn")
+        self.idle_workers: queue.Queue[BlenderWorker] = queue.Queue()
+        self.is_stopped = False
+
+        self.job_count = 0
+        self.replaced_count = 0
+        self.crashed_count = 0
+
+# ==================== Start and stop ====================
+
+    def start(self):
+        for _ in range(self.size):
+            self.idle_workers.put(BlenderWorker(self.context))
+
+    def stop(self):
+        """
+        Stops idle workers. Workers running a job are stopped when it finishes.
+        """
+        self.is_stopped = True
+        while True:
+            try:
+                self.idle_workers.get_nowait().stop()
+            except queue.Empty:
+                return
+
+# ==================== Jobs ====================
+
+    def run_job(self, input_path: str, output_folder: str, model_name: str, thumbnail_path: str,
+                on_stage: Callable[[str], None] = None) -> dict[str, any] | None:
+        """
+        Runs a job on the next idle worker, waiting for one if all are busy. Blocking.
+        Returns results like blenderPostProcess.run_post_processing, with only the stages that ran,
+        or None if no worker could run the job.
+        If `on_stage` raises, the worker is killed and replaced.
+        """
+        worker = self._acquire()
+        if worker == None:
+            return None
+
+        results = {"success": {}, "timings": {}, "total": 0.0}
+        start_time = time.perf_counter()
+        try:
+            if worker.wait_ready(self.start_timeout) == False:
+                print("# Blender worker did not start, is bpy installed?")
+                self.crashed_count += 1
+                worker.kill()
+                worker = None
+                return None
+
+            worker.connection.send((input_path, output_folder, model_name, thumbnail_path))
+            while True:
+                message = worker.connection.recv()
+                if message[0] == "stage":
+                    _, stage, status = message
+                    if status == "start":
+                        if on_stage != None:
+                            on_stage(stage)
+                    else:
+                        results["success"][stage] = status == "ok"
+                elif message[0] == "timing":
+                    results["timings"][message[1]] = round(message[2], 3)
+                elif message[0] == "done":
+                    worker.peak_memory_mb = message[1]
+                    break
+            worker.job_count += 1
+            self.job_count += 1
+        except (EOFError, OSError) as e:
+            print("# Blender worker crashed: ", e)
+            self.crashed_count += 1
+            worker.kill()
+            worker = None
+        except BaseException:
+            # Stopped while the job is running, the worker is left in an unknown state.
+            worker.kill()
+            worker = None
+            raise
+        finally:
+            self._release(worker)
+
+        results["total"] = round(time.perf_counter() - start_time, 3)
+        print("Blender worker timings (s): ", results["timings"], " total: ", results["total"])
+        return results
+
+    def _acquire(self) -> BlenderWorker | None:
+        while self.is_stopped == False:
+            try:
+                return self.idle_workers.get(timeout=1.0)
+            except queue.Empty:
+                continue
+        return None
+
+    def _release(self, worker: BlenderWorker | None):
+        """
+        Returns a worker to the pool, or replaces it if it was killed or is due to be recycled.
+        """
+        if worker != None and self.is_stopped:
+            worker.stop()
+            return
+        if worker != None and (worker.job_count >= self.max_jobs
+                               or (worker.peak_memory_mb != None and worker.peak_memory_mb >= self.max_memory_mb)):
+            print(f"# Replacing Blender worker after {worker.job_count} jobs, peak memory {worker.peak_memory_mb} MB")
+            self.replaced_count += 1
+            worker.stop()
+            worker = None
+        if worker == None:
+            if self.is_stopped:
+                return
+            worker = BlenderWorker(self.context)
+        self.idle_workers.put(worker)
+
+    def get_stats(self):
+        return {
+            "size": self.size,
+            "idle": self.idle_workers.qsize(),
+            "jobs": self.job_count,
+            "replaced": self.replaced_count,
+            "crashed": self.crashed_count,
+        }
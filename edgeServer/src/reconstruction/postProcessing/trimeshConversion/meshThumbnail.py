@@ -0,0 +1,178 @@
+"""
+This script renders model thumbnails without Blender, for trimeshPostProcess.
+
+Faces are projected with NumPy from the same viewpoint as the camera of Blender's default scene, which renders
+the thumbnails of the Blender path, on a transparent background. Each face is flat shaded with the colour of its texture
+at its centre.
+
+Reconstructed meshes have hundreds of thousands of faces a few pixels wide, too many to draw one at a time.
+Faces up to `MAX_SPLAT_EDGE` pixels wide are sampled on a grid of points at most a pixel apart, and the points are
+depth tested together in NumPy. Only larger faces are drawn as polygons with Pillow, into a depth image as well,
+and the nearest of both is kept for each pixel.
+"""
+import math
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+THUMBNAIL_SIZE = (1920, 1080)
+# Thumbnails are rendered at this fraction of their size and scaled up.
+RENDER_SCALE = 0.5
+# Blender's default camera and light, converted to the Y up axes of exported models.
+CAMERA_POSITION = np.array([7.3589, 4.9583, 6.9258])
+LIGHT_POSITION = np.array([4.0762, 5.9039, -1.0055])
+# 50mm lens on a 36mm sensor.
+HORIZONTAL_FOV = 2 * math.atan(18 / 50)
+NEAR_CLIP = 0.01
+DEFAULT_COLOR = np.array([204, 204, 204])
+# Faces with a longer edge on screen, in rendered pixels, are drawn as polygons instead of points.
+MAX_SPLAT_EDGE = 8
+
+def get_face_colors(mesh) -> np.ndarray:
+    """
+    Returns an RGB colour per face, sampled from the texture at the face's UV centre if the mesh has one.
+    """
+    visual = mesh.visual
+    face_count = len(mesh.faces)
+
+    if visual.kind == "texture":
+        material = visual.material
+        image = getattr(material, "image", None) or getattr(material, "baseColorTexture", None)
+        if image != None and visual.uv is not None and len(visual.uv) == len(mesh.vertices):
+            texels = np.asarray(image.convert("RGB"))
+            uv = visual.uv[mesh.faces].mean(axis=1) % 1.0
+            columns = (uv[:, 0] * (texels.shape[1] - 1)).astype(np.int64)
+            rows = ((1.0 - uv[:, 1]) * (texels.shape[0] - 1)).astype(np.int64)
+            return texels[rows, columns].astype(np.float64)
+        color = getattr(material, "main_color", None)
+        if color is not None:
+            return np.tile(np.asarray(color[:3], dtype=np.float64), (face_count, 1))
+    elif visual.kind in ("face", "vertex"):
+        return np.asarray(visual.face_colors[:, :3], dtype=np.float64)
+
+    return np.tile(DEFAULT_COLOR.astype(np.float64), (face_count, 1))
+
+def _get_barycentric_grid(subdivisions: int) -> np.ndarray:
+    """
+    Returns the barycentric weights of a triangular grid of points, `subdivisions` steps along each edge.
+    """
+    steps = [(i, j) for i in range(subdivisions + 1) for j in range(subdivisions + 1 - i)]
+    weights = np.array([(i, j, subdivisions - i - j) for i, j in steps], dtype=np.float64)
+    return weights / subdivisions
+
+def _splat_faces(screen: np.ndarray, depths: np.ndarray, colors: np.ndarray, edges: np.ndarray,
+                 size: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Samples faces on grids of points at most a pixel apart, and keeps the nearest point of each pixel.
+    Returns the depth and colour of each pixel, with infinite depth where no face was drawn.
+    """
+    width, height = size
+    pixels = []
+    point_depths = []
+    point_faces = []
+    subdivisions = np.maximum(np.ceil(edges), 1).astype(np.int64)
+    for subdivision in np.unique(subdivisions):
+        faces = np.nonzero(subdivisions == subdivision)[0]
+        weights = _get_barycentric_grid(int(subdivision))
+        columns = (screen[faces, :, 0] @ weights.T).astype(np.int64).ravel()
+        rows = (screen[faces, :, 1] @ weights.T).astype(np.int64).ravel()
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        pixels.append((rows * width + columns)[inside])
+        point_depths.append((depths[faces] @ weights.T).ravel()[inside])
+        point_faces.append(np.repeat(faces, len(weights))[inside])
+
+    depth_image = np.full(width * height, np.inf)
+    color_image = np.zeros((width * height, 3), dtype=np.uint8)
+    if len(pixels) > 0:
+        pixels = np.concatenate(pixels)
+        point_depths = np.concatenate(point_depths)
+        point_faces = np.concatenate(point_faces)
+        # Sorted by pixel then depth, the first point of each pixel is the nearest.
+        # Depths are scaled below 1 so both fit in one key, which sorts faster than np.lexsort.
+        order = np.argsort(pixels + point_depths / (point_depths.max() * 2))
+        pixels = pixels[order]
+        nearest = np.ones(len(pixels), dtype=bool)
+        nearest[1:] = pixels[1:] != pixels[:-1]
+        depth_image[pixels[nearest]] = point_depths[order][nearest]
+        color_image[pixels[nearest]] = colors[point_faces[order][nearest]]
+    return depth_image.reshape(height, width), color_image.reshape(height, width, 3)
+
+def _draw_faces(screen: np.ndarray, depths: np.ndarray, colors: np.ndarray,
+                size: tuple[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Draws faces as polygons, furthest first. Returns the depth and colour of each pixel like `_splat_faces`.
+    """
+    color_image = Image.new("RGB", size)
+    depth_image = Image.new("F", size, float("inf"))
+    color_draw = ImageDraw.Draw(color_image)
+    depth_draw = ImageDraw.Draw(depth_image)
+
+    face_depths = depths.mean(axis=1)
+    # Painter's algorithm.
+    order = np.argsort(-face_depths)
+    for polygon, color, depth in zip(screen[order].tolist(), colors[order].tolist(), face_depths[order].tolist()):
+        points = [tuple(point) for point in polygon]
+        color_draw.polygon(points, fill=tuple(color))
+        depth_draw.polygon(points, fill=depth)
+    return np.asarray(depth_image), np.asarray(color_image)
+
+def render_thumbnail(meshes: list, output_path: str, size: tuple[int, int] = THUMBNAIL_SIZE):
+    """
+    Renders meshes centred on the origin to a PNG at `output_path`.
+    """
+    output_size = size
+    size = (round(size[0] * RENDER_SCALE), round(size[1] * RENDER_SCALE))
+    width, height = size
+
+    # Camera basis looking at the origin, with Y up.
+    forward = -CAMERA_POSITION / np.linalg.norm(CAMERA_POSITION)
+    right = np.cross(forward, [0.0, 1.0, 0.0])
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+    focal = (width / 2) / math.tan(HORIZONTAL_FOV / 2)
+
+    polygons = []
+    depths = []
+    colors = []
+    for mesh in meshes:
+        if len(mesh.faces) == 0:
+            continue
+        triangles = mesh.vertices[mesh.faces] - CAMERA_POSITION
+        x = triangles @ right
+        y = triangles @ up
+        z = triangles @ forward
+
+        # Faces with a corner behind the camera are left out rather than clipped.
+        visible = (z > NEAR_CLIP).all(axis=1)
+        if visible.any() == False:
+            continue
+        x, y, z = x[visible], y[visible], z[visible]
+        screen = np.stack([width / 2 + focal * x / z, height / 2 - focal * y / z], axis=2)
+
+        normals = mesh.face_normals[visible]
+        to_light = LIGHT_POSITION - mesh.triangles_center[visible]
+        to_light /= np.linalg.norm(to_light, axis=1, keepdims=True)
+        # Reconstructed surfaces are not consistently oriented, so both sides are lit.
+        shade = 0.6 + 0.4 * np.abs((normals * to_light).sum(axis=1))
+
+        polygons.append(screen)
+        depths.append(z)
+        colors.append(np.clip(get_face_colors(mesh)[visible] * shade[:, None], 0, 255))
+
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    if len(polygons) > 0:
+        polygons = np.concatenate(polygons)
+        depths = np.concatenate(depths)
+        colors = np.concatenate(colors).astype(np.uint8)
+
+        # Longest edge of each face on screen.
+        edges = np.linalg.norm(polygons - np.roll(polygons, 1, axis=1), axis=2).max(axis=1)
+        small = edges <= MAX_SPLAT_EDGE
+        splat_depth, splat_color = _splat_faces(polygons[small], depths[small], colors[small], edges[small], size)
+        large = np.nonzero(small == False)[0]
+        drawn_depth, drawn_color = _draw_faces(polygons[large], depths[large], colors[large], size)
+
+        splat_nearer = splat_depth < drawn_depth
+        image[:, :, :3] = np.where(splat_nearer[:, :, None], splat_color, drawn_color)
+        image[:, :, 3] = np.where(np.isfinite(np.minimum(splat_depth, drawn_depth)), 255, 0)
+    Image.fromarray(image, "RGBA").resize(output_size, Image.Resampling.BICUBIC).save(output_path, compress_level=1)
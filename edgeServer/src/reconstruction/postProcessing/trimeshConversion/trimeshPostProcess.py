@@ -0,0 +1,162 @@
+"""
+This script post-processes models with trimesh and NumPy, without starting Blender.
+runPostReconstruction tries it first and falls back to Blender for models it cannot handle.
+
+It produces the same outputs as blenderCombinedPostProcess, reporting the same stages:
+the model is moved so its surface center of mass is at the origin, exported as GLB and OBJ with its textures,
+and a thumbnail is rendered by meshThumbnail.
+OBJ and PLY models are converted from Z up to Y up, as the Blender path does. GLB models are passed through:
+their buffers are copied as they are and only the translation of a new root node is written.
+
+trimesh, NumPy and Pillow are optional, without them every model is post-processed by Blender.
+"""
+import json
+import os
+import shutil
+import struct
+import time
+from typing import Callable
+
+try:
+    import numpy as np
+    import trimesh
+    from reconstruction.postProcessing.trimeshConversion import meshThumbnail
+except ImportError as e:
+    print("# Mesh conversion without Blender is unavailable: ", e)
+    trimesh = None
+
+SUPPORTED_EXTENSIONS = ("obj", "ply", "glb")
+# Y up axes of exported models from the Z up axes of OBJ and PLY models: (x, y, z) -> (x, z, -y).
+Z_UP_TO_Y_UP = [[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]]
+
+GLB_MAGIC = b"glTF"
+GLB_JSON_CHUNK = 0x4E4F534A
+
+class MeshConversionError(RuntimeError):
+    pass
+
+def is_available() -> bool:
+    return trimesh != None and os.environ.get('MESH_FAST_PATH', default="1") == "1"
+
+def run_post_processing(input_model_path, output_folder, model_output_name, thumbnail_render_name,
+                        on_stage: Callable[[str], None] = None) -> dict[str, any] | None:
+    """
+    Post-processes a model like blenderPostProcess.run_post_processing and returns results of the same form.
+    Returns None if the model should be post-processed by Blender instead: trimesh is not installed,
+    the format is not supported, or the model could not be loaded or exported.
+    Exceptions raised by `on_stage` are passed on.
+    """
+    extension = os.path.splitext(input_model_path)[1][1:].lower()
+    if is_available() == False or extension not in SUPPORTED_EXTENSIONS:
+        return None
+
+    results = {"success": {}, "timings": {}, "total": 0.0}
+    start_time = time.perf_counter()
+
+    def run_stage(stage: str, func: Callable):
+        if on_stage != None:
+            on_stage(stage)
+        stage_start = time.perf_counter()
+        try:
+            output = func()
+        except Exception as e:
+            raise MeshConversionError(f"{stage} failed: {e}") from e
+        results["timings"][stage] = round(time.perf_counter() - stage_start, 3)
+        results["success"][stage] = True
+        return output
+
+    try:
+        meshes, center = run_stage("import", lambda: _load_meshes(input_model_path, extension == "glb"))
+
+        glb_path = os.path.join(output_folder, model_output_name + ".glb")
+        if extension == "glb":
+            run_stage("glb", lambda: _pass_through_glb(input_model_path, glb_path, center))
+        else:
+            run_stage("glb", lambda: trimesh.Scene(meshes).export(glb_path, file_type="glb"))
+
+        obj_path = os.path.join(output_folder, model_output_name + ".obj")
+        run_stage("obj", lambda: _export_obj(meshes, obj_path))
+
+        thumbnail_path = os.path.join(output_folder, thumbnail_render_name + ".png")
+        run_stage("thumbnail", lambda: meshThumbnail.render_thumbnail(meshes, thumbnail_path))
+    except MeshConversionError as e:
+        print("# Mesh conversion without Blender failed, falling back to Blender: ", e)
+        return None
+
+    results["total"] = round(time.perf_counter() - start_time, 3)
+    print("Mesh conversion timings (s): ", results["timings"], " total: ", results["total"])
+    return results
+
+def _load_meshes(input_model_path: str, is_y_up: bool) -> tuple[list, "np.ndarray"]:
+    """
+    Loads every mesh of a model in world space and moves it so its surface center of mass is at the origin.
+    Returns the meshes, in Y up axes, and the center they were moved from.
+    """
+    scene = trimesh.load(input_model_path, force="scene")
+    meshes = [geometry for geometry in scene.dump() if isinstance(geometry, trimesh.Trimesh) and len(geometry.faces) > 0]
+    if len(meshes) == 0:
+        raise MeshConversionError("model has no faces")
+
+    # Area weighted face centers, like Blender's ORIGIN_CENTER_OF_MASS.
+    areas = np.concatenate([mesh.area_faces for mesh in meshes])
+    centers = np.concatenate([mesh.triangles_center for mesh in meshes])
+    if areas.sum() <= 0:
+        raise MeshConversionError("model has no surface area")
+    center = (centers * areas[:, None]).sum(axis=0) / areas.sum()
+
+    for mesh in meshes:
+        mesh.apply_translation(-center)
+        if is_y_up == False:
+            mesh.apply_transform(Z_UP_TO_Y_UP)
+    return meshes, center
+
+def _export_obj(meshes: list, obj_path: str):
+    """
+    Writes the OBJ with its material and textures next to it.
+    """
+    mesh = meshes[0] if len(meshes) == 1 else trimesh.util.concatenate(meshes)
+    mesh.export(obj_path, file_type="obj", include_texture=True)
+
+def _pass_through_glb(input_path: str, output_path: str, center: "np.ndarray"):
+    """
+    Writes the GLB with a root node translating it by `-center`, without decoding or encoding its buffers.
+    """
+    if np.allclose(center, 0.0):
+        shutil.copyfile(input_path, output_path)
+        return
+
+    with open(input_path, "rb") as file:
+        data = file.read()
+    magic, version, _ = struct.unpack_from("<4sII", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise MeshConversionError("not a glTF 2 binary")
+
+    chunks = []
+    offset = 12
+    while offset < len(data):
+        chunk_length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunks.append((chunk_type, data[offset + 8:offset + 8 + chunk_length]))
+        offset += 8 + chunk_length
+    if len(chunks) == 0 or chunks[0][0] != GLB_JSON_CHUNK:
+        raise MeshConversionError("GLB does not start with a JSON chunk")
+
+    gltf = json.loads(chunks[0][1])
+    nodes = gltf.setdefault("nodes", [])
+    scene_index = gltf.get("scene", 0)
+    scenes = gltf.get("scenes", [])
+    if scene_index >= len(scenes):
+        raise MeshConversionError("GLB has no scene")
+
+    # The meshes were centered in glTF axes, so the translation is written as it is.
+    nodes.append({"name": "recentered", "translation": (-center).tolist(), "children": scenes[scene_index].get("nodes", [])})
+    scenes[scene_index]["nodes"] = [len(nodes) - 1]
+
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode()
+    # Chunks are 4 byte aligned, the JSON chunk with spaces.
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    chunks[0] = (GLB_JSON_CHUNK, json_chunk)
+
+    body = b"".join(struct.pack("<II", len(chunk), chunk_type) + chunk for chunk_type, chunk in chunks)
+    with open(output_path, "wb") as file:
+        file.write(struct.pack("<4sII", GLB_MAGIC, 2, 12 + len(body)))
+        file.write(body)
@@ -0,0 +1,478 @@
+"""
+This script defines the ReconstructionJobQueue class, the durable queue of uploads waiting to be reconstructed.
+reconstructionRouter saves each upload to disk, queues a job for it and replies immediately with the job's id.
+
+Jobs are stored in SQLite, so queued jobs survive a restart of the server. Jobs that were in progress when the
+server stopped are queued again on startup, as their uploads are still on disk.
+`RECONSTRUCTION_WORKERS` workers take queued jobs in order and run the reconstruction pipeline on their own threads.
+Jobs of the same capture run one at a time, so iterations are registered in the order they were uploaded.
+
+A job goes through these states, and every change is broadcast to websocket clients with
+`CodeToClient.Reconstruction_JobUpdate`:
+    queued -> reprocessing -> exporting -> converting -> thumbnailing -> registered
+Jobs of mesh uploads skip reprocessing and exporting. A job that fails at any stage ends in the failed state.
+
+Progressive captures upload a new iteration of a capture every few seconds, and each iteration supersedes the
+previous ones. When a worker takes a job, older queued jobs of the same capture are superseded without running.
+A job in progress is superseded at its next stage, or before it is registered, once a newer job of its capture is
+queued, so only the newest model is broadcast. So that a capture uploading faster than it is reconstructed still
+gets models, jobs in progress are not superseded once the capture has waited `RECONSTRUCTION_MAX_SUPERSEDE_DELAY`
+seconds for a model.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from database import ioExecutor
+from database.mongoDB import clientRequests, documentSchemas, documentUtilities, documentWriter, types
+from editingClientSessioning import editingServer
+from reconstruction.postProcessing.blender import blenderPostProcess
+from reconstruction.rtabmap.rtabmapReconstruction import runRtabmapReconstruction, runPostReconstruction
+from websocketCommunications import websocketHandler, websocketEnums
+
+class JobState:
+    QUEUED = "queued"
+    REPROCESSING = "reprocessing"
+    EXPORTING = "exporting"
+    CONVERTING = "converting"
+    THUMBNAILING = "thumbnailing"
+    REGISTERED = "registered"
+    FAILED = "failed"
+    # Skipped for a newer iteration of the same capture.
+    SUPERSEDED = "superseded"
+
+    FINISHED = (REGISTERED, FAILED, SUPERSEDED)
+
+class JobType:
+    # RTAB-Map database, reconstructed then post-processed.
+    DATASET = "dataset"
+    # Meshes uploaded as they are, only post-processed.
+    OBJ = "obj"
+    GLB = "glb"
+
+JOB_COLUMNS = ("job_id", "capture_id", "iteration_id", "job_type", "state", "error",
+               "input_path", "input_name", "temp_model_path", "model_path", "created_at", "updated_at")
+
+# Fields of a job sent to clients. The others hold server paths and errors.
+PUBLIC_JOB_FIELDS = ("job_id", "capture_id", "iteration_id", "job_type", "state", "created_at", "updated_at")
+
+def to_public_job(job: dict[str, any]) -> dict[str, any]:
+    return {field: job[field] for field in PUBLIC_JOB_FIELDS}
+
+class ReconstructionJobStore:
+    """
+    The jobs table. Blocking, and safe to use from the event loop and the worker threads.
+    Once closed, reads return nothing and updates are dropped, for pipelines still running when the server stops.
+    """
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.is_closed = False
+
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    capture_id TEXT NOT NULL,
+                    iteration_id TEXT NOT NULL,
+                    job_type TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    input_path TEXT NOT NULL,
+                    input_name TEXT NOT NULL,
+                    temp_model_path TEXT NOT NULL,
+                    model_path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, job_id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_capture ON jobs (capture_id, job_id)")
+
+    def close(self):
+        with self.lock:
+            self.is_closed = True
+            self.connection.close()
+
+    def add(self, capture_id: str, iteration_id: str, job_type: str, input_path: str, input_name: str,
+            temp_model_path: str, model_path: str) -> dict[str, any]:
+        now = time.time()
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO jobs (capture_id, iteration_id, job_type, state, input_path, input_name, temp_model_path, model_path, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (capture_id, iteration_id, job_type, JobState.QUEUED, input_path, input_name, temp_model_path, model_path, now, now))
+            return self._get(cursor.lastrowid)
+
+    def get(self, job_id: int) -> dict[str, any] | None:
+        with self.lock:
+            if self.is_closed:
+                return None
+            return self._get(job_id)
+
+    def _get(self, job_id: int) -> dict[str, any] | None:
+        row = self.connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return None if row == None else dict(row)
+
+    def get_capture_jobs(self, capture_id: str) -> list[dict[str, any]]:
+        with self.lock:
+            if self.is_closed:
+                return []
+            rows = self.connection.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE capture_id = ? ORDER BY job_id", (capture_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def set_state(self, job_id: int, state: str, error: str | None = None) -> dict[str, any] | None:
+        with self.lock:
+            if self.is_closed:
+                return None
+            self._set_state(job_id, state, error)
+            return self._get(job_id)
+
+    def claim_next(self, busy_captures: set[str], supersede: bool) -> tuple[dict[str, any] | None, list[dict[str, any]]]:
+        """
+        Takes the capture whose oldest queued job is the oldest, among captures with no job in progress.
+        Returns its oldest queued job, or with `supersede` its newest queued job and the older jobs it superseded.
+        The returned job is moved out of the queued state.
+        """
+        with self.lock:
+            if self.is_closed:
+                return None, []
+            placeholders = ", ".join("?" for _ in busy_captures)
+            row = self.connection.execute(
+                f"SELECT job_id, capture_id FROM jobs WHERE state = ? AND capture_id NOT IN ({placeholders}) ORDER BY job_id LIMIT 1",
+                (JobState.QUEUED, *busy_captures)).fetchone()
+            if row == None:
+                return None, []
+
+            job_id = row["job_id"]
+            superseded = []
+            if supersede:
+                job_id = self.connection.execute(
+                    "SELECT MAX(job_id) FROM jobs WHERE state = ? AND capture_id = ?", (JobState.QUEUED, row["capture_id"])).fetchone()[0]
+                superseded_ids = [older[0] for older in self.connection.execute(
+                    "SELECT job_id FROM jobs WHERE state = ? AND capture_id = ? AND job_id < ?", (JobState.QUEUED, row["capture_id"], job_id))]
+                for older_id in superseded_ids:
+                    self._set_state(older_id, JobState.SUPERSEDED, f"Superseded by job {job_id}")
+                    superseded.append(self._get(older_id))
+
+            job_type = self.connection.execute("SELECT job_type FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+            first_state = JobState.REPROCESSING if job_type == JobType.DATASET else JobState.CONVERTING
+            self._set_state(job_id, first_state)
+            return self._get(job_id), superseded
+
+    def _set_state(self, job_id: int, state: str, error: str | None = None):
+        self.connection.execute("UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ?", (state, error, time.time(), job_id))
+
+    def get_newer_job_id(self, capture_id: str, job_id: int) -> int | None:
+        """
+        Returns the id of a job of the same capture queued after the given one, if there is one.
+        """
+        with self.lock:
+            if self.is_closed:
+                return None
+            row = self.connection.execute(
+                "SELECT MAX(job_id) FROM jobs WHERE state = ? AND capture_id = ? AND job_id > ?", (JobState.QUEUED, capture_id, job_id)).fetchone()
+        return row[0]
+
+    def get_waiting_since(self, capture_id: str) -> float:
+        """
+        Returns when the capture's oldest job uploaded after its last registered model was queued.
+        """
+        with self.lock:
+            if self.is_closed:
+                return time.time()
+            last_registered = self.connection.execute(
+                "SELECT MAX(updated_at) FROM jobs WHERE state = ? AND capture_id = ?", (JobState.REGISTERED, capture_id)).fetchone()[0]
+            row = self.connection.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE capture_id = ? AND created_at > ?", (capture_id, last_registered or 0)).fetchone()
+        return row[0] if row[0] != None else time.time()
+
+    def requeue_unfinished(self) -> int:
+        """
+        Queues jobs that were in progress when the server stopped. Returns the number of jobs queued again.
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE state NOT IN (?, ?, ?, ?)",
+                (JobState.QUEUED, time.time(), JobState.QUEUED, *JobState.FINISHED))
+            return cursor.rowcount
+
+    def get_state_counts(self) -> dict[str, int]:
+        with self.lock:
+            if self.is_closed:
+                return {}
+            rows = self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+class ReconstructionJobFailed(RuntimeError):
+    pass
+
+class JobSupersededError(Exception):
+    def __init__(self, newer_job_id: int):
+        super().__init__(f"Superseded by job {newer_job_id}")
+        self.newer_job_id = newer_job_id
+
+class ReconstructionJobQueue:
+    def __init__(self, database_path: str, worker_count: int, supersede: bool, max_supersede_delay: float, shutdown_timeout: float):
+        self.store = ReconstructionJobStore(database_path)
+        self.worker_count = worker_count
+        # Whether newer iterations of a capture supersede older ones.
+        self.supersede = supersede
+        # Seconds a capture may go without a new model before its jobs in progress are no longer superseded.
+        self.max_supersede_delay = max_supersede_delay
+        # The pipeline runs external processes for minutes, so it has its own threads instead of the IO pool.
+        self.executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix="reconstruction")
+        # Pipelines running on the executor, and the seconds shutdown waits for them to finish.
+        self.running_pipelines: set[Future] = set()
+        self.shutdown_timeout = shutdown_timeout
+
+        self.loop: asyncio.AbstractEventLoop = None
+        self.worker_tasks: list[asyncio.Task] = []
+        # Set when a job is queued or finishes, to wake up idle workers.
+        self.jobs_changed = asyncio.Event()
+        # Captures with a job in progress.
+        self.busy_captures: set[str] = set()
+        # Claims run off the event loop, one at a time, so a capture is marked busy before the next claim.
+        self.claim_lock = asyncio.Lock()
+
+# ==================== Start and stop ====================
+
+    def start(self):
+        """
+        Queues jobs interrupted by the last shutdown and starts the workers, and the Blender workers they post-process with.
+        Blocking but short, and must not yield: workers register models in MongoDB, which is set up by a later startup event.
+        """
+        self.loop = asyncio.get_event_loop()
+        requeued = self.store.requeue_unfinished()
+        if requeued > 0:
+            print(f"# Queued {requeued} reconstruction jobs again that were interrupted by the last shutdown")
+        blenderPostProcess.start_worker_pool()
+        self.worker_tasks = [self.loop.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """
+        Stops taking jobs, and waits up to `shutdown_timeout` seconds for jobs in progress to finish.
+        Jobs still running afterwards keep running until their pipeline returns, without updating the closed store,
+        and are queued again on the next startup.
+        """
+        for task in self.worker_tasks:
+            task.cancel()
+        self.worker_tasks = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if len(self.running_pipelines) > 0:
+            print(f"# Waiting up to {self.shutdown_timeout}s for {len(self.running_pipelines)} reconstruction jobs to finish")
+            _, not_done = await asyncio.wait([asyncio.wrap_future(pipeline) for pipeline in self.running_pipelines],
+                                             timeout=self.shutdown_timeout)
+            if len(not_done) > 0:
+                print(f"# {len(not_done)} reconstruction jobs are still running, they will be queued again on the next startup")
+        blenderPostProcess.stop_worker_pool()
+        self.store.close()
+
+# ==================== Jobs ====================
+
+    def enqueue(self, capture_id: str, iteration_id: str, job_type: str, input_path: str, input_name: str,
+                temp_model_path: str, model_path: str) -> dict[str, any]:
+        """
+        Queues an upload that was saved to disk, and returns its job.
+        """
+        job = self.store.add(capture_id, iteration_id, job_type, input_path, input_name, temp_model_path, model_path)
+        print(f"# Queued reconstruction job {job['job_id']} for capture {capture_id}, iteration {iteration_id}")
+        self.jobs_changed.set()
+        self._broadcast_job(job)
+        return job
+
+    def get_job(self, job_id: int) -> dict[str, any] | None:
+        return self.store.get(job_id)
+
+    def get_capture_jobs(self, capture_id: str) -> list[dict[str, any]]:
+        return self.store.get_capture_jobs(capture_id)
+
+    def get_stats(self):
+        return {
+            "workers": self.worker_count,
+            "busy_captures": list(self.busy_captures),
+            "jobs": self.store.get_state_counts(),
+            "blender_workers": None if blenderPostProcess.worker_pool == None else blenderPostProcess.worker_pool.get_stats(),
+        }
+
+# ==================== Workers ====================
+
+    async def _worker(self):
+        while True:
+            async with self.claim_lock:
+                job, superseded = await ioExecutor.run_blocking(self.store.claim_next, set(self.busy_captures), self.supersede)
+                if job != None:
+                    self.busy_captures.add(job["capture_id"])
+            for superseded_job in superseded:
+                print(f"# Reconstruction job {superseded_job['job_id']} skipped, {superseded_job['error']}")
+                self._broadcast_job(superseded_job)
+            if job == None:
+                self.jobs_changed.clear()
+                await self.jobs_changed.wait()
+                continue
+
+            self._broadcast_job(job)
+            try:
+                await self._run_job(job)
+            finally:
+                self.busy_captures.discard(job["capture_id"])
+                # Later jobs of the same capture may be waiting for this one.
+                self.jobs_changed.set()
+
+    async def _run_job(self, job: dict[str, any]):
+        pipeline = self.executor.submit(self._run_pipeline, job)
+        self.running_pipelines.add(pipeline)
+        pipeline.add_done_callback(self.running_pipelines.discard)
+        finished_job = await asyncio.wrap_future(pipeline)
+        if finished_job == None:
+            return
+
+        self._broadcast_job(finished_job)
+        if finished_job["state"] == JobState.REGISTERED:
+            # New iteration changes the latest version and thumbnail shown in model previews.
+            clientRequests.invalidate_model_previews()
+            await editingServer.EditingServer._broadcast_new_reconstruction(job["capture_id"])
+
+    def _run_pipeline(self, job: dict[str, any]) -> dict[str, any] | None:
+        """
+        Runs a job and returns it in the state it finished in. Runs on a worker thread.
+        States are written to the store from this thread, so a job finishing while the server stops is still recorded.
+        Returns None if the store was closed first.
+        """
+        job_id = job["job_id"]
+        try:
+            self._run_stages(job)
+        except JobSupersededError as e:
+            print(f"# Reconstruction job {job_id} stopped, {e}")
+            return self.store.set_state(job_id, JobState.SUPERSEDED, str(e))
+        except Exception as e:
+            print(f"# Reconstruction job {job_id} failed: {e}")
+            return self.store.set_state(job_id, JobState.FAILED, str(e))
+        return self.store.set_state(job_id, JobState.REGISTERED)
+
+    def _run_stages(self, job: dict[str, any]):
+        """
+        Reconstructs and post-processes the upload of a job, and registers the model in MongoDB.
+        """
+        job_id = job["job_id"]
+        capture_id = job["capture_id"]
+        iteration_id = job["iteration_id"]
+
+        # The job was claimed in its first stage already.
+        current_state = [job["state"]]
+
+        def on_stage(state: str):
+            self._check_superseded(job)
+            if state == current_state[0]:
+                return
+            current_state[0] = state
+            updated_job = self.store.set_state(job_id, state)
+            if updated_job != None:
+                self.loop.call_soon_threadsafe(self._broadcast_job, updated_job)
+
+        if job["job_type"] == JobType.DATASET:
+            resultsReconstruction = runRtabmapReconstruction(
+                job["input_path"], job["temp_model_path"], job["model_path"], job["input_name"], capture_id, iteration_id, on_stage
+            )
+            if resultsReconstruction["success"] == False:
+                raise ReconstructionJobFailed("Reconstruction failed")
+
+        # Dataset reconstructions are exported as OBJ.
+        file_extension = JobType.GLB if job["job_type"] == JobType.GLB else JobType.OBJ
+        resultsPost = runPostReconstruction(job["temp_model_path"], job["model_path"], iteration_id, file_extension, False, on_stage)
+        if resultsPost["success"] == False:
+            raise ReconstructionJobFailed("Post-processing failed")
+
+        self._check_superseded(job)
+        register_model(capture_id, iteration_id, resultsPost)
+
+    def _check_superseded(self, job: dict[str, any]):
+        """
+        Raises JobSupersededError if a newer job of the capture is queued. Called between stages, on a worker thread.
+        """
+        if self.supersede == False:
+            return
+        newer_job_id = self.store.get_newer_job_id(job["capture_id"], job["job_id"])
+        if newer_job_id == None:
+            return
+        # The capture has waited too long for a model, finish this one rather than starting over again.
+        if time.time() - self.store.get_waiting_since(job["capture_id"]) > self.max_supersede_delay:
+            return
+        raise JobSupersededError(newer_job_id)
+
+    def _broadcast_job(self, job: dict[str, any]):
+        self.loop.create_task(websocketHandler.broadcast_to_sockets(
+            list(websocketHandler.connected_sockets.keys()),
+            websocketEnums.CodeToClient.Reconstruction_JobUpdate,
+            to_public_job(job),
+        ))
+
+def register_model(capture_id: str, iteration_id: str, resultsPost: dict[str, any]):
+    """
+    Creates the documents of a post-processed model. Blocking.
+    Raises ReconstructionJobFailed if a document could not be written, so the job is not reported as registered.
+    """
+    db_filter = {'data_uid': capture_id}
+    collect_type = types.CollectionType.RECONSTRUCTIONS
+
+    model_data_doc = documentUtilities.get_unique_document(collect_type, db_filter)
+
+    #Create document for new model data since it does not exist.
+    # Existing model data is kept, it holds the name and description edited by users.
+    if model_data_doc is None:
+        model_data = documentSchemas.ModelData_Document(data_uid=capture_id)
+        if documentWriter.upload_unique_object(collect_type, model_data, db_filter) == False:
+            # Created by a concurrent registration of the same capture, which is fine.
+            if documentUtilities.get_unique_document(collect_type, db_filter) is None:
+                raise ReconstructionJobFailed(f"Could not register model data of capture {capture_id}")
+
+    #Create document for iteration.
+    # Will always run no matter if it is a new capture (1st iteration) or new iteration (2nd or higher iteration)
+    # A re-run of the same iteration replaces its document, which describes the files that were just written.
+    model_object = documentSchemas.ModelObject_Document(
+        data_ref_id=capture_id,
+        version=iteration_id,
+        filetype=resultsPost["file_type"],
+        has_thumbnail=resultsPost["has_thumbnail"],
+        model_filename=iteration_id,
+        thumbnail_filename="thumbnail.png"
+    )
+    uploaded = documentWriter.upload_unique_object(
+        collect_type,
+        model_object,
+        {"data_ref_id": capture_id, "version": iteration_id, "filetype": model_object.filetype},
+        overwrite=True
+    )
+    if uploaded == False:
+        raise ReconstructionJobFailed(f"Could not register iteration {iteration_id} of capture {capture_id}")
+
+    print("Registering capture and iteration to database...")
+    print("Caputre ID:" + capture_id)
+    print("Iteration ID:" + iteration_id)
+
+job_queue: ReconstructionJobQueue = None
+
+def create_instance() -> ReconstructionJobQueue:
+    global job_queue
+    job_queue = ReconstructionJobQueue(
+        os.environ.get('RECONSTRUCTION_JOB_DB', default="captures/reconstructionJobs.sqlite3"),
+        int(os.environ.get('RECONSTRUCTION_WORKERS', default=1)),
+        os.environ.get('RECONSTRUCTION_SUPERSEDE', default="1") == "1",
+        float(os.environ.get('RECONSTRUCTION_MAX_SUPERSEDE_DELAY', default=60.0)),
+        float(os.environ.get('RECONSTRUCTION_SHUTDOWN_TIMEOUT', default=10.0)),
+    )
+    return job_queue
+
+async def shutdown_instance():
+    global job_queue
+    if job_queue != None:
+        await job_queue.stop()
+        job_queue = None
@@ -1,5 +1,3 @@
-import asyncio
-import concurrent.futures
 import os
 import shutil
 # from colorama import Fore, Back, Style
@@ -7,22 +5,37 @@ import shutil
 from fastapi import APIRouter, File, UploadFile
 from fastapi.responses import JSONResponse
 
-from database.mongoDB import documentSchemas, documentUtilities, documentWriter
 # from ..utililites import modelIOTools
 
-# from ..websocketCommunications import websocketHandler
-from editingClientSessioning import editingServer
-
 # Generic functions inmport
 from utililites import directoryTools
 
-from reconstruction.rtabmap.rtabmapReconstruction import runRtabmapReconstruction, runPostReconstruction
-
-from database.mongoDB import types
+from reconstruction import reconstructionJobQueue
 
 router = APIRouter(tags=["reconstructionRouter"])
 
-executor = concurrent.futures.ThreadPoolExecutor()
+@router.on_event("startup")
+def startup_router():
+    reconstructionJobQueue.create_instance().start()
+
+@router.on_event("shutdown")
+async def shutdown_router():
+    await reconstructionJobQueue.shutdown_instance()
+
+@router.get("/reconstructionJobs/metrics")
+def get_reconstruction_job_metrics():
+    return reconstructionJobQueue.job_queue.get_stats()
+
+@router.get("/reconstructionJobs/{job_id}")
+def get_reconstruction_job(job_id: int):
+    job = reconstructionJobQueue.job_queue.get_job(job_id)
+    if job == None:
+        return JSONResponse(status_code=404, content={"error": f"Reconstruction job not found: {job_id}"})
+    return reconstructionJobQueue.to_public_job(job)
+
+@router.get("/reconstructionJobs")
+def get_reconstruction_jobs(captureID: str):
+    return {"jobs": [reconstructionJobQueue.to_public_job(job) for job in reconstructionJobQueue.job_queue.get_capture_jobs(captureID)]}
 
 @router.post("/uploaddataset/{captureID}")
 async def upload_dataset(captureID: str, file: UploadFile = File(...)):
@@ -60,78 +73,12 @@ async def upload_dataset(captureID: str, file: UploadFile = File(...)):
             with open(f"{datasetPathRoot}/{file.filename}", "wb") as buffer:
                 shutil.copyfileobj(file.file, buffer)
 
-            # Try run reconstruction
-            try:
-                # Run reconstruction operation
-                loop = asyncio.get_running_loop()
-                resultsReconstruction = await loop.run_in_executor(
-                    executor,
-                    runRtabmapReconstruction, datasetPathRoot, tempModelPathRoot, modelPathRoot, databaseInputFileName, captureID, iterationID,
-                )
-
-            except Exception as e:
-                # Handle a specific error related to the reconstruction process
-                return JSONResponse(status_code=500, content={"error": f"Reconstruction failed: {e}"})
-
-            #  Try run post-processing for reconstruction
-            try:
-                # If reconstruction successful, run post processing
-                if resultsReconstruction["success"]:
-                    #Run post-processing.
-                    loop = asyncio.get_running_loop()
-                    resultsPost = await loop.run_in_executor(
-                        executor, runPostReconstruction, tempModelPathRoot, modelPathRoot, iterationID, "obj", False
-                    )
-                else:
-                    print("Reconstruct failed!")
-
-                # If postprocessing successful, write to MongoDB
-                if resultsPost["success"]:
-                    db_filter = {'data_uid': captureID}
-                    collect_type = types.CollectionType.RECONSTRUCTIONS
-
-                    model_data_doc = documentUtilities.get_unique_document(
-                        collect_type,
-                        {'data_uid': captureID}
-                        )
-
-                    #Create document for new model data since it does not exist.
-                    if model_data_doc is None:
-                        model_data = documentSchemas.ModelData_Document(data_uid=captureID)
-                        documentWriter.upload_unique_object(
-                            collect_type,
-                            model_data,
-                            db_filter
-                        )
-
-                    #Create document for iteration.
-                    # Will always run no matter if it is a new capture (1st iteration) or new iteration (2nd or higher iteration)
-                    model_object = documentSchemas.ModelObject_Document(
-                        data_ref_id=captureID,
-                        version=iterationID,
-                        filetype=resultsPost["file_type"],
-                        has_thumbnail=resultsPost["has_thumbnail"],
-                        model_filename=iterationID,
-                        thumbnail_filename="thumbnail.png"
-                    )
-                    documentWriter.upload_unique_object(
-                        collect_type,
-                        model_object,
-                        {"ref_id": captureID, "version": iterationID}
-                    )
-
-                    print("Registering capture and iteration to database...")
-                    print("Caputre ID:" + captureID)
-                    print("Iteration ID:" + iterationID)
-
-                    await editingServer.EditingServer._broadcast_new_reconstruction(captureID)
-
-            except Exception as e:
-                # Handle a specific error related to the reconstruction process
-                return JSONResponse(status_code=500, content={"error": f"Dataset Post-processing for reconstruction failed: {e}"})
-
-            # Return success response after successful reconstruction
-            return {"Database file Name": file.filename}
+            # Reconstruction runs in the background, progress is reported by the job.
+            job = reconstructionJobQueue.job_queue.enqueue(
+                captureID, iterationID, reconstructionJobQueue.JobType.DATASET,
+                datasetPathRoot, databaseInputFileName, tempModelPathRoot, modelPathRoot,
+            )
+            return JSONResponse(status_code=202, content={"Database file Name": file.filename, "job": reconstructionJobQueue.to_public_job(job)})
 
     except FileNotFoundError as e:
         # Handle file not found errors
@@ -205,81 +152,17 @@ async def upload_individual_obj(captureID: str, modelFile: UploadFile = File(...
                     os.path.exists(f"{tempModelPathRoot}/{textureFile.filename}")
                 )
             }
-            # # Try run reconstruction
-            # try:
-            #     # Run reconstruction operation
-            #     loop = asyncio.get_running_loop()
-            #     resultsReconstruction = await loop.run_in_executor(
-            #         executor,
-            #         runRtabmapReconstruction, datasetPathRoot, tempModelPathRoot, modelPathRoot, captureVersionFullString, captureID, iterationID,
-            #     )
-
-            # except Exception as e:
-            #     # Handle a specific error related to the reconstruction process
-            #     return JSONResponse(status_code=500, content={"error": f"Reconstruction failed: {e}"})
-
-            #  Try running post-processing for reconstruction
-            try:
-                # If reconstruction successful, run post processing
-                if copysuccessful["success"]:
-                    print("Upload files successful")
-
-                    #Run post-processing.
-                    loop = asyncio.get_running_loop()
-                    resultsPost = await loop.run_in_executor(
-                        executor, runPostReconstruction, tempModelPathRoot, modelPathRoot, iterationID, "obj", False
-                    )
-
-                else:
-                    print("Files upload failed!")
-
-                # If postprocessing successful, write to MongoDB
-                if resultsPost["success"]:
-                    db_filter = {'data_uid': captureID}
-                    collect_type = types.CollectionType.RECONSTRUCTIONS
-
-                    model_data_doc = documentUtilities.get_unique_document(
-                        collect_type,
-                        {'data_uid': captureID}
-                        )
-
-                    #Create document for new model data since it does not exist.
-                    if model_data_doc is None:
-                        model_data = documentSchemas.ModelData_Document(data_uid=captureID)
-                        documentWriter.upload_unique_object(
-                            collect_type,
-                            model_data,
-                            db_filter
-                        )
-
-                    #Create document for iteration.
-                    # Will always run no matter if it is a new capture (1st iteration) or new iteration (2nd or higher iteration)
-                    model_object = documentSchemas.ModelObject_Document(
-                        data_ref_id=captureID,
-                        version=iterationID,
-                        filetype=resultsPost["file_type"],
-                        has_thumbnail=resultsPost["has_thumbnail"],
-                        model_filename=iterationID,
-                        thumbnail_filename="thumbnail.png"
-                    )
-                    documentWriter.upload_unique_object(
-                        collect_type,
-                        model_object,
-                        {"ref_id": captureID, "version": iterationID}
-                    )
-
-                    print("Registering capture and iteration to database...")
-                    print("Caputre ID:" + captureID)
-                    print("Iteration ID:" + iterationID)
-
-                    await editingServer.EditingServer._broadcast_new_reconstruction(captureID)
-
-            except Exception as e:
-                # Handle a specific error related to the reconstruction process
-                return JSONResponse(status_code=500, content={"error": f"OBJ Post-processing for reconstruction failed: {e}"})
-
-            # Return success response after successful reconstruction
-            return {"Database file Name": modelFile.filename}
+            if copysuccessful["success"] == False:
+                print("Files upload failed!")
+                return JSONResponse(status_code=500, content={"error": "Files upload failed"})
+            print("Upload files successful")
+
+            # Post-processing runs in the background, progress is reported by the job.
+            job = reconstructionJobQueue.job_queue.enqueue(
+                captureID, iterationID, reconstructionJobQueue.JobType.OBJ,
+                tempModelPathRoot, modelFile.filename, tempModelPathRoot, modelPathRoot,
+            )
+            return JSONResponse(status_code=202, content={"Database file Name": modelFile.filename, "job": reconstructionJobQueue.to_public_job(job)})
 
     except FileNotFoundError as e:
         # Handle file not found errors
@@ -340,68 +223,17 @@ async def upload_individual_glb(captureID: str, modelFile: UploadFile = File(...
                 )
             }
 
-            #  Try running post-processing for reconstruction
-            try:
-                # If reconstruction successful, run post processing
-                if copysuccessful["success"]:
-                    print("Upload files successful")
-
-                    #Run post-processing.
-                    loop = asyncio.get_running_loop()
-                    resultsPost = await loop.run_in_executor(
-                        executor, runPostReconstruction, tempModelPathRoot, modelPathRoot, iterationID, "glb", False
-                    )
-
-                else:
-                    print("Files upload failed!")
-
-                # If postprocessing successful, write to MongoDB
-                if resultsPost["success"]:
-                    db_filter = {'data_uid': captureID}
-                    collect_type = types.CollectionType.RECONSTRUCTIONS
-
-                    model_data_doc = documentUtilities.get_unique_document(
-                        collect_type,
-                        {'data_uid': captureID}
-                        )
-
-                    #Create document for new model data since it does not exist.
-                    if model_data_doc is None:
-                        model_data = documentSchemas.ModelData_Document(data_uid=captureID)
-                        documentWriter.upload_unique_object(
-                            collect_type,
-                            model_data,
-                            db_filter
-                        )
-
-                    #Create document for iteration.
-                    # Will always run no matter if it is a new capture (1st iteration) or new iteration (2nd or higher iteration)
-                    model_object = documentSchemas.ModelObject_Document(
-                        data_ref_id=captureID,
-                        version=iterationID,
-                        filetype=resultsPost["file_type"],
-                        has_thumbnail=resultsPost["has_thumbnail"],
-                        model_filename=iterationID,
-                        thumbnail_filename="thumbnail.png"
-                    )
-                    documentWriter.upload_unique_object(
-                        collect_type,
-                        model_object,
-                        {"ref_id": captureID, "version": iterationID}
-                    )
-
-                    print("Registering capture and iteration to database...")
-                    print("Caputre ID:" + captureID)
-                    print("Iteration ID:" + iterationID)
-
-                    await editingServer.EditingServer._broadcast_new_reconstruction(captureID)
-
-            except Exception as e:
-                # Handle a specific error related to the reconstruction process
-                return JSONResponse(status_code=500, content={"error": f"GLB Post-processing for reconstruction failed: {e}"})
-
-            # Return success response after successful reconstruction
-            return {"Database file Name": modelFile.filename}
+            if copysuccessful["success"] == False:
+                print("Files upload failed!")
+                return JSONResponse(status_code=500, content={"error": "Files upload failed"})
+            print("Upload files successful")
+
+            # Post-processing runs in the background, progress is reported by the job.
+            job = reconstructionJobQueue.job_queue.enqueue(
+                captureID, iterationID, reconstructionJobQueue.JobType.GLB,
+                tempModelPathRoot, modelFile.filename, tempModelPathRoot, modelPathRoot,
+            )
+            return JSONResponse(status_code=202, content={"Database file Name": modelFile.filename, "job": reconstructionJobQueue.to_public_job(job)})
 
     except FileNotFoundError as e:
         # Handle file not found errors
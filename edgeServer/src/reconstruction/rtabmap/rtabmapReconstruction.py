@@ -1,14 +1,21 @@
 import os, shutil, subprocess
+from typing import Callable
 from colorama import Back, Style
 
 # Generic functions inmport
 from utililites import directoryTools
 
 from datetime import datetime
-from reconstruction.postProcessing.blender.blenderPostProcess import (
-    run_model_conversion,
-    run_thumbnail_generation,
-)
+from reconstruction.postProcessing.blender.blenderPostProcess import run_post_processing
+from reconstruction.postProcessing.trimeshConversion import trimeshPostProcess
+
+# Post-processing stages, with or without Blender -> job state reported to `on_stage`.
+BLENDER_STAGE_STATES = {
+    "import": "converting",
+    "glb": "converting",
+    "obj": "converting",
+    "thumbnail": "thumbnailing",
+}
 
 
 # Function used to run RTAB-Map recosonstruction using .db files
@@ -19,7 +26,12 @@ def runRtabmapReconstruction(
     databaseFileName: str,
     captureID: str,
     iterationID: str,
+    on_stage: Callable[[str], None] = None,
 ):
+    """
+    `on_stage` is called with the name of each stage as it starts, see reconstructionJobQueue.JobState.
+    It may raise to skip the remaining stages, e.g. when a newer iteration supersedes this one.
+    """
     reconstructionSuccess = False
 
     print(
@@ -54,6 +66,9 @@ def runRtabmapReconstruction(
     tempOutputMTL = f"{tempOutputPrefix}.mtl"
     tempOutputJPG = f"{tempOutputPrefix}.jpg"
 
+    if on_stage != None:
+        on_stage("reprocessing")
+
     # If Windows, run outside of Docker
     if os.name == "nt":
         reprocessCmd += (
@@ -64,6 +79,9 @@ def runRtabmapReconstruction(
         # system cmd to call preprocessing of db file
         os.system(reprocessCmd)
 
+        if on_stage != None:
+            on_stage("exporting")
+
         reconstructCmd += f" {reconstructOptions} --output_dir {outputDir} --output {databaseFileName} {inputDir}/{reprocessedDB}"
         print(reconstructCmd)
 
@@ -83,6 +101,9 @@ def runRtabmapReconstruction(
         # system cmd to call preprocessing of db file
         subprocess.run(dockerReprocess, shell=True)
 
+        if on_stage != None:
+            on_stage("exporting")
+
         # create strings for reconstruction cmd
         reconstructCmd += f" {reconstructOptions} --output_dir /output --output {databaseFileName} input/{reprocessedDB}"
         dockerOpts = f"--rm -w / -v {inputDir}:/input -v {outputDir}:/output"
@@ -152,6 +173,7 @@ def runPostReconstruction(
     iterationID: str,
     oldFile_extension: str,
     deleteOldPathContains: bool,
+    on_stage: Callable[[str], None] = None,
 ):
     oldModelPathRoot = str(oldModelPathRoot)
     newModelPathRoot = str(newModelPathRoot)
@@ -165,6 +187,7 @@ def runPostReconstruction(
 
     outputFileExtension: str = "." + oldFile_extension
     has_thumbnail: bool = False
+    timings: dict[str, float] = {}
 
     oldFileName = iterationID + oldFile_extension
     oldFilePath = oldModelPathRoot + "/" + oldFileName
@@ -182,11 +205,26 @@ def runPostReconstruction(
         # #Run post-processing.
         # post_process_complete = blend_utils.run_post_processing_windows(newNamePath, outputPath, nextModelID + ".glb", "thumbnail")
 
-        # Run conversion to GLB
-        processComplete = run_model_conversion(
-            oldFilePath, newFileFolderPath, newFileGLBName
+        def on_post_process_stage(stage: str):
+            if on_stage != None:
+                on_stage(BLENDER_STAGE_STATES[stage])
+
+        # Run conversion to GLB and OBJ and thumbnail generation without Blender if the model allows it,
+        # otherwise in one Blender process
+        postProcessResults = trimeshPostProcess.run_post_processing(
+            oldFilePath, newFileFolderPath, iterationID, "thumbnail", on_post_process_stage
         )
-        if processComplete == True:
+        if postProcessResults == None:
+            postProcessResults = run_post_processing(
+                oldFilePath, newFileFolderPath, iterationID, "thumbnail", on_post_process_stage
+            )
+        if postProcessResults != None:
+            timings = postProcessResults["timings"]
+            glbSuccess = postProcessResults["success"]["glb"]
+            objSuccess = postProcessResults["success"]["obj"]
+            thumbnailSuccess = postProcessResults["success"]["thumbnail"]
+
+        if glbSuccess == True:
             print(
                 "========================================================\n"
                 + f" GLB CONVERSION SUCCESSFUL FOR RECONSTRUCTION {oldFileName}  \n"
@@ -196,16 +234,8 @@ def runPostReconstruction(
             print("Model available at: " + newFileFolderPath)
 
             outputFileExtension = ".glb"
-            glbSuccess = True
-
-        # Reset the process bool for the next process
-        processComplete = False
 
-        # Run conversion to OBJ
-        processComplete = run_model_conversion(
-            oldFilePath, newFileFolderPath, newFileOBJName
-        )
-        if processComplete == True:
+        if objSuccess == True:
             print(
                 "========================================================\n"
                 + f" OBJ CONVERSION SUCCESSFUL FOR RECONSTRUCTION {oldFileName}  \n"
@@ -214,20 +244,12 @@ def runPostReconstruction(
             )
             print("Model available at: " + newFileFolderPath)
 
-            # outputFileExtension = ".obj"
-            objSuccess = True
-
         # TODO: Rename from {captureID}-{iterationID}_mesh.jpg to texture.jpg
         # Change line in corresponding `.mtl` file
         # map_Kd {captureID}-{iterationID}_mesh.jpg -->
         # map_Kd texture.jpg
-        processComplete = False
 
-        # Run thumbnail generation
-        processComplete = run_thumbnail_generation(
-            oldFilePath, newFileFolderPath, "thumbnail"
-        )
-        if processComplete == True:
+        if thumbnailSuccess == True:
             print(
                 "========================================================\n"
                 + f" THUMNAIL GENERATION SUCCESSFUL FOR RECONSTRUCTION {oldFileName}  \n"
@@ -236,7 +258,6 @@ def runPostReconstruction(
             print("Thumbnail available at: " + newFileFolderPath)
 
             has_thumbnail = True
-            thumbnailSuccess = True
 
         if objSuccess == True and glbSuccess == True and thumbnailSuccess == True:
             allProcessesSuccessful = True
@@ -250,4 +271,5 @@ def runPostReconstruction(
         "version": iterationID,
         "file_type": outputFileExtension,
         "has_thumbnail": has_thumbnail,
+        "timings": timings,
     }
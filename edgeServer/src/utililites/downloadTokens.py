@@ -0,0 +1,42 @@
+"""
+Short lived tokens for HTTP downloads that are requested over the websocket.
+The websocket reply only carries a URL with the token, and the HTTP endpoint resolves it back to what was requested.
+A token can be used until it expires, so interrupted downloads can be resumed with range requests.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+TOKEN_LIFETIME = float(os.environ.get('DOWNLOAD_TOKEN_LIFETIME', default=600.0))
+MAX_TOKENS = 256
+
+_tokens: OrderedDict[str, tuple[float, any]] = OrderedDict()
+_lock = threading.Lock()
+
+def issue(payload) -> str:
+    token = secrets.token_urlsafe(24)
+    with _lock:
+        _remove_expired()
+        _tokens[token] = (time.monotonic() + TOKEN_LIFETIME, payload)
+        while len(_tokens) > MAX_TOKENS:
+            _tokens.popitem(last=False)
+    return token
+
+def resolve(token: str):
+    """
+    Returns the payload of a token, or None if the token does not exist or has expired.
+    """
+    with _lock:
+        _remove_expired()
+        entry = _tokens.get(token)
+    return entry[1] if entry != None else None
+
+def _remove_expired():
+    now = time.monotonic()
+    while len(_tokens) > 0:
+        token, (expiry, _) = next(iter(_tokens.items()))
+        if expiry > now:
+            break
+        del _tokens[token]
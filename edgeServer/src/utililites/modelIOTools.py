@@ -1,8 +1,9 @@
 import os
 import base64
-import shutil
 import datetime
 
+from utililites.zipStreaming import StreamingZip, ZipEntry
+
 captureDirectory = "captures"
 modelDirectory = "models"
 imageDirectory = "images"
@@ -11,6 +12,7 @@ assetDirectory = "assets"
 editingAssetDirectory = "assets/editing"
 
 downloadModelEndpoint = "/downloadModel"
+downloadModelZipEndpoint = "/downloadModelZip"
 
 #Scans directory for sub-folders and returns a list of directory names.
 def get_path_directories(path):
@@ -30,8 +32,27 @@ def GetBase64Data(path: str):
     file.close()
     return base64.b64encode(data).decode("utf-8")
 
-def CreateZipFileFromPath(outputPath, pathToZip):
-    shutil.make_archive(outputPath,"zip", pathToZip)
+def create_model_zip(model_dir: str, info_text: str) -> StreamingZip:
+    """
+    Lays out a zip of every file in a model directory, plus an `info.txt` generated in memory.
+    Files are sorted by name so the same directory always gives the same archive.
+    """
+    entries = []
+    newest_modified_time = 0.0
+    for dir_path, dir_names, file_names in os.walk(model_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            name = os.path.relpath(path, model_dir).replace(os.sep, "/")
+            # Older downloads wrote info.txt into the model directory, the generated one replaces it.
+            if name == "info.txt":
+                continue
+            entry = ZipEntry.from_file(name, path)
+            newest_modified_time = max(newest_modified_time, entry.modified_time)
+            entries.append(entry)
+
+    entries.append(ZipEntry.from_bytes("info.txt", info_text.encode("utf-8"), newest_modified_time))
+    return StreamingZip(entries)
 
 def get_file_meta_data(file_path: str):
     def to_string_dt(dt):
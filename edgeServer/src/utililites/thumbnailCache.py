@@ -0,0 +1,103 @@
+"""
+LRU cache of model thumbnails served over HTTP.
+
+Thumbnails are keyed by capture id, version, file name and file modification time, so a thumbnail rewritten on disk
+is never served from a stale entry. Only PNG files inside the captures directory are served. The ETag is derived from the same key, which lets model previews
+build cacheable thumbnail URLs from a `stat` without reading the image.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+MAX_CACHE_BYTES = int(os.environ.get('THUMBNAIL_CACHE_BYTES', default=64 * 1024 * 1024))
+
+thumbnailEndpoint = "/modelThumbnail"
+
+# (capture id, version, file name, modification time in ns)
+CacheKey = tuple[str, str, str, int]
+
+class Thumbnail:
+    def __init__(self, data: bytes, etag: str):
+        self.data = data
+        self.etag = etag
+
+class ThumbnailCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[CacheKey, Thumbnail] = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey, path: str) -> Thumbnail:
+        """
+        Returns the thumbnail for a key, reading it from `path` on a miss.
+        """
+        with self.lock:
+            thumbnail = self.entries.get(key)
+            if thumbnail != None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return thumbnail
+            self.misses += 1
+
+        with open(path, "rb") as file:
+            thumbnail = Thumbnail(file.read(), make_etag(key))
+
+        with self.lock:
+            if key not in self.entries and len(thumbnail.data) <= self.max_bytes:
+                self.entries[key] = thumbnail
+                self.cached_bytes += len(thumbnail.data)
+                while self.cached_bytes > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.cached_bytes -= len(evicted.data)
+        return thumbnail
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "cached_bytes": self.cached_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+cache = ThumbnailCache(MAX_CACHE_BYTES)
+
+def get_thumbnail_path(captures_dir: str, uid: str, version: str, thumbnail_name: str) -> str:
+    return captures_dir + "/" + uid + "/models/" + version + "/" + thumbnail_name
+
+def resolve_thumbnail_path(captures_dir: str, uid: str, version: str, thumbnail_name: str) -> str | None:
+    """
+    Returns the real path of a thumbnail requested by a client,
+    or None unless it is a PNG file that resolves to a path inside `captures_dir`.
+    """
+    if thumbnail_name.lower().endswith(".png") == False:
+        return None
+    root = os.path.realpath(captures_dir)
+    path = os.path.realpath(get_thumbnail_path(captures_dir, uid, version, thumbnail_name))
+    if path.startswith(root + os.sep) == False:
+        return None
+    return path
+
+def get_cache_key(uid: str, version: str, thumbnail_name: str, path: str) -> CacheKey | None:
+    """
+    Returns the cache key of a thumbnail file, or None if it does not exist.
+    """
+    try:
+        return (uid, version, thumbnail_name, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+def make_etag(key: CacheKey) -> str:
+    digest = hashlib.sha1(f"{key[0]}/{key[1]}/{key[2]}/{key[3]}".encode("utf-8")).hexdigest()
+    return '"' + digest[:32] + '"'
+
+def get_thumbnail_url(key: CacheKey) -> str:
+    """
+    URL of a thumbnail, versioned by its ETag so browsers can cache it for as long as they like.
+    """
+    return f"{thumbnailEndpoint}/{key[0]}/{key[1]}/{key[2]}?v={make_etag(key).strip(chr(34))}"
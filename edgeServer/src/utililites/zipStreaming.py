@@ -0,0 +1,297 @@
+"""
+Builds zip archives on the fly, so large models can be downloaded without writing or buffering the zip.
+
+Reconstructions are mostly GLB, JPG and PNG files that are already compressed, so those entries are stored as is.
+Text files such as OBJ, MTL and info.txt are deflated in memory while the archive is laid out, up to
+`ZIP_DEFLATE_MAX_SIZE` bytes. Larger ones are stored too, as a compressed size is only known after compressing,
+and the archive's length must be known before it is sent.
+Entries use data descriptors, so the CRC of a stored file is only needed after its data has been sent:
+a full download computes it while streaming, and range requests use the CRC cache.
+Local headers still carry the sizes, for unzippers reading the archive as a stream.
+Since every size is known up front, the archive has a fixed length and any byte range can be served.
+
+Zip64 is not supported, archives and entries must be smaller than 4 GiB.
+"""
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+CHUNK_SIZE = 1024 * 1024
+MAX_ZIP_SIZE = 0xFFFFFFFF
+
+# General purpose flags: the CRC follows the data in a data descriptor, and names are UTF-8.
+ZIP_FLAGS = 0x0008 | 0x0800
+ZIP_VERSION = 20
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+DEFLATED_EXTENSIONS = (".obj", ".mtl", ".txt")
+# Text files up to this size, in bytes, are read and deflated when the archive is laid out.
+DEFLATE_MAX_SIZE = int(os.environ.get('ZIP_DEFLATE_MAX_SIZE', default=8 * 1024 * 1024))
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+DATA_DESCRIPTOR = struct.Struct("<IIII")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<IHHHHIIH")
+
+class ZipRangeError(ValueError):
+    pass
+
+# ==================== CRC cache ====================
+
+class CrcCache:
+    """
+    CRC32 of files keyed by path, size and modification time, so a changed file is never matched.
+    Shared by the threads serving downloads.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, int, int], int] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple[str, int, int]) -> int | None:
+        with self.lock:
+            crc = self.entries.get(key)
+            if crc != None:
+                self.entries.move_to_end(key)
+            return crc
+
+    def put(self, key: tuple[str, int, int], crc: int):
+        with self.lock:
+            self.entries[key] = crc
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+crc_cache = CrcCache(int(os.environ.get('ZIP_CRC_CACHE_SIZE', default=4096)))
+
+# ==================== Entries ====================
+
+def _to_dos_datetime(timestamp: float) -> tuple[int, int]:
+    local_time = time.localtime(timestamp)
+    if local_time.tm_year < 1980:
+        return 0, (1 << 5) | 1
+
+    dos_time = (local_time.tm_hour << 11) | (local_time.tm_min << 5) | (local_time.tm_sec // 2)
+    dos_date = ((local_time.tm_year - 1980) << 9) | (local_time.tm_mon << 5) | local_time.tm_mday
+    return dos_time, dos_date
+
+class ZipEntry:
+    def __init__(self, name: str, size: int, modified_time: float, path: str = None, data: bytes = None, modified_time_ns: int = 0):
+        self.name = name
+        self.encoded_name = name.encode("utf-8")
+        self.size = size
+        self.modified_time = modified_time
+        self.modified_time_ns = modified_time_ns
+        self.dos_time, self.dos_date = _to_dos_datetime(modified_time)
+
+        # Either a file streamed from disk, or data held in memory.
+        self.path = path
+        self.data = data
+        self.crc: int | None = zlib.crc32(data) if data != None else crc_cache.get(self.get_cache_key())
+
+        # Bytes written to the archive, which are `data` deflated if it compresses.
+        self.compression_method = ZIP_STORED
+        self.compressed_size = size
+        if data != None and os.path.splitext(name)[1].lower() in DEFLATED_EXTENSIONS:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            compressed = compressor.compress(data) + compressor.flush()
+            if len(compressed) < size:
+                self.data = compressed
+                self.compression_method = ZIP_DEFLATED
+                self.compressed_size = len(compressed)
+
+        # Set when the archive is laid out.
+        self.header_offset = 0
+
+    @classmethod
+    def from_file(cls, name: str, path: str):
+        file_stats = os.stat(path)
+        data = None
+        if os.path.splitext(name)[1].lower() in DEFLATED_EXTENSIONS and file_stats.st_size <= DEFLATE_MAX_SIZE:
+            with open(path, "rb") as file:
+                data = file.read()
+            if len(data) != file_stats.st_size:
+                raise IOError(f"{path} changed while it was being zipped")
+        return cls(name, file_stats.st_size, file_stats.st_mtime, path=path, data=data, modified_time_ns=file_stats.st_mtime_ns)
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes, modified_time: float):
+        return cls(name, len(data), modified_time, data=data)
+
+    def get_cache_key(self) -> tuple[str, int, int]:
+        return (self.path, self.size, self.modified_time_ns)
+
+    def get_crc(self) -> int:
+        """
+        Returns the CRC32 of the entry, reading the whole file if it is not known yet.
+        """
+        if self.crc == None:
+            crc = 0
+            for chunk in self._read_file(0, self.size):
+                crc = zlib.crc32(chunk, crc)
+            self._set_crc(crc)
+        return self.crc
+
+    def _set_crc(self, crc: int):
+        self.crc = crc
+        if self.path != None and self.data == None:
+            crc_cache.put(self.get_cache_key(), crc)
+
+    def read(self, start: int, end: int):
+        """
+        Yields the entry's data, as written to the archive, from `start` up to `end`.
+        """
+        if self.data != None:
+            yield self.data[start:end]
+            return
+
+        # A full read computes the CRC on the way, so the data descriptor does not read the file again.
+        if start == 0 and end == self.size and self.crc == None:
+            crc = 0
+            for chunk in self._read_file(start, end):
+                crc = zlib.crc32(chunk, crc)
+                yield chunk
+            self._set_crc(crc)
+            return
+
+        yield from self._read_file(start, end)
+
+    def _read_file(self, start: int, end: int):
+        with open(self.path, "rb") as file:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if len(chunk) == 0:
+                    raise IOError(f"{self.path} changed while it was being zipped")
+                remaining -= len(chunk)
+                yield chunk
+
+    def get_local_header(self) -> bytes:
+        # Sent before the data, so the CRC is left to the data descriptor.
+        return LOCAL_HEADER.pack(
+            0x04034b50, ZIP_VERSION, ZIP_FLAGS, self.compression_method, self.dos_time, self.dos_date,
+            0, self.compressed_size, self.size, len(self.encoded_name), 0
+        ) + self.encoded_name
+
+    def get_data_descriptor(self) -> bytes:
+        return DATA_DESCRIPTOR.pack(0x08074b50, self.get_crc(), self.compressed_size, self.size)
+
+    def get_central_header(self) -> bytes:
+        return CENTRAL_HEADER.pack(
+            0x02014b50, ZIP_VERSION, ZIP_VERSION, ZIP_FLAGS, self.compression_method, self.dos_time, self.dos_date,
+            self.get_crc(), self.compressed_size, self.size, len(self.encoded_name), 0, 0, 0, 0, 0, self.header_offset
+        ) + self.encoded_name
+
+# ==================== Archive ====================
+
+class StreamingZip:
+    """
+    A zip archive laid out from a list of entries. Bytes are only produced when a range of the archive is read.
+    """
+    def __init__(self, entries: list[ZipEntry]):
+        self.entries = entries
+
+        # (start offset, length, function yielding bytes of the segment from a start to an end offset)
+        self.segments: list[tuple[int, int, any]] = []
+        offset = 0
+        for entry in entries:
+            entry.header_offset = offset
+            local_header = entry.get_local_header()
+            offset = self._add_segment(offset, len(local_header), self._read_bytes(local_header))
+            offset = self._add_segment(offset, entry.compressed_size, entry.read)
+            offset = self._add_segment(offset, DATA_DESCRIPTOR.size, self._read_lazy_bytes(entry.get_data_descriptor))
+
+        self.central_directory_offset = offset
+        self.central_directory_size = sum(CENTRAL_HEADER.size + len(entry.encoded_name) for entry in entries)
+        offset = self._add_segment(
+            offset,
+            self.central_directory_size + END_OF_CENTRAL_DIRECTORY.size,
+            self._read_lazy_bytes(self._get_central_directory),
+        )
+
+        self.size = offset
+        if self.size > MAX_ZIP_SIZE or len(entries) > 0xFFFF:
+            raise ValueError("Archive is too large to be streamed without Zip64")
+
+    def _add_segment(self, offset: int, length: int, reader) -> int:
+        self.segments.append((offset, length, reader))
+        return offset + length
+
+    @staticmethod
+    def _read_bytes(data: bytes):
+        def read(start: int, end: int):
+            yield data[start:end]
+        return read
+
+    @staticmethod
+    def _read_lazy_bytes(build_bytes):
+        def read(start: int, end: int):
+            yield build_bytes()[start:end]
+        return read
+
+    def _get_central_directory(self) -> bytes:
+        central_directory = b"".join(entry.get_central_header() for entry in self.entries)
+        return central_directory + END_OF_CENTRAL_DIRECTORY.pack(
+            0x06054b50, 0, 0, len(self.entries), len(self.entries),
+            self.central_directory_size, self.central_directory_offset, 0
+        )
+
+    def iter_range(self, start: int = 0, end: int = None):
+        """
+        Yields the bytes of the archive from `start` to `end`, both inclusive.
+        """
+        if end == None:
+            end = self.size - 1
+
+        for segment_start, length, reader in self.segments:
+            segment_end = segment_start + length
+            if segment_end <= start or length == 0:
+                continue
+            if segment_start > end:
+                break
+            yield from reader(max(start, segment_start) - segment_start, min(end + 1, segment_end) - segment_start)
+
+    def get_etag(self) -> str:
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update(entry.encoded_name)
+            digest.update(struct.pack("<QQ", entry.size, entry.modified_time_ns))
+            if entry.data != None:
+                digest.update(struct.pack("<I", entry.crc))
+        return '"' + digest.hexdigest() + '"'
+
+    def parse_range(self, range_header: str | None) -> tuple[int, int] | None:
+        """
+        Parses a single `bytes=` range into inclusive start and end offsets.
+        Returns None for no range. Raises ZipRangeError if the range cannot be satisfied.
+        """
+        if range_header == None:
+            return None
+
+        unit, _, byte_range = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in byte_range:
+            raise ZipRangeError(f"Unsupported range: {range_header}")
+
+        start_text, _, end_text = byte_range.strip().partition("-")
+        try:
+            if start_text == "":
+                # Suffix range, the last N bytes.
+                suffix_length = int(end_text)
+                if suffix_length <= 0:
+                    raise ZipRangeError(f"Unsatisfiable range: {range_header}")
+                return max(0, self.size - suffix_length), self.size - 1
+
+            start = int(start_text)
+            end = int(end_text) if end_text != "" else self.size - 1
+        except ValueError:
+            raise ZipRangeError(f"Invalid range: {range_header}")
+
+        if start >= self.size or end < start:
+            raise ZipRangeError(f"Unsatisfiable range: {range_header}")
+        return start, min(end, self.size - 1)
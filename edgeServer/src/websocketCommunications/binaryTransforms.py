@@ -0,0 +1,144 @@
+"""
+This script defines the binary encoding of the two hot websocket messages, mesh transforms and user poses.
+Clients opt in by sending `"binary_transforms": true` with `EditServer_RegisterAsEditingUser`. JSON stays the default.
+
+All values are little endian. Every binary frame starts with its message code as an int16.
+
+`CodeToServer.EditServer_ClientSend_BatchUpdate`, client to server:
+    header      int16 code, uint32 ack_sequence, 3 float32 user position, 3 float32 user rotation, uint16 mesh count
+    mesh        int32 mesh_instance_id, int32 parent_id, uint8 mark_delete, 3 float32 position, rotation and scale
+    Marker states are not transforms and are still sent with the JSON batch update.
+
+`CodeToClient.EditRoom_ServerSend_SessionUpdate`, server to client:
+    header      int16 code, uint32 sequence, uint32 base_sequence, uint16 mesh count, uint16 user count
+    mesh        int32 mesh_instance_id, int32 parent_id, 3 float32 position, rotation and scale
+    user        int32 id, 3 float32 position and rotation
+    Only objects whose changes are limited to their transform are sent in binary.
+    Every other change of the same tick goes in a JSON session update with the same sequence.
+"""
+import math
+import struct
+
+from websocketCommunications.websocketEnums import CodeToServer, CodeToClient
+
+CODE_FORMAT = struct.Struct("<h")
+
+BATCH_UPDATE_HEADER = struct.Struct("<hI6fH")
+BATCH_UPDATE_MESH = struct.Struct("<iiB9f")
+
+SESSION_UPDATE_HEADER = struct.Struct("<hIIHH")
+SESSION_UPDATE_MESH = struct.Struct("<ii9f")
+SESSION_UPDATE_USER = struct.Struct("<i6f")
+
+# Changed fields that can be sent in a binary transform record, by session update list.
+TRANSFORM_FIELDS = {
+    "mesh_updates": frozenset(("parent_id", "position", "rotation", "scale")),
+    "user_updates": frozenset(("position", "rotation")),
+}
+
+# Record count fields are uint16.
+MAX_RECORDS = 0xFFFF
+
+class BinaryFrameError(ValueError):
+    pass
+
+def is_valid_vector(value, length: int = 3) -> bool:
+    """
+    Returns True if a transform value from a client is a list of `length` finite numbers, so it can be packed.
+    """
+    if isinstance(value, (list, tuple)) == False or len(value) != length:
+        return False
+    return all(isinstance(item, (int, float)) and isinstance(item, bool) == False and math.isfinite(item) for item in value)
+
+def is_valid_model_state(model_state: dict[str, any]) -> bool:
+    """
+    Returns True if a mesh transform from a batch update has the fields and shapes a session update frame needs.
+    """
+    return (isinstance(model_state.get("mesh_instance_id"), int) and isinstance(model_state.get("parent_id"), int)
+            and is_valid_vector(model_state.get("position")) and is_valid_vector(model_state.get("rotation"))
+            and is_valid_vector(model_state.get("scale")))
+
+def read_code(frame: bytes) -> int:
+    if len(frame) < CODE_FORMAT.size:
+        raise BinaryFrameError("Binary frame is too short to contain a message code")
+    return CODE_FORMAT.unpack_from(frame)[0]
+
+def decode_message(frame: bytes) -> dict[str, any]:
+    """
+    Decodes a binary frame from a client into the same dict the JSON message would be parsed into.
+    """
+    code = read_code(frame)
+    match code:
+        case CodeToServer.EditServer_ClientSend_BatchUpdate:
+            return decode_batch_update(frame)
+        case _:
+            raise BinaryFrameError(f"Message code {code} has no binary encoding")
+
+def decode_batch_update(frame: bytes) -> dict[str, any]:
+    code, ack_sequence, *user_pose, mesh_count = BATCH_UPDATE_HEADER.unpack_from(frame)
+
+    expected_size = BATCH_UPDATE_HEADER.size + mesh_count * BATCH_UPDATE_MESH.size
+    if len(frame) != expected_size:
+        raise BinaryFrameError(f"Batch update frame is {len(frame)} bytes, expected {expected_size}")
+
+    if is_valid_vector(user_pose, 6) == False:
+        raise BinaryFrameError("Batch update frame has a user pose that is not finite")
+
+    model_states = []
+    for mesh_instance_id, parent_id, mark_delete, *transform in BATCH_UPDATE_MESH.iter_unpack(frame[BATCH_UPDATE_HEADER.size:]):
+        if is_valid_vector(transform, 9) == False:
+            raise BinaryFrameError(f"Batch update frame has a transform of mesh {mesh_instance_id} that is not finite")
+        model_states.append({
+            "mesh_instance_id": mesh_instance_id,
+            "parent_id": parent_id,
+            "position": transform[0:3],
+            "rotation": transform[3:6],
+            "scale": transform[6:9],
+            "mark_delete": mark_delete != 0,
+        })
+
+    return {
+        "_code": code,
+        "ack_sequence": ack_sequence,
+        "model_states": model_states,
+        "marker_states": [],
+        "user_position": user_pose[0:3],
+        "user_rotation": user_pose[3:6],
+    }
+
+def is_transform_change(kind: str, obj, fields: set[str] | None) -> bool:
+    """
+    Returns True if the change to a room object can be sent as a binary transform record.
+    """
+    transform_fields = TRANSFORM_FIELDS.get(kind)
+    if transform_fields == None or fields == None or len(fields) == 0:
+        return False
+    return obj.mark_delete == False and fields <= transform_fields
+
+def encode_session_update(sequence: int, base_sequence: int, meshes: list, users: list) -> bytes:
+    """
+    Packs the transforms of the given `MeshInstance` and `UserInstance` objects into a session update frame.
+    """
+    if len(meshes) > MAX_RECORDS or len(users) > MAX_RECORDS:
+        raise BinaryFrameError("Too many transform records for a single session update frame")
+
+    frame = bytearray(
+        SESSION_UPDATE_HEADER.size
+        + len(meshes) * SESSION_UPDATE_MESH.size
+        + len(users) * SESSION_UPDATE_USER.size
+    )
+    SESSION_UPDATE_HEADER.pack_into(
+        frame, 0, CodeToClient.EditRoom_ServerSend_SessionUpdate, sequence, base_sequence, len(meshes), len(users)
+    )
+
+    offset = SESSION_UPDATE_HEADER.size
+    for mesh in meshes:
+        SESSION_UPDATE_MESH.pack_into(
+            frame, offset, mesh.mesh_instance_id, mesh.parent_id, *mesh.position, *mesh.rotation, *mesh.scale
+        )
+        offset += SESSION_UPDATE_MESH.size
+    for user in users:
+        SESSION_UPDATE_USER.pack_into(frame, offset, user.id, *user.position, *user.rotation)
+        offset += SESSION_UPDATE_USER.size
+
+    return bytes(frame)
@@ -0,0 +1,224 @@
+"""
+This script defines the SocketConnection class that owns the outbound side of a client websocket.
+websocketHandler creates one per accepted socket.
+
+Frames are queued without awaiting and a dedicated writer task sends them in order, so a slow client
+only ever delays its own frames. The queue is bounded for session updates: when it is full, queued session
+updates are dropped and the owner is told the oldest base sequence it lost, so the next tick can send one
+delta covering everything that was dropped. Replies are never dropped, since clients wait on them.
+
+A connection that falls too far behind is disconnected, so memory stays bounded for clients that stop reading.
+Lag is how long the oldest unsent frame has been queued. The client can reconnect and resync with
+`EditServer_ClientRequest_GetRoomObjects`.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable
+
+from fastapi import WebSocket
+
+class OutboundMessage:
+    def __init__(self, frames: list[str | bytes], base_sequence: int = None):
+        self.frames = frames
+        # Set for session updates, which may be dropped and resent as a later delta.
+        self.base_sequence = base_sequence
+        self.queued_time = time.monotonic()
+        self.size = sum(len(frame) for frame in frames)
+
+    def is_session_update(self) -> bool:
+        return self.base_sequence != None
+
+class SocketConnectionStats:
+    def __init__(self):
+        self.sent_frames = 0
+        self.sent_bytes = 0
+        self.dropped_frames = 0
+        self.coalesced_updates = 0
+        self.max_queue_depth = 0
+        self.max_queued_bytes = 0
+        self.send_errors = 0
+        self.disconnect_reason: str = None
+
+    def to_dict(self):
+        return {
+            "sent_frames": self.sent_frames,
+            "sent_bytes": self.sent_bytes,
+            "dropped_frames": self.dropped_frames,
+            "coalesced_updates": self.coalesced_updates,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queued_bytes": self.max_queued_bytes,
+            "send_errors": self.send_errors,
+            "disconnect_reason": self.disconnect_reason,
+        }
+
+class SocketConnection:
+    # Close code sent to clients disconnected for lagging, "Try Again Later".
+    SLOW_CONSUMER_CLOSE_CODE = 1013
+
+    def __init__(self, websocket: WebSocket, max_queued_updates: int, max_lag: float, max_queued_bytes: int):
+        self.websocket = websocket
+        self.max_queued_updates = max_queued_updates
+        self.max_lag = max_lag
+        self.max_queued_bytes = max_queued_bytes
+
+        self.queue: deque[OutboundMessage] = deque()
+        self.queued_update_count = 0
+        self.queued_bytes = 0
+        # Message the writer task is currently sending.
+        self.sending_message: OutboundMessage = None
+        self.message_event = asyncio.Event()
+        self.writer_task: asyncio.Task = None
+
+        self.stats = SocketConnectionStats()
+        self.is_closed = False
+
+# ==================== Start and stop ====================
+
+    def start(self):
+        self.writer_task = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def close(self):
+        self.is_closed = True
+        if self.writer_task != None:
+            self.writer_task.cancel()
+        self.queue.clear()
+        self.queued_update_count = 0
+        self.queued_bytes = 0
+        self.sending_message = None
+
+    def disconnect(self, reason: str):
+        """
+        Drops everything queued and closes the websocket. The receive loop then cleans up the connection.
+        """
+        if self.is_closed:
+            return
+
+        print(f"# Disconnecting websocket: {reason}")
+        self.stats.disconnect_reason = reason
+        self.close()
+        asyncio.get_running_loop().create_task(self._close_websocket())
+
+    async def _close_websocket(self):
+        try:
+            await self.websocket.close(code=SocketConnection.SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as error:
+            print(f"Socket On Close Exception:\n{error}")
+
+# ==================== Queueing ====================
+
+    def queue_frames(self, frames: list[str | bytes]):
+        """
+        Queues frames that must be delivered, such as replies and notifications.
+        """
+        self._append(OutboundMessage(frames))
+
+    def queue_session_update(self, frames: list[str | bytes], base_sequence: int, on_dropped: Callable[[int], None]):
+        """
+        Queues the frames of a session update that is a delta from `base_sequence`.
+        If the queue already holds `max_queued_updates` session updates, they are dropped along with this one,
+        and `on_dropped` is called with the oldest dropped base sequence.
+        """
+        message = OutboundMessage(frames, base_sequence)
+        if self.queued_update_count < self.max_queued_updates:
+            self._append(message)
+            return
+
+        dropped = [queued for queued in self.queue if queued.is_session_update()] + [message]
+        self.queue = deque(queued for queued in self.queue if queued.is_session_update() == False)
+        self.queued_update_count = 0
+        self.queued_bytes = sum(queued.size for queued in self.queue)
+
+        self.stats.dropped_frames += sum(len(queued.frames) for queued in dropped)
+        self.stats.coalesced_updates += len(dropped)
+        on_dropped(min(queued.base_sequence for queued in dropped))
+
+    def _append(self, message: OutboundMessage):
+        if self.is_closed:
+            return
+
+        self.queue.append(message)
+        self.queued_bytes += message.size
+        if message.is_session_update():
+            self.queued_update_count += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.get_queue_depth())
+        self.stats.max_queued_bytes = max(self.stats.max_queued_bytes, self.queued_bytes)
+        self.message_event.set()
+
+        if self.queued_bytes > self.max_queued_bytes:
+            self.disconnect(f"client has {self.queued_bytes} bytes queued")
+        else:
+            self.check_lag()
+
+    def check_lag(self) -> bool:
+        """
+        Disconnects the client if it is lagging by more than `max_lag` seconds. Returns True if it was disconnected.
+        """
+        lag = self.get_lag()
+        if self.is_closed == False and lag > self.max_lag:
+            self.disconnect(f"client is lagging by {lag:.1f}s")
+        return self.is_closed
+
+    async def _write_loop(self):
+        while self.is_closed == False:
+            if len(self.queue) == 0:
+                self.message_event.clear()
+                await self.message_event.wait()
+                continue
+
+            message = self.queue.popleft()
+            self.queued_bytes -= message.size
+            if message.is_session_update():
+                self.queued_update_count -= 1
+            self.sending_message = message
+
+            for frame in message.frames:
+                try:
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+                except Exception as error:
+                    # The receive loop notices the disconnect and closes this connection.
+                    self.stats.send_errors += 1
+                    print(f"Socket On Send Exception:\n{error}")
+                    break
+
+                self.stats.sent_frames += 1
+                self.stats.sent_bytes += len(frame)
+
+            self.sending_message = None
+
+# ==================== Getter ====================
+
+    def get_queue_depth(self) -> int:
+        return sum(len(message.frames) for message in self.queue)
+
+    def get_lag(self) -> float:
+        """
+        Returns how many seconds the oldest unsent message has been queued, including the one being sent.
+        """
+        oldest_message = self.sending_message
+        if oldest_message == None and len(self.queue) > 0:
+            oldest_message = self.queue[0]
+        if oldest_message == None:
+            return 0.0
+        return time.monotonic() - oldest_message.queued_time
+
+    def has_queued_update(self) -> bool:
+        """
+        Returns True if a session update is waiting to be sent or being sent.
+        """
+        if self.sending_message != None and self.sending_message.is_session_update():
+            return True
+        return self.queued_update_count > 0
+
+    def get_stats(self):
+        client = self.websocket.client
+        return self.stats.to_dict() | {
+            "client": f"{client.host}:{client.port}" if client != None else None,
+            "queue_depth": self.get_queue_depth(),
+            "queued_updates": self.queued_update_count,
+            "queued_bytes": self.queued_bytes,
+            "lag_ms": round(self.get_lag() * 1000, 3),
+        }
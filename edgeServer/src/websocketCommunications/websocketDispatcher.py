@@ -0,0 +1,98 @@
+"""
+This script defines the registry that maps each `CodeToServer` value to the function handling it.
+Handlers are registered once at import with the `register` decorator, see websocketFunctions.
+
+A handler takes the websocket and the parsed message, and returns a dict that is merged into the reply.
+Coroutine handlers must be registered with `is_async=True` so they are awaited.
+Handlers that query MongoDB or touch files must be registered with `blocking=True` so they run on the IO thread pool.
+"""
+import inspect
+import time
+from typing import Callable
+
+from database import ioExecutor
+from websocketCommunications.websocketEnums import CodeToServer, CodeToClient
+
+class HandlerStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record_call(self, elapsed: float, failed: bool):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if failed:
+            self.errors += 1
+
+    def to_dict(self):
+        average_time = self.total_time / self.calls if self.calls > 0 else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(average_time * 1000, 3),
+            "max_ms": round(self.max_time * 1000, 3),
+        }
+
+class MessageHandler:
+    def __init__(self, callback: Callable, is_async: bool, blocking: bool, timeout: float | None):
+        self.callback = callback
+        self.is_async = is_async
+        self.blocking = blocking
+        # Seconds to wait for a blocking handler.
+        self.timeout = timeout
+        self.stats = HandlerStats()
+
+handlers: dict[CodeToServer, MessageHandler] = {}
+
+def register(code: CodeToServer, is_async: bool = False, blocking: bool = False, timeout: float | None = ioExecutor.DEFAULT_TIMEOUT):
+    """
+    Decorator that registers a function as the handler of a message code.
+    """
+    def decorator(callback: Callable):
+        if inspect.iscoroutinefunction(callback) != is_async:
+            raise TypeError(f"Handler {callback.__name__} for {code.name} must be registered with is_async={not is_async}")
+        if is_async and blocking:
+            raise TypeError(f"Handler {callback.__name__} for {code.name} cannot be both async and blocking")
+        if code in handlers:
+            raise ValueError(f"{code.name} already has a handler: {handlers[code].callback.__name__}")
+
+        handlers[code] = MessageHandler(callback, is_async, blocking, timeout)
+        return callback
+
+    return decorator
+
+async def dispatch(websocket, messageType: CodeToServer, jsonData: dict[str, any], reply: dict[str, any]):
+    """
+    Runs the handler registered for a message code and returns the reply to send back.
+    """
+    handler = handlers.get(messageType)
+    if handler == None:
+        print("Unhandled Server Code Type")
+        return reply
+
+    start_time = time.perf_counter()
+    failed = True
+    try:
+        if handler.is_async:
+            result = await handler.callback(websocket, jsonData)
+        elif handler.blocking:
+            result = await ioExecutor.run_blocking(handler.callback, websocket, jsonData, timeout=handler.timeout)
+        else:
+            result = handler.callback(websocket, jsonData)
+        failed = False
+    except ioExecutor.IOTimeoutError as error:
+        print(f"# {messageType.name} handler timed out: {error}")
+        result = {"success": "false", "error": "timeout"}
+    finally:
+        handler.stats.record_call(time.perf_counter() - start_time, failed)
+
+    reply = reply | result
+    reply["_code"] = CodeToClient.Reply
+    return reply
+
+def get_handler_stats():
+    return {code.name: handler.stats.to_dict() for code, handler in handlers.items()}
@@ -50,3 +50,7 @@ class CodeToClient(IntEnum):
 
     CaptureSession_Update = -6
     CaptureSession_Closed = -7
+
+    EditRoom_ServerSend_SnapshotChunk = -8
+
+    Reconstruction_JobUpdate = -9
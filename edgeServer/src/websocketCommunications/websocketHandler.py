@@ -1,16 +1,28 @@
 import json
-import threading
-from fastapi import WebSocket, WebSocketDisconnect, WebSocketException
+import os
+import struct
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
 from websocketCommunications.websocketEnums import CodeToServer, CodeToClient
-# from .websocketFunctions import WebsocketFunctionPrep
+from websocketCommunications import binaryTransforms, websocketDispatcher
+from websocketCommunications.socketConnection import SocketConnection
 
-connected_sockets = {}
+# Session updates a connection may have queued before they are coalesced into the next tick's delta.
+MAX_QUEUED_UPDATES = int(os.environ.get('WEBSOCKET_MAX_QUEUED_UPDATES', default=8))
+# Seconds a frame may wait to be sent before the client is disconnected as a slow consumer.
+MAX_SEND_LAG = float(os.environ.get('WEBSOCKET_MAX_SEND_LAG', default=10.0))
+# Bytes a connection may have queued before the client is disconnected.
+MAX_QUEUED_BYTES = int(os.environ.get('WEBSOCKET_MAX_QUEUED_BYTES', default=16 * 1024 * 1024))
+
+connected_sockets: dict[WebSocket, SocketConnection] = {}
 on_websocket_disconnect_callbacks = []
 
 async def StartClientSocket(websocket: WebSocket):
     print("Client inititated websocket connection")
     await websocket.accept()
-    connected_sockets[websocket] = threading.Lock()
+    connection = SocketConnection(websocket, MAX_QUEUED_UPDATES, MAX_SEND_LAG, MAX_QUEUED_BYTES)
+    connection.start()
+    connected_sockets[websocket] = connection
 
     try:
         while True:
@@ -18,8 +30,22 @@ async def StartClientSocket(websocket: WebSocket):
             # msgCode = CodeToServer(message['_code'])
             # # await ParseSocketData(websocket, msgCode, message)
 
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+
+            # Binary frames are transform streams from clients that registered with binary_transforms.
+            if received.get("bytes") != None:
+                try:
+                    message = binaryTransforms.decode_message(received["bytes"])
+                    msgCode = CodeToServer(message['_code'])
+                    await ParseSocketData(websocket, msgCode, message)
+                except (binaryTransforms.BinaryFrameError, struct.error) as error:
+                    print(f"Error: Received invalid binary frame: {error}")
+                continue
+
             # Receive the data as text first
-            messageAsText = await websocket.receive_text()
+            messageAsText = received["text"]
             # Try to parse as a json
             try:
                 message = json.loads(messageAsText) 
@@ -33,61 +59,23 @@ async def StartClientSocket(websocket: WebSocket):
         del connected_sockets[websocket]
         for callback in on_websocket_disconnect_callbacks:
             callback(websocket)
+    finally:
+        connection.close()
 
 async def ParseSocketData(socket : WebSocket, messageType : CodeToServer, jsonData):
-    from .websocketFunctions import WebsocketFunctionPrep
     reply = {}
 
     if "_sequenceNumber" in jsonData:
         reply["_sequenceNumber"] = jsonData["_sequenceNumber"]
 
-    ws_func = WebsocketFunctionPrep(socket, jsonData, reply)
-    match messageType:
-        case CodeToServer.Test_receive:                     reply = ws_func.test_receive()
-
-        case CodeToServer.Model_GetList:                    reply = ws_func.model_get_list()
-        case CodeToServer.Model_DownloadModelPreviews:      reply = ws_func.model_get_model_previews()
-        case CodeToServer.Model_Build3DUrl:                 reply = ws_func.model_build_3d_url()
-        case CodeToServer.ModelInfo_SaveNewInfo:            reply = ws_func.model_info_save_new_info()
-        case CodeToServer.Download_ModelZipFile:            reply = ws_func.download_model_zip_file()
-        
-        case CodeToServer.EditServer_FetchRoomPreviews:     reply = ws_func.edit_server_fetch_room_previews()
-        case CodeToServer.EditServer_CreateEmptyRoom:       reply = await ws_func.edit_server_create_empty_room()
-        case CodeToServer.EditServer_StartRoom:             reply = ws_func.edit_server_start_room()
-        case CodeToServer.EditServer_JoinRoom:              reply = ws_func.edit_server_join_room()
-        case CodeToServer.EditServer_ExitRoom:              reply = ws_func.edit_server_exit_room()
-        case CodeToServer.EditServer_RegisterAsEditingUser: reply = ws_func.edit_server_register_editing_user()
-        
-        case CodeToServer.EditServer_ClientRequest_GetRoomObjects:  reply = ws_func.edit_server_fetch_room_objects()
-
-        case CodeToServer.EditServer_ClientRequest_CreateNewMeshObject:   reply = ws_func.edit_server_create_new_mesh_object()
-        case CodeToServer.EditServer_ClientSend_BatchUpdate: reply = ws_func.edit_server_batch_update()
-        case CodeToServer.EditServer_ClientRequest_CreateNewAnnotationObject:   reply = ws_func.edit_server_create_new_annotation_object()
-        # Uses this code to process the json data with the func on the right.
-        case CodeToServer.EditServer_ClientRequest_CreateMeasurementObject:   reply = ws_func.edit_server_create_new_measurement_object()
-        
-        # case CodeToServer.CaptureServer_StartSession:       reply = ws_func.capture_server_start_session()
-        # case CodeToServer.CaptureServer_CloseSession:       reply = ws_func.capture_server_close_session()
-        # case CodeToServer.CaptureServer_JoinSession:        reply = ws_func.capture_server_join_session()
-        # case CodeToServer.CaptureServer_LeaveSession:       reply = ws_func.capture_server_leave_session()
-        # case CodeToServer.CaptureServer_UpdateModelVersion: reply = ws_func.capture_server_update_model_version()
-        # case CodeToServer.CaptureServer_UserUpdate:         reply = ws_func.capture_server_user_update()
-        # case CodeToServer.CaptureServer_MarkerUpdate:       reply = ws_func.capture_server_marker_update()
-
-        case _:
-            print("Unhandled Server Code Type")
-            pass
+    # Handlers are registered in websocketFunctions, which is imported by websocketRouter.
+    reply = await websocketDispatcher.dispatch(socket, messageType, jsonData, reply)
     
     if socket not in connected_sockets:
         return
     
-    connected_sockets[socket].acquire()
-    
-    try:
-        await socket.send_json(reply)
-    except WebSocketException as error:
-        print("Socket On Send Exception:\n" + error)
-    connected_sockets[socket].release()
+    # Encoded the same way as WebSocket.send_json.
+    connected_sockets[socket].queue_frames([json.dumps(reply, separators=(",", ":"), ensure_ascii=False)])
     return
 
 # TODO: Check if still in use. Was previously replaced with func 'send_json_to_socket'
@@ -97,15 +85,42 @@ async def ParseSocketData(socket : WebSocket, messageType : CodeToServer, jsonDa
 
 # Used by edting server create new empty room, new reconstruction, update loop. why not in same websocket function script?
 async def send_json_to_socket(websocket: WebSocket, messageType: CodeToClient, jsonData):
-    msg = jsonData
-    msg["_code"] = messageType
+    queue_frames_to_socket(websocket, [encode_message(messageType, jsonData)])
+
+async def broadcast_to_sockets(websockets, messageType: CodeToClient, jsonData):
+    """
+    Sends the same message to many sockets. The message is serialized once and the frame is shared by every socket.
+    """
+    frames = [encode_message(messageType, jsonData)]
+    for websocket in websockets:
+        queue_frames_to_socket(websocket, frames)
 
-    if websocket not in connected_sockets:
+def encode_message(messageType: CodeToClient, jsonData) -> str:
+    """
+    Serializes a message to the json text frame sent to clients. jsonData is not modified.
+    """
+    return orjson.dumps(jsonData | {"_code": messageType}, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def queue_frames_to_socket(websocket: WebSocket, frames: list[str | bytes]):
+    """
+    Queues json text frames, or binary frames from `binaryTransforms`, on the socket's connection.
+    """
+    connection = connected_sockets.get(websocket)
+    if connection == None:
         return
+    connection.queue_frames(frames)
 
-    connected_sockets[websocket].acquire()
-    try:
-        await websocket.send_json(msg)
-    except WebSocketException as error:
-        print("Socket On Send Exception:\n" + error)
-    connected_sockets[websocket].release()
\ No newline at end of file
+def queue_session_update_to_socket(websocket: WebSocket, frames: list[str | bytes], base_sequence: int, on_dropped):
+    """
+    Queues the frames of a session update. See `SocketConnection.queue_session_update`.
+    """
+    connection = connected_sockets.get(websocket)
+    if connection == None:
+        return
+    connection.queue_session_update(frames, base_sequence, on_dropped)
+
+def get_connection(websocket: WebSocket) -> SocketConnection | None:
+    return connected_sockets.get(websocket)
+
+def get_connection_stats():
+    return [connection.get_stats() for connection in connected_sockets.values()]
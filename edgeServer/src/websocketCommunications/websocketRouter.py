@@ -1,9 +1,20 @@
 from fastapi import APIRouter, File, UploadFile, WebSocket
-from websocketCommunications import websocketHandler
+from database import ioExecutor
+from websocketCommunications import websocketDispatcher, websocketHandler
+# Registers the websocket message handlers.
+from websocketCommunications import websocketFunctions
 
 router = APIRouter(tags=["websocketRouter"])
 
 @router.websocket("/start_websocket")
 async def editingClient_websocket_endpoint(websocket: WebSocket):
     print("started")
-    await websocketHandler.StartClientSocket(websocket)
\ No newline at end of file
+    await websocketHandler.StartClientSocket(websocket)
+
+@router.get("/websocketMetrics")
+def get_websocket_metrics():
+    return {
+        "connections": websocketHandler.get_connection_stats(),
+        "handlers": websocketDispatcher.get_handler_stats(),
+        "io_executor": ioExecutor.stats.to_dict(),
+    }
@@ -0,0 +1,39 @@
+import asyncio
+
+from editingClientSessioning.roomManagement.roomTickScheduler import RoomTickScheduler
+
+class FakeRoom:
+    def __init__(self):
+        self.room_id = 1
+        self.tick_rate = 100.0
+        self.has_activity = False
+        self.tick_event = asyncio.Event()
+        self.activity_event = asyncio.Event()
+
+    def has_pending_updates(self) -> bool:
+        return True
+
+def test_room_keeps_ticking_after_callback_raises():
+    ticks = []
+
+    async def tick_callback(room) -> bool:
+        ticks.append(room.room_id)
+        if len(ticks) == 1:
+            raise RuntimeError("tick failed")
+        # Stop the room on the third tick.
+        return len(ticks) < 3
+
+    async def run():
+        scheduler = RoomTickScheduler(tick_callback, 100.0, 100.0)
+        scheduler.start()
+        room = FakeRoom()
+        scheduler.schedule_room(room)
+        task = scheduler.room_tasks[room.room_id]
+        await asyncio.wait_for(task, timeout=5.0)
+        scheduler.stop()
+        return scheduler, room
+
+    scheduler, room = asyncio.run(run())
+    assert len(ticks) == 3
+    assert scheduler.room_stats[room.room_id].failed_ticks == 1
+    assert scheduler.is_scheduled(room.room_id) == False
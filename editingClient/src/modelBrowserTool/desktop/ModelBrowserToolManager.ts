@@ -69,12 +69,10 @@ export class ModelBrowserToolManager extends ABaseTool{
     const _this = this;
 
     const callback = function (jsonReply: any) {
-      const prependMIME = function (data: string) {
-        return "data:image/png;base64," + data;
-      };
       const model_previews = jsonReply.model_previews;
       model_previews.forEach((preview: any) => {
-        const thumbnailSrc = preview.thumbnail_data === null ? "null" : prependMIME(preview.thumbnail_data)
+        // Thumbnails are served over HTTP with versioned URLs, so the browser caches them.
+        const thumbnailSrc = preview.thumbnail_url === null ? "null" : preview.thumbnail_url
         const modelPreview = new ModelPreview_Data(
           preview.id,
           preview.name,
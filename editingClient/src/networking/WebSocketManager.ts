@@ -82,7 +82,11 @@ export class SocketHandler {
     Room_Previews_Update: -5,
     
     CaptureSession_Update: -6,
-    CaptureSession_Closed: -7
+    CaptureSession_Closed: -7,
+
+    EditRoom_ServerSend_SnapshotChunk: -8,
+
+    Reconstruction_JobUpdate: -9
   };
 
   serverIP: string;
@@ -197,6 +201,10 @@ export class SocketHandler {
       // case SocketHandler.CodeToClient.CaptureSession_Update:
       //   CaptureSessionManager.instance?._ReceiveServerUpdate(jsonData)
       //   break;
+      case SocketHandler.CodeToClient.Reconstruction_JobUpdate:
+        // Progress of uploads being reconstructed, New_Reconstruction follows once a job is registered.
+        console.log(`Reconstruction job ${jsonData.job_id} of ${jsonData.capture_id}: ${jsonData.state}`);
+        break;
       default:
         console.log("Unhandled Websocket Code");
     }
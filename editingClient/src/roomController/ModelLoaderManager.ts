@@ -1,7 +1,6 @@
 import "@babylonjs/loaders";
 import { PBRMaterial, Scene, SceneLoader, AbstractMesh, GaussianSplattingMesh} from "@babylonjs/core";
 import { SocketHandler } from "../networking/WebSocketManager";
-import { Buffer } from "buffer";
 import { Mesh } from "@babylonjs/core";
 import { ModelMaster } from "./objects/ServerObjects";
 
@@ -131,18 +130,20 @@ export class ModelLoaderManager{
       version: modelMaster.modelId.version,
     };
 
+    // The server replies with a short lived URL that streams the zip, so the browser downloads it directly.
     const onResponse = function (jsonData: any) {
-      const binaryData = Buffer.from(jsonData.zipData, "base64");
-
-      const blob = new Blob([binaryData], { type: "application/zip" });
+      if (!jsonData.downloadUrl) {
+        console.error("Model zip download is not available for " + modelMaster.name);
+        return;
+      }
 
       if (_this._htmlDownloadElement === null) {
         _this._htmlDownloadElement = document.createElement("a");
         document.body.appendChild(_this._htmlDownloadElement);
       }
 
-      _this._htmlDownloadElement.href = URL.createObjectURL(blob);
-      _this._htmlDownloadElement.download = modelMaster.name + ".zip";
+      _this._htmlDownloadElement.href = jsonData.downloadUrl;
+      _this._htmlDownloadElement.download = jsonData.fileName;
       _this._htmlDownloadElement.click();
     };
 
@@ -79,7 +79,7 @@ export class ModelPreview_Data {
      * Constructor
      * @param {string} id - A string to define the id of the model, as retrieved from backend.
      * @param {string} modelName - The display name of the model to show users.
-     * @param {string} thumbnailUrl - A base64 encoded string for image to display as thumbnail.
+     * @param {string} thumbnailUrl - URL of the image to display as thumbnail, or "null" if there is none.
      */
     constructor(id: string, modelName: string, thumbnailUrl: string) {
       this.id = id;